@@ -1,67 +1,216 @@
-from typing import List
+from typing import Any, AsyncIterator, List, Optional, Tuple, Union
 from typing import Dict
-from fastapi import APIRouter, Depends, Request, Request, HTTPException
+from fastapi import APIRouter, Depends, Query, Request, Request, HTTPException
+from fastapi.responses import Response, StreamingResponse
 from datetime import datetime
+import asyncio
 import logging
+import time
 
-from services.bigquery_service import BigQueryService
+from services.bigquery_service import BigQueryService, get_bigquery_service
+from utils.bounded_executor import ExecutorSaturatedError
+from services.admission_control import AdmissionRejectedError
 from services.data_service import DataService
-from models.query.model import CacheInput, SQLQueryRequest, SQLQueryResponse, QueryStatus, QueryMetadata, ValidateQueryResponse, DatasetSchema, QueryEmbeddingRequest
-from models.data.model import FlChartType
+from services.schema_registry import schema_registry
+from services.result_cache import make_result_cache_key
+from services.query_stats import query_stats
+from services.slow_query_log import slow_query_log
+from config.settings import get_settings
+from models.query.model import BatchQueryRequest, BatchQueryResponse, CacheInput, QueryPageRequest, QueryStatsOrder, QueryStatsResponse, SQLAnalysisRequest, SQLAnalysisResponse, SQLQueryRequest, SQLQueryResponse, QueryStatus, QueryMetadata, ValidateQueryResponse, DatasetSchema, SchemaDiff, QueryEmbeddingRequest
+from models.data.model import FlChartType, ResultFormat
+from utils.sql_analysis import sql_analyzer
 from utils.text_parser import extract_sql_from_text
-from utils.cache_connection import save_query, retrieve_query
+from utils.result_formats import MEDIA_TYPES, negotiate_result_format, to_columnar, encode_json, encode_msgpack, encode_arrow
+from utils.query_cursor import CursorError, encode_cursor, decode_cursor
+from utils.metrics import begin_request_stages, request_stages, time_stage
+from utils.cache_connection import embedding_memo, save_query, retrieve_query
+
+settings = get_settings()
 
 router = APIRouter(
     tags=["query"]
 )
 
-@router.post("/query")
-async def execute_sql_query(
-    request: SQLQueryRequest,
-    bigquery_service: BigQueryService = Depends(BigQueryService),
-    data_service: DataService = Depends(DataService)
-) -> SQLQueryResponse:
+
+def _ndjson_line(value: Any) -> bytes:
+    """Encode a value as a single NDJSON line, with the same values as the JSON response (NUMERIC as strings)"""
+    return encode_json(value) + b"\n"
+
+
+def _build_metadata(
+    bigquery_service: BigQueryService,
+    raw_results: Dict[str, Any],
+    rows_processed: Optional[int] = None
+) -> QueryMetadata:
+    """Build the QueryMetadata of a finished query from its job statistics"""
+    start_time = raw_results.get("start_time")
+    end_time = raw_results.get("end_time")
+    bytes_billed = raw_results.get("bytes_billed", 0)
+
+    execution_duration = 0.0
+    if start_time and end_time:
+        execution_duration = (end_time - start_time).total_seconds()
+
+    return QueryMetadata(
+        execution_time=execution_duration,
+        rows_processed=rows_processed,
+        bytes_processed=bytes_billed,
+        query_id=raw_results.get("job_id", "null"),
+        timestamp=datetime.now(),
+        cost_estimate=bigquery_service._estimate_cost(bytes_billed),
+        cache_hit=raw_results.get("cache_hit", False),
+        engine=raw_results.get("engine", "bigquery"),
+        rollup=raw_results.get("rollup"),
+        bytes_saved=raw_results.get("bytes_saved"),
+        stage_timings=_stage_timings()
+    )
+
+
+def _stage_timings() -> Optional[Dict[str, float]]:
+    """Seconds per stage of the current request so far, rounded for the response"""
+    stages = request_stages()
+    if stages is None:
+        return None
+    return {stage: round(elapsed, 6) for stage, elapsed in stages.items()}
+
+
+def _log_slow_query(query: str, started: float, status: QueryStatus, metadata: Optional[QueryMetadata]) -> None:
+    """Pass the finished request to the slow query log, which keeps it if it went over the threshold"""
+    slow_query_log.record(
+        query,
+        time.perf_counter() - started,
+        request_stages(),
+        rows=metadata.rows_processed if metadata else None,
+        bytes_processed=metadata.bytes_processed if metadata else None,
+        status=status
+    )
+
+
+def _response_document(response: SQLQueryResponse) -> Dict[str, Any]:
     """
-    Execute a SQL query and return results
+    JSON-mode document of a query response. ``data`` is passed through as is,
+    to be encoded once by encode_json instead of being dumped by pydantic first.
     """
-    try:
-        
-        # Extract SQL from the request text
-        clean_sql = extract_sql_from_text(request.query)
-        
-        # Execute the query
-        raw_results = await bigquery_service.execute_query(
-            query=clean_sql,
-            timeout=request.timeout,
-            limit=request.limit
+    document = response.model_dump(mode="json", exclude={"data"})
+    return {name: response.data if name == "data" else document[name] for name in SQLQueryResponse.model_fields}
+
+
+def _encode_response(response: SQLQueryResponse, result_format: ResultFormat) -> Response:
+    """
+    Encode a query response in the negotiated format. Arrow and NDJSON have
+    no document form, so their errors are sent as row-dict JSON.
+    """
+    with time_stage("response_encoding"):
+        if result_format == ResultFormat.MSGPACK:
+            return Response(
+                content=encode_msgpack(response.model_dump(mode="json")),
+                media_type=MEDIA_TYPES[ResultFormat.MSGPACK]
+            )
+        if result_format != ResultFormat.COLUMNAR:
+            result_format = ResultFormat.ROWS
+        return Response(
+            content=encode_json(_response_document(response)),
+            media_type=MEDIA_TYPES[result_format]
         )
 
-        start_time = raw_results.get("start_time")
-        end_time = raw_results.get("end_time")
-        bytes_billed = raw_results.get("bytes_billed", 0)
-        estimated_cost = bigquery_service._estimate_cost(bytes_billed)
-        job_id = raw_results.get("job_id", "null")
 
-        execution_duration = 0.0
-        if start_time and end_time:
-            execution_duration = (end_time - start_time).total_seconds()
-        
-        processed_results = data_service.process_results(raw_results, FlChartType.LINE_CHART); # TODO: add format from request
-    
-        
+async def _stream_ndjson(
+    bigquery_service: BigQueryService,
+    query_job,
+    timeout: int,
+    query: str,
+    started: float
+) -> AsyncIterator[bytes]:
+    """
+    Stream a submitted query as NDJSON: a header line with the column schema,
+    one JSON array per row as BigQuery pages arrive and a trailer with the QueryMetadata.
+    """
+    rows_sent = 0
+    try:
+        async for chunk in bigquery_service.stream_query_results(query_job, timeout=timeout, query=query):
+            if 'columns' in chunk:
+                yield _ndjson_line({"columns": chunk['columns']})
+            elif 'rows' in chunk:
+                rows_sent += len(chunk['rows'])
+                yield b"".join(_ndjson_line(row) for row in chunk['rows'])
+            else:
+                metadata = _build_metadata(bigquery_service, chunk['statistics'], rows_sent)
+                yield _ndjson_line({"status": QueryStatus.SUCCESS, "metadata": metadata.model_dump(mode="json")})
+                _log_slow_query(query, started, QueryStatus.SUCCESS, metadata)
+
+    except Exception as e:
+        # Headers are already sent, so the failure is reported as the trailer line
+        logging.error(f"Query streaming error: {str(e)}")
+        _log_slow_query(query, started, QueryStatus.ERROR, None)
+        yield _ndjson_line({
+            "status": QueryStatus.ERROR,
+            "error_message": "Query streaming was interrupted",
+            "rows_sent": rows_sent
+        })
+
+
+def _request_user(request: SQLQueryRequest) -> Optional[str]:
+    """User a query is charged to for admission control, sent as ``metadata.user_id``"""
+    user_id = (request.metadata or {}).get("user_id")
+    return str(user_id) if user_id else None
+
+
+def _build_response(
+    bigquery_service: BigQueryService,
+    data_service: DataService,
+    raw_results: Dict[str, Any],
+    result_format: ResultFormat,
+    chart_type: Optional[FlChartType] = None,
+    max_points: Optional[int] = None
+) -> SQLQueryResponse:
+    """Shape fetched rows for the frontend and wrap them in a response, with a cursor when more pages exist"""
+    with time_stage("process_results"):
+        processed_results = data_service.process_results(raw_results, chart_type, max_points)
+
+    if result_format in (ResultFormat.COLUMNAR, ResultFormat.MSGPACK):
+        with time_stage("response_building"):
+            processed_results = {
+                **processed_results,
+                "data": to_columnar(processed_results["data"], processed_results["columns"])
+            }
+
+    # Only the metadata is validated; the rows are encoded as they are by _response_document
+    next_page = raw_results.get("next_page")
+    return SQLQueryResponse.model_construct(
+        status=QueryStatus.SUCCESS,
+        data=processed_results,
+        metadata=_build_metadata(bigquery_service, raw_results, raw_results.get("total_rows")),
+        next_cursor=encode_cursor(next_page) if next_page else None
+    )
+
+
+def _error_response(error: Exception) -> SQLQueryResponse:
+    """Map an exception raised while running a query to its error response"""
+    if isinstance(error, AdmissionRejectedError):
         return SQLQueryResponse(
-            status=QueryStatus.SUCCESS,
-            data=processed_results,
+            status=error.status,
             metadata=QueryMetadata(
-                execution_time=execution_duration,
-                bytes_processed=bytes_billed,
-                query_id=job_id,
-                timestamp=datetime.now(),
-                cost_estimate=estimated_cost
-            )
+                execution_time=0,
+                rows_processed=0,
+                query_id=f"rejected_{int(datetime.now().timestamp())}",
+                timestamp=datetime.now()
+            ),
+            error_message=str(error),
+            suggestions=error.suggestions
         )
-        
-    except ValueError as e:
+    if isinstance(error, CursorError):
+        return SQLQueryResponse(
+            status=QueryStatus.ERROR,
+            metadata=QueryMetadata(
+                execution_time=0,
+                rows_processed=0,
+                query_id=f"cursor_{int(datetime.now().timestamp())}",
+                timestamp=datetime.now()
+            ),
+            error_message=str(error),
+            suggestions=["Run the query again to get a new cursor"]
+        )
+    if isinstance(error, ValueError):
         return SQLQueryResponse(
             status=QueryStatus.INVALID_SQL,
             metadata=QueryMetadata(
@@ -70,10 +219,23 @@ async def execute_sql_query(
                 query_id=f"error_{int(datetime.now().timestamp())}",
                 timestamp=datetime.now()
             ),
-            error_message=str(e),
+            error_message=str(error),
             suggestions=["Check your SQL syntax", "Ensure all table names are correct"]
         )
-    except TimeoutError:
+    if isinstance(error, ExecutorSaturatedError):
+        logging.warning(f"Query rejected: {str(error)}")
+        return SQLQueryResponse(
+            status=QueryStatus.ERROR,
+            metadata=QueryMetadata(
+                execution_time=0,
+                rows_processed=0,
+                query_id=f"busy_{int(datetime.now().timestamp())}",
+                timestamp=datetime.now()
+            ),
+            error_message="Too many queries in progress",
+            suggestions=["Retry the query in a few seconds"]
+        )
+    if isinstance(error, TimeoutError):
         return SQLQueryResponse(
             status=QueryStatus.TIMEOUT,
             metadata=QueryMetadata(
@@ -85,25 +247,221 @@ async def execute_sql_query(
             error_message="Query execution timed out",
             suggestions=["Try reducing the dataset size", "Add more specific WHERE clauses"]
         )
+
+    logging.error(f"Query execution error: {str(error)}")
+    return SQLQueryResponse(
+        status=QueryStatus.ERROR,
+        metadata=QueryMetadata(
+            execution_time=0,
+            rows_processed=0,
+            query_id=f"error_{int(datetime.now().timestamp())}",
+            timestamp=datetime.now()
+        ),
+        error_message="Internal server error occurred",
+        suggestions=["Contact support if the issue persists"]
+    )
+
+
+async def _run_query(
+    request: SQLQueryRequest,
+    bigquery_service: BigQueryService,
+    data_service: DataService,
+    result_format: ResultFormat = ResultFormat.ROWS
+) -> SQLQueryResponse:
+    """
+    Execute one query request and build its response document.
+    Failures are returned as error responses, never raised.
+    Stages are timed from here on for the metadata and the slow query log.
+    """
+    begin_request_stages()
+    try:
+        
+        # Extract SQL from the request text
+        clean_sql = extract_sql_from_text(request.query)
+        
+        # Execute the query
+        raw_results = await bigquery_service.execute_query(
+            query=clean_sql,
+            timeout=request.timeout,
+            limit=request.limit,
+            use_cache=request.use_cache is not False,
+            page_size=request.page_size or settings.QUERY_DEFAULT_PAGE_SIZE or None,
+            user_id=_request_user(request)
+        )
+        
+        return _build_response(
+            bigquery_service,
+            data_service,
+            raw_results,
+            result_format,
+            chart_type=request.chart_type,
+            max_points=request.max_points
+        )
+        
     except Exception as e:
-        logging.error(f"Query execution error: {str(e)}")
-        return SQLQueryResponse(
-            status=QueryStatus.ERROR,
-            metadata=QueryMetadata(
-                execution_time=0,
-                rows_processed=0,
-                query_id=f"error_{int(datetime.now().timestamp())}",
-                timestamp=datetime.now()
-            ),
-            error_message="Internal server error occurred",
-            suggestions=["Contact support if the issue persists"]
+        return _error_response(e)
+
+
+@router.post("/query")
+async def execute_sql_query(
+    request: SQLQueryRequest,
+    http_request: Request,
+    bigquery_service: BigQueryService = Depends(get_bigquery_service),
+    data_service: DataService = Depends(DataService)
+) -> SQLQueryResponse:
+    """
+    Execute a SQL query and return results.
+
+    The wire format is negotiated through the Accept header:
+    - ``application/json`` (default): one dict per row.
+    - ``application/vnd.ancap.columnar+json``: one array per column under ``data.data``.
+    - ``application/msgpack``: the columnar document encoded as MessagePack.
+    - ``application/vnd.apache.arrow.stream``: Arrow IPC stream built from the BigQuery
+      result, with the QueryMetadata as JSON in the ``query_metadata`` schema metadata.
+    - ``application/x-ndjson``: rows streamed as they are read from BigQuery.
+
+    ``chart_type`` shapes the JSON and MessagePack rows for that chart (LTTB for
+    line charts, top-N plus "other" for pies, capped bar categories, sampled
+    scatter points) within ``max_points``.
+
+    With ``page_size`` (or QUERY_DEFAULT_PAGE_SIZE) the JSON and MessagePack formats
+    return only the first page and a ``next_cursor`` for ``/query/page``; Arrow
+    and NDJSON always carry the whole result.
+    """
+    started = time.perf_counter()
+    result_format = negotiate_result_format(http_request.headers.get("accept"))
+
+    if result_format not in (ResultFormat.NDJSON, ResultFormat.ARROW):
+        response = await _run_query(request, bigquery_service, data_service, result_format)
+        encoded = _encode_response(response, result_format)
+        _log_slow_query(request.query, started, response.status, response.metadata)
+        return encoded
+
+    begin_request_stages()
+    try:
+        clean_sql = extract_sql_from_text(request.query)
+
+        if result_format == ResultFormat.NDJSON:
+            query_job = await bigquery_service.start_query(
+                query=clean_sql,
+                timeout=request.timeout,
+                limit=request.limit,
+                user_id=_request_user(request)
+            )
+            return StreamingResponse(
+                _stream_ndjson(bigquery_service, query_job, request.timeout, clean_sql, started),
+                media_type=MEDIA_TYPES[ResultFormat.NDJSON]
+            )
+
+        arrow_results = await bigquery_service.execute_query_arrow(
+            query=clean_sql,
+            timeout=request.timeout,
+            limit=request.limit,
+            user_id=_request_user(request)
         )
+        metadata = _build_metadata(bigquery_service, arrow_results, arrow_results["table"].num_rows)
+        with time_stage("response_encoding"):
+            content = encode_arrow(arrow_results["table"], metadata.model_dump(mode="json"))
+        _log_slow_query(request.query, started, QueryStatus.SUCCESS, metadata)
+        return Response(content=content, media_type=MEDIA_TYPES[ResultFormat.ARROW])
+
+    except Exception as e:
+        response = _error_response(e)
+        _log_slow_query(request.query, started, response.status, response.metadata)
+        return _encode_response(response, result_format)
+
+
+@router.post("/query/page")
+async def fetch_query_page(
+    request: QueryPageRequest,
+    http_request: Request,
+    bigquery_service: BigQueryService = Depends(get_bigquery_service),
+    data_service: DataService = Depends(DataService)
+) -> SQLQueryResponse:
+    """
+    Fetch the page a ``next_cursor`` points at. Rows are read from the finished
+    job's result table, so the query is not run or billed again.
+    """
+    result_format = negotiate_result_format(http_request.headers.get("accept"))
+    if result_format not in (ResultFormat.COLUMNAR, ResultFormat.MSGPACK):
+        result_format = ResultFormat.ROWS
+
+    try:
+        page_state = decode_cursor(request.cursor)
+        raw_results = await bigquery_service.fetch_page(page_state, timeout=request.timeout)
+        response = _build_response(bigquery_service, data_service, raw_results, result_format)
+
+    except Exception as e:
+        response = _error_response(e)
+
+    return _encode_response(response, result_format)
+
+
+@router.post("/query/batch")
+async def execute_batch_query(
+    request: BatchQueryRequest,
+    bigquery_service: BigQueryService = Depends(get_bigquery_service),
+    data_service: DataService = Depends(DataService)
+) -> BatchQueryResponse:
+    """
+    Execute several SQL queries in one round trip.
+
+    Identical queries (same normalized SQL, limit, page size and chart shaping)
+    run once and share their response. With ``parallel`` up to BATCH_MAX_CONCURRENCY queries run at the
+    same time. A failing query is reported in its own result and does not stop
+    the others; ``overall_status`` is success only if every query succeeded.
+    """
+    start_time = time.perf_counter()
+
+    # Map every position in the batch to its first identical query
+    unique_requests: Dict[Tuple[str, Optional[FlChartType], Optional[int]], SQLQueryRequest] = {}
+    request_keys = []
+    for query_request in request.queries:
+        sql_key = make_result_cache_key(
+            extract_sql_from_text(query_request.query),
+            query_request.limit,
+            query_request.page_size
+        )
+        key = (sql_key, query_request.chart_type, query_request.max_points)
+        request_keys.append(key)
+        unique_requests.setdefault(key, query_request)
+
+    concurrency = settings.BATCH_MAX_CONCURRENCY if request.parallel else 1
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_limited(query_request: SQLQueryRequest) -> SQLQueryResponse:
+        async with semaphore:
+            started = time.perf_counter()
+            response = await _run_query(query_request, bigquery_service, data_service)
+            _log_slow_query(query_request.query, started, response.status, response.metadata)
+            return response
+
+    responses = await asyncio.gather(*(run_limited(q) for q in unique_requests.values()))
+    responses_by_key = dict(zip(unique_requests.keys(), responses))
+    results = [responses_by_key[key] for key in request_keys]
+
+    successful_queries = sum(1 for result in results if result.status == QueryStatus.SUCCESS)
+    failed_queries = len(results) - successful_queries
+
+    batch_response = BatchQueryResponse.model_construct(
+        results=results,
+        overall_status=QueryStatus.SUCCESS if failed_queries == 0 else QueryStatus.ERROR,
+        total_execution_time=time.perf_counter() - start_time,
+        successful_queries=successful_queries,
+        failed_queries=failed_queries
+    )
+    document = batch_response.model_dump(mode="json", exclude={"results"})
+    document["results"] = [_response_document(result) for result in results]
+    return Response(
+        content=encode_json({name: document[name] for name in BatchQueryResponse.model_fields}),
+        media_type=MEDIA_TYPES[ResultFormat.ROWS]
+    )
 
 
 @router.post('/validate')
 async def validate_sql_query(
     request: SQLQueryRequest,
-    bigquery_service: BigQueryService = Depends(BigQueryService)
+    bigquery_service: BigQueryService = Depends(get_bigquery_service)
 ) -> ValidateQueryResponse:
     try:
         return await bigquery_service.validate_query(request.query)
@@ -113,7 +471,42 @@ async def validate_sql_query(
             status=QueryStatus.ERROR,
             error_message=str(e)
         )
-    
+
+@router.post('/query/analyze')
+async def analyze_sql_query(request: SQLAnalysisRequest) -> SQLAnalysisResponse:
+    """
+    Statement type, tables, LIMIT and fingerprint of a SQL text, without
+    running it. The llm-service reads the tables from here for permission checks.
+    """
+    analysis = sql_analyzer.analyze(request.query)
+    return SQLAnalysisResponse(
+        sql=analysis.sql,
+        normalized=analysis.normalized,
+        fingerprint=analysis.fingerprint,
+        statement_type=analysis.statement_type,
+        statement_types=list(analysis.statement_types),
+        tables=list(analysis.tables),
+        has_limit=analysis.has_limit,
+        error=analysis.error
+    )
+
+@router.get('/stats/queries')
+async def get_query_stats(
+    order_by: QueryStatsOrder = QueryStatsOrder.BYTES_BILLED,
+    limit: int = Query(default=20, ge=1, le=500)
+) -> QueryStatsResponse:
+    """
+    Query shapes (SQL fingerprints, literals stripped) with the highest cost or
+    latency: calls, cache hits, errors, total/mean/p95 time, bytes billed and slot ms.
+    """
+    tracked = query_stats.stats()
+    return QueryStatsResponse(
+        order_by=order_by,
+        fingerprints_tracked=tracked["fingerprints"],
+        fingerprints_evicted=tracked["evicted"],
+        queries=query_stats.top(order_by.value, limit)
+    )
+
 @router.post("/embeddings")
 async def save_query_endpoint(
     input: CacheInput
@@ -121,12 +514,14 @@ async def save_query_endpoint(
     """Save a new query to the cache."""
     try:
    
-        query_id = save_query(input.query_text, input.sql_query)
+        query_id = save_query(input.query_text, input.sql_query, input.embedding_handle)
         
         return {
             "id": query_id,
             "message": "Query saved successfully"
         }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
@@ -135,7 +530,11 @@ async def search_queries_endpoint(
     query_text: str,
     num_results: int = 5,
 ):
-    """Search for similar queries in the cache."""
+    """
+    Search for similar queries in the cache. ``embedding_handle`` names the
+    query's vector: pass it to /embeddings to save the query without
+    embedding it again.
+    """
     try:
 
         results = retrieve_query(query_text, num_results)
@@ -143,17 +542,35 @@ async def search_queries_endpoint(
         return {
             "results": results,
             "query_text": query_text,
-            "total_results": len(results) if results else 0
+            "total_results": len(results) if results else 0,
+            "embedding_handle": embedding_memo.handle(query_text)
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/schemas", response_model=List[DatasetSchema])
+@router.get("/schemas", response_model=Union[List[DatasetSchema], SchemaDiff])
 async def get_bigquery_schemas(
-    bigquery_service: BigQueryService = Depends(BigQueryService)
-) -> List[DatasetSchema]:
+    http_request: Request,
+    response: Response,
+    since: Optional[str] = None,
+    bigquery_service: BigQueryService = Depends(get_bigquery_service)
+) -> Union[List[DatasetSchema], SchemaDiff, Response]:
     """
-    Get all BigQuery schemas
+    Get all BigQuery schemas.
+
+    Served from memory and refreshed in the background. The ETag is the schema
+    version: a matching If-None-Match gets 304 Not Modified. With ``since`` only
+    the tables added, changed or removed after that version are returned.
     """
-    return await bigquery_service.get_schemas()
\ No newline at end of file
+    snapshot = await schema_registry.get(bigquery_service)
+    etag = f'"{snapshot.version}"'
+
+    if_none_match = http_request.headers.get("if-none-match", "")
+    if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    if since is not None:
+        return schema_registry.diff(snapshot, since)
+    return snapshot.schemas
\ No newline at end of file
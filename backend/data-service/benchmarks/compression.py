@@ -0,0 +1,99 @@
+"""
+CPU and bandwidth trade-off of compressing /query responses.
+
+For row-dict and columnar JSON results of the narrow and wide schemas, each
+coding and level is measured for compressed size, compression and
+decompression time, and the time it takes to send the body over links of
+several speeds. ``net ms`` is the transfer time saved minus the time spent
+compressing and decompressing: positive means compressing pays off.
+
+Run from the data-service directory:
+    python -m benchmarks.compression [--rows 100 1000 10000] [--mbps 10 100 1000]
+"""
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import time
+import zlib
+
+import zstandard
+
+from benchmarks.result_formats import NARROW_SCHEMA, WIDE_SCHEMA, generate_result, _document
+from utils.compression import _Compressor
+from utils.result_formats import encode_json, to_columnar
+
+CODINGS = [("gzip", 1), ("gzip", 6), ("gzip", 9), ("zstd", 1), ("zstd", 3), ("zstd", 9)]
+
+
+def _payloads(result: Dict[str, Any]) -> Dict[str, bytes]:
+    rows, columns = result["rows"], result["columns"]
+    return {
+        "json rows": encode_json(_document({"data": rows, "columns": columns})),
+        "json columnar": encode_json(_document({"data": to_columnar(rows, columns), "columns": columns})),
+    }
+
+
+def _decompressor(encoding: str) -> Callable[[bytes], bytes]:
+    if encoding == "gzip":
+        return lambda body: zlib.decompress(body, 31)
+    return lambda body: zstandard.ZstdDecompressor().decompressobj().decompress(body)
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> Tuple[float, Any]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), value
+
+
+def run(row_counts: List[int], repeat: int, link_mbps: List[float]) -> List[Dict[str, Any]]:
+    results = []
+    for schema_name, schema in (("narrow", NARROW_SCHEMA), ("wide", WIDE_SCHEMA)):
+        for num_rows in row_counts:
+            for format_name, payload in _payloads(generate_result(schema, num_rows)).items():
+                for encoding, level in CODINGS:
+                    compress_s, compressed = _best_of(
+                        repeat, lambda: _Compressor(encoding, level, level).compress(payload, last=True)
+                    )
+                    decompress_s, decompressed = _best_of(repeat, lambda: _decompressor(encoding)(compressed))
+                    assert decompressed == payload
+                    cpu_s = compress_s + decompress_s
+                    results.append({
+                        "schema": schema_name,
+                        "rows": num_rows,
+                        "format": format_name,
+                        "coding": f"{encoding}-{level}",
+                        "bytes": len(payload),
+                        "compressed_bytes": len(compressed),
+                        "ratio": len(payload) / len(compressed),
+                        "compress_ms": compress_s * 1000,
+                        "decompress_ms": decompress_s * 1000,
+                        # bytes * 8 / (mbps * 1e6) seconds saved on the wire, in ms
+                        "net_ms": {
+                            mbps: (len(payload) - len(compressed)) * 8 / (mbps * 1000) - cpu_s * 1000
+                            for mbps in link_mbps
+                        },
+                    })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mbps", type=float, nargs="+", default=[10, 100, 1000], help="Link speeds to price the transfer at")
+    args = parser.parse_args()
+
+    links = "".join(f"{f'net ms@{mbps:g}':>14}" for mbps in args.mbps)
+    print(f"{'schema':<8}{'rows':>7}  {'format':<14}{'coding':<8}{'bytes':>10}{'sent':>10}{'ratio':>7}{'comp ms':>9}{'dec ms':>8}{links}")
+    for entry in run(args.rows, args.repeat, args.mbps):
+        net = "".join(f"{entry['net_ms'][mbps]:>14.2f}" for mbps in args.mbps)
+        print(
+            f"{entry['schema']:<8}{entry['rows']:>7}  {entry['format']:<14}{entry['coding']:<8}{entry['bytes']:>10}"
+            f"{entry['compressed_bytes']:>10}{entry['ratio']:>7.1f}{entry['compress_ms']:>9.2f}{entry['decompress_ms']:>8.2f}{net}"
+        )
+
+
+if __name__ == "__main__":
+    main()
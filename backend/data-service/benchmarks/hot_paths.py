@@ -0,0 +1,401 @@
+"""
+Throughput and latency of the data-service hot paths, offline.
+
+Queries are answered by an in-process fake BigQuery backend, so no GCP
+access is needed. Cases, each for narrow and wide schemas and every row count:
+- convert_rows: BigQuery rows to dictionaries (BigQueryService._convert_rows)
+- serialize_value: BigQueryService._serialize_value on nested and REPEATED values
+- process_results: DataService.process_results, as is and shaped for a line chart
+- response_model: building the SQLQueryResponse pydantic model
+- response_encode: encoding that model to the /query response body
+- query_endpoint: POST /query end to end, under concurrent load
+
+Run from the data-service directory:
+    python -m benchmarks.hot_paths [--rows 100 1000 10000] [--output results.json]
+    python -m benchmarks.hot_paths --baseline results.json [--tolerance 0.25]
+
+With --baseline the exit status is 1 when a case got slower than the baseline
+by more than the tolerance.
+"""
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import types
+
+# Settings the service requires; the benchmark never reaches GCP
+for _name in ("GCP_PROJECT_ID", "GCP_DATA_PROJECT_ID", "GCP_DATA_DATASET_ID", "GCS_BUCKET_NAME", "BIGQUERY_DATASET",
+              "INDEX_DISPLAY_NAME", "ENDPOINT_DISPLAY_NAME", "DEPLOYED_INDEX_ID",
+              "FIRESTORE_DATABASE_NAME", "FIRESTORE_COLLECTION_NAME"):
+    os.environ.setdefault(_name, "bench")
+os.environ.setdefault("SIMILARITY_THRESHOLD", "0.3")
+os.environ.setdefault("SEMANTIC_INDEX_ENABLED", "false")
+
+# The semantic cache connects to Vertex AI and Firestore when imported; it is
+# not benchmarked here (see benchmarks.semantic_index for its local index)
+_semantic_cache = types.ModuleType("utils.cache_connection")
+_semantic_cache.save_query = lambda *args, **kwargs: None
+_semantic_cache.retrieve_query = lambda *args, **kwargs: None
+_semantic_cache.semantic_cache_index = types.SimpleNamespace(ready=False, sync=lambda: 0, stats=lambda: {})
+_semantic_cache.embedding_memo = types.SimpleNamespace(handle=lambda text: "", stats=lambda: {})
+sys.modules.setdefault("utils.cache_connection", _semantic_cache)
+
+import httpx
+from google.cloud import bigquery
+from google.cloud.exceptions import NotFound
+
+from benchmarks.result_formats import NARROW_SCHEMA, WIDE_SCHEMA
+from api.query.router import _encode_response
+from main import app
+from models.data.model import FlChartType, ResultFormat
+from models.query.model import QueryMetadata, QueryStatus, SQLQueryResponse
+from services.bigquery_service import BigQueryService, get_bigquery_service
+from services.data_service import DataService
+from services.execution_backend import ExecutionBackend
+
+NESTED_SCHEMA = [
+    ("FACFCH", "DATE", "NULLABLE"),
+    ("PRDIDS", "INTEGER", "REPEATED"),
+    ("TOTALES", "NUMERIC", "REPEATED"),
+    ("LINEAS", "RECORD", "REPEATED"),
+    ("CREADO", "TIMESTAMP", "NULLABLE"),
+]
+
+RECORD_FIELDS = [
+    bigquery.SchemaField("PRDID", "INTEGER"),
+    bigquery.SchemaField("CANTIDAD", "NUMERIC"),
+    bigquery.SchemaField("FECHA", "DATE"),
+]
+
+SCHEMAS = {
+    "narrow": [(name, field_type, "NULLABLE") for name, field_type in NARROW_SCHEMA],
+    "wide": [(name, field_type, "NULLABLE") for name, field_type in WIDE_SCHEMA],
+}
+
+_TABLE_PATTERN = re.compile(r"bench_(\w+?)_(\d+)")
+
+
+def _generate_value(field_type: str, mode: str, index: int, rng: random.Random) -> Any:
+    """A value of the Python type the BigQuery client returns for the field"""
+    if mode == "REPEATED":
+        return [_generate_value(field_type, "NULLABLE", index + i, rng) for i in range(rng.randint(0, 4))]
+    if field_type == "DATE":
+        return date(2024, 1, 1) + timedelta(days=index % 365)
+    if field_type == "TIMESTAMP":
+        return datetime(2024, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=index)
+    if field_type == "STRING":
+        return f"VALOR {rng.randint(1, 500)}"
+    if field_type == "NUMERIC":
+        return Decimal(rng.randint(1, 10_000_000)) / 100
+    if field_type == "RECORD":
+        return {"PRDID": rng.randint(1, 500), "CANTIDAD": Decimal(rng.randint(1, 100_000)) / 100, "FECHA": date(2024, 1, 1)}
+    return rng.randint(1, 100_000)
+
+
+def generate_rows(schema: List[Tuple[str, str, str]], num_rows: int) -> List[Tuple[Any, ...]]:
+    rng = random.Random(42)
+    return [
+        tuple(_generate_value(field_type, mode, index, rng) for _, field_type, mode in schema)
+        for index in range(num_rows)
+    ]
+
+
+class FakeRowIterator:
+    """Result rows read like a BigQuery RowIterator"""
+
+    def __init__(self, schema: List[bigquery.SchemaField], rows: List[Tuple[Any, ...]], page_size: Optional[int] = None, start: int = 0):
+        self.schema = schema
+        self.rows = rows
+        self.total_rows = len(rows)
+        self.page_size = page_size or max(len(rows), 1)
+        self.start = start
+        self.next_page_token: Optional[str] = None
+
+    def __iter__(self):
+        return iter(self.rows[self.start:])
+
+    @property
+    def pages(self):
+        offset = self.start
+        while offset < len(self.rows):
+            page = self.rows[offset:offset + self.page_size]
+            offset += self.page_size
+            self.next_page_token = str(offset) if offset < len(self.rows) else None
+            yield page
+
+
+class FakeQueryJob:
+    """Finished job with the QueryJob attributes BigQueryService reads"""
+
+    def __init__(self, job_id: str, schema: List[bigquery.SchemaField], rows: List[Tuple[Any, ...]]):
+        self.job_id = job_id
+        self.schema = schema
+        self.rows = rows
+        self.created = self.started = self.ended = datetime.now(timezone.utc)
+        self.destination = bigquery.TableReference.from_string(f"bench._results.{job_id}")
+        size = len(rows) * len(schema) * 8
+        self._properties = {"statistics": {"query": {
+            "totalBytesProcessed": str(size),
+            "totalBytesBilled": str(size),
+            "totalSlotMs": "10",
+            "referencedTables": [],
+        }}}
+
+    def result(self, timeout: Optional[float] = None, page_size: Optional[int] = None, **kwargs) -> FakeRowIterator:
+        return FakeRowIterator(self.schema, self.rows, page_size)
+
+    def exception(self, timeout: Optional[float] = None) -> None:
+        return None
+
+
+class FakeBigQueryBackend(ExecutionBackend):
+    """
+    Answers ``SELECT ... FROM bench_<schema>_<rows>`` with pre-generated rows,
+    so the benchmark measures the service and not an engine
+    """
+
+    name = "fake"
+    project = "bench"
+
+    def __init__(self):
+        self._results: Dict[Tuple[str, int], Tuple[List[bigquery.SchemaField], List[Tuple[Any, ...]]]] = {}
+        self._jobs = 0
+
+    def result(self, schema_name: str, num_rows: int) -> Tuple[List[bigquery.SchemaField], List[Tuple[Any, ...]]]:
+        key = (schema_name, num_rows)
+        if key not in self._results:
+            schema = NESTED_SCHEMA if schema_name == "nested" else SCHEMAS[schema_name]
+            fields = [
+                bigquery.SchemaField(name, field_type, mode=mode, fields=RECORD_FIELDS if field_type == "RECORD" else ())
+                for name, field_type, mode in schema
+            ]
+            self._results[key] = (fields, generate_rows(schema, num_rows))
+        return self._results[key]
+
+    def _job(self, query: str) -> FakeQueryJob:
+        match = _TABLE_PATTERN.search(query)
+        schema, rows = self.result(match.group(1), int(match.group(2)))
+        self._jobs += 1
+        return FakeQueryJob(f"bench_{self._jobs}", schema, rows)
+
+    def submit(self, query: str, timeout: Optional[int] = None) -> FakeQueryJob:
+        return self._job(query)
+
+    def dry_run(self, query: str) -> FakeQueryJob:
+        return self._job(query)
+
+    def list_rows(self, destination: str, page_token: str, page_size: int, timeout: Optional[int] = None) -> FakeRowIterator:
+        raise NotFound(destination)
+
+    def table_modified(self, table_id: str) -> float:
+        return 0.0
+
+    def schema_tables(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        return []
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> float:
+    """Fastest of ``repeat`` runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(percentile / 100 * (len(ordered) - 1))))]
+
+
+def _metadata() -> QueryMetadata:
+    return QueryMetadata(
+        execution_time=1.2,
+        bytes_processed=10485760,
+        query_id="bench",
+        timestamp=datetime.now(),
+        cost_estimate=0.0001
+    )
+
+
+def run_micro(backend: FakeBigQueryBackend, row_counts: List[int], repeat: int) -> List[Dict[str, Any]]:
+    service = BigQueryService(project_id="bench", dataset_id="bench", backend=backend)
+    data_service = DataService()
+    results = []
+
+    def record(case: str, schema_name: str, num_rows: int, ms: float) -> None:
+        results.append({
+            "case": case,
+            "schema": schema_name,
+            "rows": num_rows,
+            "ms": round(ms, 3),
+            "rows_per_s": round(num_rows / (ms / 1000)) if ms else None,
+        })
+
+    for num_rows in row_counts:
+        nested_fields, nested_rows = backend.result("nested", num_rows)
+        values = [value for row in nested_rows for value in row]
+        record("serialize_value", "nested", num_rows, _best_of(repeat, lambda: [service._serialize_value(v) for v in values]))
+        record("convert_rows", "nested", num_rows, _best_of(
+            repeat, lambda: service._convert_rows(FakeRowIterator(nested_fields, nested_rows))
+        ))
+
+        for schema_name in SCHEMAS:
+            fields, rows = backend.result(schema_name, num_rows)
+            record("convert_rows", schema_name, num_rows, _best_of(
+                repeat, lambda: service._convert_rows(FakeRowIterator(fields, rows))
+            ))
+
+            raw_results = service._convert_rows(FakeRowIterator(fields, rows))
+            record("process_results", schema_name, num_rows, _best_of(
+                repeat, lambda: data_service.process_results(raw_results)
+            ))
+            record("process_results:line_chart", schema_name, num_rows, _best_of(
+                repeat, lambda: data_service.process_results(raw_results, FlChartType.LINE_CHART)
+            ))
+
+            data = data_service.process_results(raw_results)
+            build = lambda: SQLQueryResponse.model_construct(status=QueryStatus.SUCCESS, data=data, metadata=_metadata())
+            record("response_model", schema_name, num_rows, _best_of(repeat, build))
+            response = build()
+            record("response_encode", schema_name, num_rows, _best_of(
+                repeat, lambda: _encode_response(response, ResultFormat.ROWS)
+            ))
+
+    return results
+
+
+async def _load(schema_name: str, num_rows: int, total_requests: int, concurrency: int) -> Dict[str, Any]:
+    """Send ``total_requests`` different queries with at most ``concurrency`` in flight"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        async def one(index: int) -> None:
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/query", json={
+                    "query": f"SELECT * FROM bench_{schema_name}_{num_rows} WHERE request = {index}",
+                    "limit": min(max(num_rows, 1), 10000),
+                    "use_cache": False,
+                })
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status_code != 200 or response.json().get("status") != QueryStatus.SUCCESS:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(index) for index in range(total_requests)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "case": "query_endpoint",
+        "schema": schema_name,
+        "rows": num_rows,
+        "ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(_percentile(latencies, 95), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "requests_per_s": round(total_requests / elapsed, 1),
+        "concurrency": concurrency,
+        "errors": errors,
+    }
+
+
+def run_endpoint(backend: FakeBigQueryBackend, row_counts: List[int], total_requests: int, concurrency: int) -> List[Dict[str, Any]]:
+    app.dependency_overrides[get_bigquery_service] = lambda: BigQueryService(project_id="bench", dataset_id="bench", backend=backend)
+    try:
+        results = []
+        for num_rows in row_counts:
+            for schema_name in SCHEMAS:
+                # Fewer requests for large results keep a run within minutes
+                requests = max(concurrency, total_requests * 1000 // max(num_rows, 1000))
+                results.append(asyncio.run(_load(schema_name, num_rows, requests, concurrency)))
+        return results
+    finally:
+        app.dependency_overrides.pop(get_bigquery_service, None)
+
+
+def compare(
+    results: List[Dict[str, Any]],
+    baseline: Dict[str, Any],
+    tolerance: float,
+    min_delta_ms: float = 0.05
+) -> List[Dict[str, Any]]:
+    """
+    Cases whose time grew by more than ``tolerance`` over the baseline; differences
+    under ``min_delta_ms`` are timer noise and never count
+    """
+    previous = {(entry["case"], entry["schema"], entry["rows"]): entry for entry in baseline.get("results", [])}
+    regressions = []
+    for entry in results:
+        before = previous.get((entry["case"], entry["schema"], entry["rows"]))
+        if before is None or entry["ms"] - before["ms"] < min_delta_ms:
+            continue
+        if entry["ms"] > before["ms"] * (1 + tolerance):
+            regressions.append({**entry, "baseline_ms": before["ms"], "ratio": round(entry["ms"] / before["ms"], 2)})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="/query requests per case (scaled down for large results)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--skip-endpoint", action="store_true", help="Only run the in-process cases")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown over the baseline (0.25 = 25%%)")
+    args = parser.parse_args()
+    # Per-query service logs would dominate the timings
+    logging.disable(logging.INFO)
+
+    backend = FakeBigQueryBackend()
+    results = run_micro(backend, args.rows, args.repeat)
+    if not args.skip_endpoint:
+        results += run_endpoint(backend, args.rows, args.requests, args.concurrency)
+
+    report = {
+        "benchmark": "hot_paths",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            report["regressions"] = compare(results, json.load(baseline_file), args.tolerance)
+
+    print(f"{'case':<28}{'schema':<8}{'rows':>7}{'ms':>11}{'p99 ms':>10}{'rows/s | req/s':>17}")
+    for entry in results:
+        throughput = entry.get("rows_per_s") or entry.get("requests_per_s")
+        print(
+            f"{entry['case']:<28}{entry['schema']:<8}{entry['rows']:>7}{entry['ms']:>11.3f}"
+            f"{entry.get('p99_ms', float('nan')):>10.2f}{throughput if throughput is not None else '-':>17}"
+        )
+    for entry in report.get("regressions", []):
+        print(f"REGRESSION {entry['case']} {entry['schema']} {entry['rows']}: {entry['baseline_ms']} -> {entry['ms']} ms (x{entry['ratio']})")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
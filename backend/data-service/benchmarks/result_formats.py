@@ -0,0 +1,164 @@
+"""
+Compare payload size and encode/decode time of the /query wire formats.
+
+Run from the data-service directory:
+    python -m benchmarks.result_formats [--rows 1000 10000] [--repeat 5]
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+import argparse
+import json
+import random
+import time
+
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+
+from utils.result_formats import (
+    to_columnar,
+    encode_msgpack,
+    decode_msgpack,
+    encode_arrow,
+    decode_arrow,
+)
+
+
+NARROW_SCHEMA = [
+    ("FACFCH", "DATE"),
+    ("PRDDSC", "STRING"),
+    ("FACLINCNT", "NUMERIC"),
+    ("FACTOT", "NUMERIC"),
+]
+
+WIDE_SCHEMA = NARROW_SCHEMA + [
+    ("FACPLAID", "INTEGER"),
+    ("FACTPODOC", "STRING"),
+    ("FACNRO", "INTEGER"),
+    ("FACSERIE", "STRING"),
+    ("CLIID", "INTEGER"),
+    ("CLINOM", "STRING"),
+    ("CLIIDDIR", "INTEGER"),
+    ("FACNEGID", "STRING"),
+    ("POLID", "INTEGER"),
+    ("DSTID", "INTEGER"),
+    ("DSTNOM", "STRING"),
+    ("FACMONID", "INTEGER"),
+    ("MONSIG", "STRING"),
+    ("PLANOM", "STRING"),
+    ("DPTONOM", "STRING"),
+    ("LOCALINOM", "STRING"),
+]
+
+
+def _generate_value(field_type: str, index: int, rng: random.Random) -> Any:
+    if field_type == "DATE":
+        return (datetime(2024, 1, 1) + timedelta(days=index % 365)).date().isoformat()
+    if field_type == "STRING":
+        return f"VALOR {rng.randint(1, 500)}"
+    if field_type == "NUMERIC":
+        return float(Decimal(rng.randint(1, 10_000_000)) / 100)
+    return rng.randint(1, 100_000)
+
+
+def generate_result(schema: List[Tuple[str, str]], num_rows: int) -> Dict[str, Any]:
+    """Build rows and columns shaped like BigQueryService.execute_query output"""
+    rng = random.Random(42)
+    columns = [
+        {"name": name, "type": field_type, "mode": "NULLABLE", "description": None}
+        for name, field_type in schema
+    ]
+    rows = [
+        {name: _generate_value(field_type, index, rng) for name, field_type in schema}
+        for index in range(num_rows)
+    ]
+    return {"rows": rows, "columns": columns}
+
+
+def _document(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "status": "success",
+        "data": data,
+        "metadata": {
+            "execution_time": 1.2,
+            "rows_processed": None,
+            "bytes_processed": 10485760,
+            "query_id": "bench",
+            "timestamp": datetime.now().isoformat(),
+            "cost_estimate": 0.0001,
+        },
+    }
+
+
+def _encoders(result: Dict[str, Any]) -> Dict[str, Tuple[Callable[[], bytes], Callable[[bytes], Any]]]:
+    rows, columns = result["rows"], result["columns"]
+    arrow_table = pa.Table.from_pylist(rows)
+
+    def encode_rows() -> bytes:
+        document = _document({"data": rows, "columns": columns})
+        return json.dumps(jsonable_encoder(document)).encode("utf-8")
+
+    def encode_columnar() -> bytes:
+        document = _document({"data": to_columnar(rows, columns), "columns": columns})
+        return json.dumps(jsonable_encoder(document)).encode("utf-8")
+
+    def encode_msgpack_columnar() -> bytes:
+        return encode_msgpack(_document({"data": to_columnar(rows, columns), "columns": columns}))
+
+    def encode_arrow_ipc() -> bytes:
+        return encode_arrow(arrow_table, _document({})["metadata"])
+
+    return {
+        "json rows": (encode_rows, json.loads),
+        "json columnar": (encode_columnar, json.loads),
+        "msgpack": (encode_msgpack_columnar, decode_msgpack),
+        "arrow ipc": (encode_arrow_ipc, decode_arrow),
+    }
+
+
+def _best_of(repeat: int, func: Callable[[], Any]) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(row_counts: List[int], repeat: int) -> List[Dict[str, Any]]:
+    results = []
+    for schema_name, schema in (("narrow", NARROW_SCHEMA), ("wide", WIDE_SCHEMA)):
+        for num_rows in row_counts:
+            result = generate_result(schema, num_rows)
+            for format_name, (encode, decode) in _encoders(result).items():
+                payload = encode()
+                results.append({
+                    "schema": schema_name,
+                    "rows": num_rows,
+                    "format": format_name,
+                    "bytes": len(payload),
+                    "encode_ms": _best_of(repeat, encode) * 1000,
+                    "decode_ms": _best_of(repeat, lambda: decode(payload)) * 1000,
+                })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'schema':<8}{'rows':>8}  {'format':<15}{'bytes':>12}{'vs rows':>9}{'encode ms':>11}{'decode ms':>11}")
+    baseline = {}
+    for entry in run(args.rows, args.repeat):
+        key = (entry["schema"], entry["rows"])
+        baseline.setdefault(key, entry["bytes"])
+        print(
+            f"{entry['schema']:<8}{entry['rows']:>8}  {entry['format']:<15}{entry['bytes']:>12}"
+            f"{entry['bytes'] / baseline[key]:>9.2f}{entry['encode_ms']:>11.2f}{entry['decode_ms']:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
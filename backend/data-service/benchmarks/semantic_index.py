@@ -0,0 +1,135 @@
+"""
+Search latency and recall of the local semantic cache index.
+
+The index is filled with synthetic 768-dimension vectors shaped like text
+embeddings: a direction every vector shares, topics, and questions spread
+around their topic. Half of the queries rephrase a stored question (small
+noise on its vector) and half are new questions on a stored topic, so both
+hits and misses at the cosine threshold are exercised.
+
+For every size the exact scan is compared with the inverted-file search at
+several probe counts:
+- recall@1 / recall@k: share of the exact top 1 / top k the approximate search also returns
+- agreement: share of queries with the same outcome at the threshold (same entry, or a miss for both)
+- p50 / p99 search latency and the time to build the k-means lists
+
+Run from the data-service directory:
+    python -m benchmarks.semantic_index [--sizes 1000 10000 50000] [--probes 4 8 16] [--threshold 0.4]
+"""
+from typing import Any, Dict, List, Tuple
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from utils.vector_index import VectorIndex
+
+DIMENSIONS = 768
+QUESTIONS_PER_TOPIC = 20
+
+
+def generate_vectors(rng: np.random.Generator, size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Stored vectors and their topic centres"""
+    shared = rng.normal(size=DIMENSIONS)
+    topics = rng.normal(size=(max(1, size // QUESTIONS_PER_TOPIC), DIMENSIONS)) + 1.5 * shared
+    members = topics[rng.integers(0, len(topics), size)]
+    return (members + 0.9 * rng.normal(size=(size, DIMENSIONS))).astype(np.float32), topics
+
+
+def generate_queries(rng: np.random.Generator, vectors: np.ndarray, topics: np.ndarray, count: int) -> np.ndarray:
+    rephrased = vectors[rng.integers(0, len(vectors), count // 2)]
+    rephrased = rephrased + 0.35 * rng.normal(size=rephrased.shape)
+    new = topics[rng.integers(0, len(topics), count - count // 2)]
+    new = new + 0.9 * rng.normal(size=new.shape)
+    return np.vstack([rephrased, new]).astype(np.float32)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _searches(index: VectorIndex, queries: np.ndarray, k: int, exact: bool) -> Tuple[List[List[Any]], List[float]]:
+    results, timings = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(index.search(query, k, exact=exact))
+        timings.append(time.perf_counter() - start)
+    return results, timings
+
+
+def _first_within(matches: List[Any], threshold: float) -> Any:
+    return matches[0][0] if matches and matches[0][1] <= threshold else None
+
+
+def run(sizes: List[int], probe_counts: List[int], num_queries: int, k: int, threshold: float, seed: int) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        vectors, topics = generate_vectors(rng, size)
+        queries = generate_queries(rng, vectors, topics, num_queries)
+
+        index = VectorIndex(DIMENSIONS, ivf_min_size=1, seed=seed)
+        start = time.perf_counter()
+        index.replace((str(row), vector, None, None) for row, vector in enumerate(vectors))
+        build_s = time.perf_counter() - start
+
+        exact, exact_timings = _searches(index, queries, k, exact=True)
+        hits = sum(_first_within(matches, threshold) is not None for matches in exact)
+        results.append({
+            "size": size,
+            "search": "exact",
+            "recall_at_1": 1.0,
+            "recall_at_k": 1.0,
+            "agreement": 1.0,
+            "hit_rate": hits / len(queries),
+            "p50_us": statistics.median(exact_timings) * 1e6,
+            "p99_us": _percentile(exact_timings, 0.99) * 1e6,
+            "build_s": 0.0,
+        })
+
+        for probes in probe_counts:
+            index.probes = probes
+            approximate, timings = _searches(index, queries, k, exact=False)
+            top1 = top_k = agree = 0
+            for expected, found in zip(exact, approximate):
+                expected_ids = [item_id for item_id, _, _ in expected]
+                found_ids = {item_id for item_id, _, _ in found}
+                top1 += bool(found) and found[0][0] == expected_ids[0]
+                top_k += len(found_ids.intersection(expected_ids)) / len(expected_ids)
+                agree += _first_within(found, threshold) == _first_within(expected, threshold)
+            results.append({
+                "size": size,
+                "search": f"ivf {probes}/{index.stats()['ivf_lists']}",
+                "recall_at_1": top1 / len(queries),
+                "recall_at_k": top_k / len(queries),
+                "agreement": agree / len(queries),
+                "hit_rate": sum(_first_within(matches, threshold) is not None for matches in approximate) / len(queries),
+                "p50_us": statistics.median(timings) * 1e6,
+                "p99_us": _percentile(timings, 0.99) * 1e6,
+                "build_s": build_s,
+            })
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 8, 16])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.4, help="Cosine distance of a cache hit (retrieve_query's default)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'size':>7}  {'search':<12}{'recall@1':>9}{f'recall@{args.k}':>10}{'agree':>8}{'hits':>7}{'p50 us':>9}{'p99 us':>9}{'build s':>9}")
+    for entry in run(args.sizes, args.probes, args.queries, args.k, args.threshold, args.seed):
+        print(
+            f"{entry['size']:>7}  {entry['search']:<12}{entry['recall_at_1']:>9.3f}{entry['recall_at_k']:>10.3f}"
+            f"{entry['agreement']:>8.3f}{entry['hit_rate']:>7.2f}{entry['p50_us']:>9.0f}{entry['p99_us']:>9.0f}{entry['build_s']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
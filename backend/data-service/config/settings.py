@@ -2,6 +2,7 @@
 Application settings and configuration.
 """
 from functools import lru_cache
+from pathlib import Path
 from typing import List
 
 from pydantic import Field
@@ -42,9 +43,179 @@ class Settings(BaseSettings):
     )
     GCS_BUCKET_NAME: str = Field(..., description="GCS bucket name for cache, query storage")
     
+    # Execution backend settings
+    EXECUTION_BACKEND: str = Field(
+        default="bigquery",
+        description="Engine queries run on: bigquery, or local for the generated DuckDB stand-in (tests, benchmarks)"
+    )
+    LOCAL_ENGINE_SCHEMA_FILE: str = Field(
+        default=str(Path(__file__).resolve().parent / "local_engine_schema.sql"),
+        description="SQL file (or Python file with a schema_constant string) whose DDL defines the local engine tables"
+    )
+    LOCAL_ENGINE_SCALE: int = Field(default=10_000, description="Rows of each header table (FACCAB, DOCCRG) in the local engine")
+    LOCAL_ENGINE_SEED: int = Field(default=0, description="Seed of the local engine data generator")
+
     # BigQuery Settings
     BIGQUERY_DATASET: str = Field(..., description="BigQuery dataset name")
     BIGQUERY_LOCATION: str = Field(default="US", description="BigQuery location")
+    BIGQUERY_CLIENT_POOL_SIZE: int = Field(
+        default=2,
+        description="Long-lived BigQuery clients shared by all requests"
+    )
+    BIGQUERY_KEEPALIVE_SECONDS: int = Field(
+        default=240,
+        description="Interval between warm-up calls that keep BigQuery connections open (0 disables)"
+    )
+    BIGQUERY_MAX_WORKERS: int = Field(
+        default=16,
+        description="Worker threads running blocking BigQuery calls"
+    )
+    BIGQUERY_MAX_QUEUE_DEPTH: int = Field(
+        default=64,
+        description="BigQuery calls allowed to wait for a worker before new ones are rejected"
+    )
+    BATCH_MAX_CONCURRENCY: int = Field(
+        default=4,
+        description="Queries of one /query/batch request running at the same time"
+    )
+    QUERY_STREAM_PAGE_SIZE: int = Field(
+        default=500,
+        description="Rows fetched per BigQuery page when streaming query results as NDJSON"
+    )
+    DRY_RUN_CACHE_SIZE: int = Field(
+        default=1024,
+        description="Maximum number of dry-run validation results kept in memory"
+    )
+    SQL_ANALYSIS_CACHE_SIZE: int = Field(
+        default=4096,
+        description="Query texts whose analysis (normalized form, fingerprint, tables, LIMIT) is kept in memory"
+    )
+    QUERY_STATS_MAX_FINGERPRINTS: int = Field(
+        default=1000,
+        description="Query shapes tracked by /stats/queries; the least called are evicted beyond this"
+    )
+    QUERY_STATS_LATENCY_SAMPLES: int = Field(default=256, description="Most recent calls of a query shape its p95 time is computed over")
+    QUERY_SKIP_DRY_RUN: bool = Field(
+        default=False,
+        description="Submit uncached queries without a separate dry run and validate them from the real job; admission control then charges the bytes they processed once finished, without the per-query cap or expensive slots"
+    )
+
+    # Result cache settings
+    RESULT_CACHE_ENABLED: bool = Field(default=True, description="Serve repeated queries from the result cache")
+    RESULT_CACHE_TTL_SECONDS: int = Field(default=300, description="Lifetime of a cached query result")
+    RESULT_CACHE_MAX_BYTES: int = Field(
+        default=256 * 1024 * 1024,
+        description="Approximate memory budget of the in-process result cache"
+    )
+    TABLE_METADATA_TTL_SECONDS: int = Field(
+        default=60,
+        description="How long a table's last-modified time is trusted before BigQuery is asked again"
+    )
+    SCHEMA_REFRESH_SECONDS: int = Field(
+        default=600,
+        description="Interval between background refreshes of the schema served by /schemas (0 disables)"
+    )
+    SCHEMA_HISTORY_SIZE: int = Field(default=16, description="Previous schema versions /schemas?since= can diff against")
+
+    # Local replica settings
+    LOCAL_REPLICA_SNAPSHOT_URI: str = Field(
+        default="",
+        description="Folder (local path or gs://bucket/prefix) with one folder of Parquet files per master table; empty disables the replica"
+    )
+    LOCAL_REPLICA_TABLES: List[str] = Field(
+        default=[
+            "PLANTAS", "MONEDAS", "DISTRIBUIDORAS", "PRODUCTOS", "PRDGRP", "PRDCAT", "DEPARTAMENTOS",
+            "LOCALIDADES", "POLITICAS", "MERCADOS", "NEGOCIOS", "NEGTPO", "CLITPO"
+        ],
+        description="Master tables copied to the local replica"
+    )
+    LOCAL_REPLICA_REFRESH_SECONDS: int = Field(default=3600, description="Interval between reloads of the replica snapshots")
+    LOCAL_REPLICA_EXPORT_ON_REFRESH: bool = Field(
+        default=False,
+        description="Export fresh snapshots from BigQuery before each reload (needs a gs:// snapshot URI)"
+    )
+    LOCAL_REPLICA_MAX_WORKERS: int = Field(default=4, description="Threads running queries on the local replica")
+
+    # Rollup settings
+    ROLLUPS_ENABLED: bool = Field(default=False, description="Build daily rollups of the fact tables and rewrite aggregate queries to read them")
+    ROLLUP_DATASET_ID: str = Field(default="", description="Dataset holding the rollup tables; empty uses the data dataset")
+    ROLLUP_REFRESH_SECONDS: int = Field(default=3600, description="Interval between rebuilds of the rollup tables")
+
+    # Admission control settings (byte figures come from dry-run estimates, or the finished job without a dry run)
+    ADMISSION_ENABLED: bool = Field(default=True, description="Check queries against byte caps and budgets before running them")
+    ADMISSION_MAX_QUERY_BYTES: int = Field(
+        default=200 * 1024 ** 3,
+        description="Queries estimated to scan more than this are rejected outright"
+    )
+    ADMISSION_EXPENSIVE_BYTES: int = Field(
+        default=10 * 1024 ** 3,
+        description="Queries estimated at or above this need an expensive-query slot"
+    )
+    ADMISSION_MAX_EXPENSIVE_RUNNING: int = Field(default=2, description="Expensive queries running at the same time")
+    ADMISSION_MAX_EXPENSIVE_QUEUED: int = Field(default=16, description="Expensive queries allowed to wait for a slot")
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = Field(default=60, description="Longest wait for an expensive-query slot")
+    ADMISSION_WINDOW_SECONDS: int = Field(default=3600, description="Rolling window of the byte budgets")
+    ADMISSION_USER_BUDGET_BYTES: int = Field(
+        default=500 * 1024 ** 3,
+        description="Bytes one user may scan per window"
+    )
+    ADMISSION_GLOBAL_BUDGET_BYTES: int = Field(
+        default=2 * 1024 ** 4,
+        description="Bytes the whole service may scan per window"
+    )
+
+    # Result pagination settings
+    QUERY_DEFAULT_PAGE_SIZE: int = Field(
+        default=0,
+        description="Rows returned by /query when the request sets no page_size (0 returns the whole result)"
+    )
+    QUERY_CURSOR_TTL_SECONDS: int = Field(
+        default=3600,
+        description="Lifetime of a pagination cursor (BigQuery keeps job results for about 24 hours)"
+    )
+    QUERY_CURSOR_SECRET: str = Field(
+        default="",
+        description="Key used to sign pagination cursors; set it so cursors work across instances"
+    )
+
+    # Slow query log settings
+    SLOW_QUERY_LOG_THRESHOLD_SECONDS: float = Field(
+        default=5.0,
+        description="Requests taking at least this long are written to the slow query log (0 disables it)"
+    )
+    SLOW_QUERY_LOG_PATH: str = Field(default="logs/slow_queries.log", description="File of the slow query log, one JSON object per line")
+    SLOW_QUERY_LOG_MAX_BYTES: int = Field(default=10 * 1024 * 1024, description="Size at which the slow query log is rotated")
+    SLOW_QUERY_LOG_BACKUP_COUNT: int = Field(default=5, description="Rotated slow query log files kept")
+
+    # Response compression settings
+    COMPRESSION_ENABLED: bool = Field(default=True, description="Compress responses with the zstd or gzip coding the client accepts")
+    COMPRESSION_MIN_SIZE: int = Field(default=1024, description="Responses smaller than this many bytes are sent uncompressed")
+    COMPRESSION_GZIP_LEVEL: int = Field(default=1, description="gzip compression level (1 fastest, 9 smallest)")
+    COMPRESSION_ZSTD_LEVEL: int = Field(default=1, description="zstd compression level (1 fastest, 19 smallest)")
+
+    # Chart shaping settings
+    CHART_MAX_POINTS: int = Field(default=500, description="Points kept for line (LTTB) and scatter (sampling) charts")
+    CHART_MAX_CATEGORIES: int = Field(default=20, description="Categories kept for bar charts")
+    CHART_PIE_TOP_N: int = Field(default=8, description="Slices of a pie chart, including the one that groups the rest")
+    CHART_OTHER_LABEL: str = Field(default="Otros", description="Label of the pie slice that groups the smaller ones")
+    
+    # Semantic cache index settings
+    SEMANTIC_INDEX_ENABLED: bool = Field(default=True, description="Search cached queries in a local copy of the Firestore vectors")
+    SEMANTIC_INDEX_SYNC_SECONDS: int = Field(default=30, description="Interval between reads of new cache entries from Firestore")
+    SEMANTIC_INDEX_FULL_SYNC_SECONDS: int = Field(
+        default=3600,
+        description="Interval between full reloads, which drop entries deleted in Firestore"
+    )
+    SEMANTIC_INDEX_IVF_MIN_SIZE: int = Field(
+        default=20_000,
+        description="Entries from which searches probe k-means lists instead of scanning every vector"
+    )
+    SEMANTIC_INDEX_IVF_PROBES: int = Field(default=8, description="Lists scored per search once the lists are built")
+    EMBEDDING_MEMO_SIZE: int = Field(default=1024, description="Query embeddings kept for reuse between cache lookup and save")
+    EMBEDDING_MEMO_TTL_SECONDS: int = Field(
+        default=3600,
+        description="Seconds an embedding (and its handle) stays reusable after it was computed"
+    )
     
     # API Keys and External Services
     LLM_SERVICE_URL: str = Field(
@@ -1,12 +1,27 @@
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator
+import asyncio
 import logging
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
 from config.settings import get_settings
 from api.query.router import router as query_router
+from services.bigquery_service import bigquery_executor, query_single_flight, get_bigquery_service
+from services.local_engine import local_engine
+from services.bigquery_client_pool import bigquery_client_pool
+from services.result_cache import result_cache
+from services.admission_control import admission_controller
+from services.schema_registry import schema_registry
+from services.local_replica import local_replica, replica_executor
+from services.rollups import rollup_manager
+from services.query_stats import query_stats
+from services.slow_query_log import slow_query_log
+from utils.cache_connection import embedding_memo, semantic_cache_index
+from utils.compression import CompressionMiddleware, compression_stats
+from utils.sql_analysis import sql_analyzer
+from utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
 
 
 logging.basicConfig(level=logging.INFO)
@@ -15,15 +30,117 @@ logger = logging.getLogger(__name__)
 settings = get_settings()
 
 
+async def keep_bigquery_clients_warm(interval_seconds: int) -> None:
+    """Periodically touch the pooled clients so idle connections are not dropped."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        await bigquery_executor.run(bigquery_client_pool.warm_up)
+
+
+async def refresh_schema_periodically(interval_seconds: int) -> None:
+    """Re-read the dataset schema so /schemas never waits on INFORMATION_SCHEMA."""
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await schema_registry.refresh(get_bigquery_service())
+        except Exception as e:
+            logger.error(f"Schema refresh failed: {e}")
+
+
+async def refresh_local_replica_periodically(interval_seconds: int) -> None:
+    """Reload the master-table snapshots, exporting fresh ones from BigQuery first if configured."""
+    while True:
+        try:
+            if settings.LOCAL_REPLICA_EXPORT_ON_REFRESH:
+                await bigquery_executor.run(local_replica.export_snapshots, bigquery_client_pool.get())
+            await local_replica.refresh()
+        except Exception as e:
+            logger.error(f"Local replica refresh failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+async def refresh_rollups_periodically(interval_seconds: int) -> None:
+    """Rebuild the rollup tables; rollups built by an earlier run are reused until the first rebuild."""
+    try:
+        await bigquery_executor.run(rollup_manager.load_state, bigquery_client_pool.get())
+    except Exception as e:
+        logger.error(f"Could not read rollup state: {e}")
+    built = rollup_manager.stats()["built"]
+    if len(built) == len(rollup_manager.rollups):
+        await asyncio.sleep(interval_seconds)
+    while True:
+        try:
+            await bigquery_executor.run(rollup_manager.refresh, bigquery_client_pool.get())
+        except Exception as e:
+            logger.error(f"Rollup refresh failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
+async def sync_semantic_index_periodically(interval_seconds: int) -> None:
+    """Keep the local copy of the semantic cache vectors in step with Firestore."""
+    while True:
+        try:
+            # Not on bigquery_executor: a full Firestore scan must not hold slots queries wait for
+            await asyncio.to_thread(semantic_cache_index.sync)
+        except Exception as e:
+            logger.error(f"Semantic index sync failed: {e}")
+        await asyncio.sleep(interval_seconds)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Application lifespan events."""
     
     logger.info(f"Starting chatbot data service V: {settings.VERSION}")
 
+    slow_query_log.start()
+
+    local_backend = settings.EXECUTION_BACKEND == "local"
+    try:
+        if local_backend:
+            await bigquery_executor.run(local_engine.open)
+        else:
+            await bigquery_executor.run(bigquery_client_pool.open)
+    except Exception as e:
+        # The pool retries on first use; /health reports it as degraded meanwhile
+        logger.error(f"Could not open {settings.EXECUTION_BACKEND} execution backend: {e}")
+    keepalive_task = None
+    if settings.BIGQUERY_KEEPALIVE_SECONDS > 0 and not local_backend:
+        keepalive_task = asyncio.create_task(keep_bigquery_clients_warm(settings.BIGQUERY_KEEPALIVE_SECONDS))
+
+    schema_refresh_task = None
+    if settings.SCHEMA_REFRESH_SECONDS > 0:
+        schema_refresh_task = asyncio.create_task(refresh_schema_periodically(settings.SCHEMA_REFRESH_SECONDS))
+
+    replica_refresh_task = None
+    if local_replica.enabled:
+        replica_refresh_task = asyncio.create_task(refresh_local_replica_periodically(settings.LOCAL_REPLICA_REFRESH_SECONDS))
+
+    rollup_refresh_task = None
+    if rollup_manager.enabled:
+        rollup_refresh_task = asyncio.create_task(refresh_rollups_periodically(settings.ROLLUP_REFRESH_SECONDS))
+
+    semantic_index_task = None
+    if settings.SEMANTIC_INDEX_ENABLED:
+        semantic_index_task = asyncio.create_task(sync_semantic_index_periodically(settings.SEMANTIC_INDEX_SYNC_SECONDS))
+
     yield
 
     logger.info("Shutting down chatbot data service")
+    if semantic_index_task:
+        semantic_index_task.cancel()
+    if rollup_refresh_task:
+        rollup_refresh_task.cancel()
+    if replica_refresh_task:
+        replica_refresh_task.cancel()
+    replica_executor.shutdown(wait=False)
+    if keepalive_task:
+        keepalive_task.cancel()
+    if schema_refresh_task:
+        schema_refresh_task.cancel()
+    bigquery_executor.shutdown(wait=False)
+    bigquery_client_pool.close()
+    slow_query_log.stop()
     
 
 def create_app() -> FastAPI:
@@ -43,6 +160,14 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            minimum_size=settings.COMPRESSION_MIN_SIZE,
+            gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+            zstd_level=settings.COMPRESSION_ZSTD_LEVEL,
+        )
+
     app.include_router(query_router)
 
     return app
@@ -58,6 +183,11 @@ async def root():
         "status": "running"
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus metrics: stage latencies, bytes processed and billed, in-flight queries, executor queues, semantic cache."""
+    return Response(content=metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint to verify all clients are working."""
@@ -66,9 +196,28 @@ async def health_check():
             "service": "Chatbot Data Service",
             "version": settings.VERSION,
             "status": "healthy",
-            "clients": {}
+            "clients": {
+                "bigquery": bigquery_client_pool.stats()
+            },
+            "execution_backend": local_engine.stats() if settings.EXECUTION_BACKEND == "local" else {"name": "bigquery"},
+            "bigquery_executor": bigquery_executor.stats(),
+            "result_cache": result_cache.stats(),
+            "admission_control": admission_controller.stats(),
+            "query_coalescing": query_single_flight.stats(),
+            "schema": schema_registry.stats(),
+            "local_replica": local_replica.stats(),
+            "rollups": rollup_manager.stats(),
+            "compression": compression_stats.stats(),
+            "sql_analysis": sql_analyzer.stats(),
+            "query_stats": query_stats.stats(),
+            "slow_query_log": slow_query_log.stats(),
+            "semantic_index": semantic_cache_index.stats(),
+            "embedding_memo": embedding_memo.stats()
         }
-        
+
+        bigquery_client = health_status["clients"]["bigquery"]
+        if settings.EXECUTION_BACKEND != "local" and (bigquery_client["status"] != "open" or bigquery_client["last_warmup_error"]):
+            health_status["status"] = "degraded"
         
         return health_status
         
@@ -5,4 +5,11 @@ class FlChartType(str, Enum):
     LINE_CHART = "line_chart"
     BAR_CHART = "bar_chart"
     PIE_CHART = "pie_chart"
-    SCATTER_CHART = "scatter_chart"
\ No newline at end of file
+    SCATTER_CHART = "scatter_chart"
+
+class ResultFormat(str, Enum):
+    ROWS = "rows"
+    COLUMNAR = "columnar"
+    ARROW = "arrow"
+    MSGPACK = "msgpack"
+    NDJSON = "ndjson"
@@ -3,12 +3,21 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime
 from enum import Enum
 
+from models.data.model import FlChartType
+from utils.sql_analysis import sql_analyzer
+
 
 class QueryStatus(str, Enum):
     SUCCESS = "success"
     ERROR = "error"
     TIMEOUT = "timeout"
     INVALID_SQL = "invalid_sql"
+    TOO_EXPENSIVE = "too_expensive"
+    BUDGET_EXCEEDED = "budget_exceeded"
+
+
+# Statements that change data or schema, reported by name when a query has one
+DANGEROUS_STATEMENTS = {'DROP', 'DELETE', 'TRUNCATE', 'UPDATE', 'ALTER', 'CREATE', 'INSERT', 'MERGE'}
 
 
 # Request Models
@@ -18,28 +27,40 @@ class SQLQueryRequest(BaseModel):
     timeout: Optional[int] = Field(default=30, ge=5, le=300, description="Query timeout in seconds")
     parameters: Optional[Dict[str, Any]] = Field(default={}, description="Query parameters for parameterized queries")
     metadata: Optional[Dict[str, Any]] = Field(default={}, description="Additional metadata for the query")
+    use_cache: Optional[bool] = Field(default=True, description="Allow serving the result from the query result cache")
+    page_size: Optional[int] = Field(default=None, ge=1, le=10000, description="Rows in the first page; the rest is read through next_cursor")
+    chart_type: Optional[FlChartType] = Field(default=None, description="Shape and downsample the rows for this chart type")
+    max_points: Optional[int] = Field(default=None, ge=2, le=10000, description="Points, slices or categories kept when shaping for a chart")
     
     @field_validator('query')
     @classmethod
     def validate_sql_query(cls, v):
-        dangerous_keywords = ['DROP', 'DELETE', 'TRUNCATE', 'UPDATE', 'ALTER', 'CREATE', 'INSERT']
-        upper_query = v.upper()
-        for keyword in dangerous_keywords:
-            if keyword in upper_query:
-                raise ValueError(f"Dangerous SQL keyword '{keyword}' is not allowed")
-            
-        if 'SELECT' not in upper_query:
-            raise ValueError("Query must contain a SELECT statement")
-        
-        if 'FROM' not in upper_query:
+        analysis = sql_analyzer.analyze(v)
+        if not analysis.statement_types:
+            raise ValueError(f"Could not read the SQL query: {analysis.error or 'it is empty'}")
+
+        for statement_type in analysis.statement_types:
+            if statement_type in DANGEROUS_STATEMENTS:
+                raise ValueError(f"Dangerous SQL keyword '{statement_type}' is not allowed")
+            if statement_type != "SELECT":
+                raise ValueError("Query must contain a SELECT statement")
+
+        if not analysis.tables:
             raise ValueError("Query must contain a FROM statement")
-        
+
         return v
 
 class BatchQueryRequest(BaseModel):
     queries: List[SQLQueryRequest] = Field(..., description="List of SQL queries to execute")
     parallel: bool = Field(default=False, description="Execute queries in parallel")
 
+class SQLAnalysisRequest(BaseModel):
+    query: str = Field(..., description="SQL text to analyze, optionally inside a markdown sql block", min_length=1)
+
+class QueryPageRequest(BaseModel):
+    cursor: str = Field(..., description="next_cursor returned by a previous /query or /query/page call", min_length=1)
+    timeout: Optional[int] = Field(default=30, ge=5, le=300, description="Page fetch timeout in seconds")
+
 class QueryMetadata(BaseModel):
     execution_time: float 
     rows_processed: Optional[int] = None
@@ -47,6 +68,14 @@ class QueryMetadata(BaseModel):
     query_id: str
     timestamp: datetime
     cost_estimate: Optional[float] = None
+    cache_hit: bool = False
+    engine: str = Field(default="bigquery", description="Engine that answered the query: bigquery or local")
+    rollup: Optional[str] = Field(default=None, description="Rollup table the query was rewritten to read")
+    bytes_saved: Optional[int] = Field(default=None, description="Dry-run bytes the rollup saved over the original query")
+    stage_timings: Optional[Dict[str, float]] = Field(
+        default=None,
+        description="Seconds spent per stage before the metadata was built: dry_run, job_submit, job_execution, row_conversion, process_results; coalesced_wait when the request joined an identical query in flight"
+    )
 
 class SQLQueryResponse(BaseModel):
     status: QueryStatus
@@ -54,6 +83,7 @@ class SQLQueryResponse(BaseModel):
     metadata: Optional[QueryMetadata] = None
     error_message: Optional[str] = None
     suggestions: Optional[List[str]] = None
+    next_cursor: Optional[str] = None
 
 
 class ValidateQueryResponse(BaseModel):
@@ -65,6 +95,48 @@ class ValidateQueryResponse(BaseModel):
     suggestions: Optional[List[str]] = None
 
 
+class SQLAnalysisResponse(BaseModel):
+    sql: str = Field(..., description="SQL extracted from the text")
+    normalized: str = Field(..., description="SQL with whitespace and comments collapsed, as used for cache keys")
+    fingerprint: str = Field(..., description="Hash of the SQL with literals removed, shared by queries that differ only in constants")
+    statement_type: str = Field(..., description="SELECT, INSERT, UPDATE...; UNKNOWN when the text has no statement or several")
+    statement_types: List[str]
+    tables: List[str] = Field(..., description="Upper-case names of the referenced tables, without CTE names")
+    has_limit: bool = Field(..., description="Whether the (last) statement has a top-level LIMIT")
+    error: Optional[str] = Field(default=None, description="Why the SQL could not be fully parsed")
+
+
+class QueryStatsOrder(str, Enum):
+    BYTES_BILLED = "bytes_billed"
+    TOTAL_TIME = "total_time"
+    P95_TIME = "p95_time"
+    SLOT_MS = "slot_ms"
+    CALLS = "calls"
+    ERRORS = "errors"
+
+
+class QueryFingerprintStats(BaseModel):
+    fingerprint: str
+    sample_sql: str = Field(..., description="Normalized SQL of the first call with this fingerprint")
+    calls: int
+    cache_hits: int
+    errors: int
+    total_time_ms: float
+    mean_time_ms: float
+    p95_time_ms: float = Field(..., description="95th percentile over the most recent calls")
+    bytes_billed: int
+    slot_ms: int
+    first_seen: datetime
+    last_seen: datetime
+
+
+class QueryStatsResponse(BaseModel):
+    order_by: QueryStatsOrder
+    fingerprints_tracked: int
+    fingerprints_evicted: int
+    queries: List[QueryFingerprintStats]
+
+
 class BatchQueryResponse(BaseModel):
     results: List[SQLQueryResponse]
     overall_status: QueryStatus
@@ -78,6 +150,10 @@ class QueryEmbeddingRequest(BaseModel):
 class CacheInput(BaseModel):
     query_text: str
     sql_query: str
+    embedding_handle: Optional[str] = Field(
+        default=None,
+        description="Handle returned by /embeddings/search for this query_text; a handle of another text is rejected"
+    )
 class ColumnSchema(BaseModel):
     name: str
     type: str
@@ -88,4 +164,12 @@ class TableSchema(BaseModel):
 
 class DatasetSchema(BaseModel):
     dataset_id: str
-    tables: List[TableSchema]
\ No newline at end of file
+    tables: List[TableSchema]
+
+class SchemaDiff(BaseModel):
+    version: str
+    since: str
+    full: bool = Field(default=False, description="The since version is unknown, so every table is listed")
+    dataset_id: str
+    changed_tables: List[TableSchema]
+    removed_tables: List[str]
@@ -0,0 +1,251 @@
+"""
+Admission control for BigQuery jobs based on dry-run byte estimates.
+
+Every query is checked against a per-query hard cap and against rolling
+per-user and global byte budgets before it is submitted. Queries estimated
+above ADMISSION_EXPENSIVE_BYTES also need one of a few "expensive" slots,
+held until their job finishes; cheaper queries never take a slot, so they
+never wait behind expensive ones.
+
+Queries submitted without a dry run (QUERY_SKIP_DRY_RUN) have no estimate:
+they are admitted while the budgets are not used up and charged the bytes
+their job actually processed once it has finished. The per-query cap and
+the expensive slots do not apply to them.
+"""
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+import asyncio
+import logging
+import time
+
+from config.settings import get_settings
+from models.query.model import QueryStatus
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+GLOBAL_BUDGET = "__global__"
+
+
+def format_bytes(size: float) -> str:
+    """Human readable byte count (binary units)"""
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when a query is not admitted; carries the status and suggestions to report"""
+
+    def __init__(self, message: str, status: QueryStatus, suggestions: List[str]):
+        super().__init__(message)
+        self.status = status
+        self.suggestions = suggestions
+
+
+class RollingByteBudget:
+    """Bytes charged per key over the last ``window_seconds``"""
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self._charges: Dict[str, Deque[Tuple[float, int]]] = {}
+        self._totals: Dict[str, int] = {}
+
+    def used(self, key: str, now: Optional[float] = None) -> int:
+        self._expire(key, time.monotonic() if now is None else now)
+        return self._totals.get(key, 0)
+
+    def charge(self, key: str, size: int) -> None:
+        self._charges.setdefault(key, deque()).append((time.monotonic(), size))
+        self._totals[key] = self._totals.get(key, 0) + size
+
+    def refund(self, key: str, size: int) -> None:
+        """Remove the most recent charge of ``size`` bytes, if it is still in the window"""
+        charges = self._charges.get(key)
+        if not charges:
+            return
+        for index in range(len(charges) - 1, -1, -1):
+            if charges[index][1] == size:
+                del charges[index]
+                self._totals[key] -= size
+                break
+        self._expire(key, time.monotonic())
+
+    def _expire(self, key: str, now: float) -> None:
+        charges = self._charges.get(key)
+        if charges is None:
+            return
+        horizon = now - self.window_seconds
+        while charges and charges[0][0] <= horizon:
+            self._totals[key] -= charges.popleft()[1]
+        if not charges:
+            # Users without recent queries leave no state behind
+            del self._charges[key]
+            del self._totals[key]
+
+
+class AdmissionController:
+    """
+    Decides whether a query may run, given its estimated bytes and user.
+
+    Rejections are immediate: a query over the hard cap or over a budget never
+    waits. Only expensive queries queue, up to ``max_expensive_queued`` of
+    them, for at most ``queue_timeout`` seconds.
+    """
+
+    def __init__(
+        self,
+        max_query_bytes: int = settings.ADMISSION_MAX_QUERY_BYTES,
+        expensive_bytes: int = settings.ADMISSION_EXPENSIVE_BYTES,
+        user_budget_bytes: int = settings.ADMISSION_USER_BUDGET_BYTES,
+        global_budget_bytes: int = settings.ADMISSION_GLOBAL_BUDGET_BYTES,
+        window_seconds: float = settings.ADMISSION_WINDOW_SECONDS,
+        max_expensive_running: int = settings.ADMISSION_MAX_EXPENSIVE_RUNNING,
+        max_expensive_queued: int = settings.ADMISSION_MAX_EXPENSIVE_QUEUED,
+        queue_timeout: float = settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+    ):
+        self.max_query_bytes = max_query_bytes
+        self.expensive_bytes = expensive_bytes
+        self.user_budget_bytes = user_budget_bytes
+        self.global_budget_bytes = global_budget_bytes
+        self.max_expensive_running = max_expensive_running
+        self.max_expensive_queued = max_expensive_queued
+        self.queue_timeout = queue_timeout
+        self._budget = RollingByteBudget(window_seconds)
+        self._expensive_slots: Optional[asyncio.Semaphore] = None
+        self._expensive_running = 0
+        self._expensive_queued = 0
+        self._admitted = 0
+        self._rejected: Dict[str, int] = {}
+
+    @asynccontextmanager
+    async def admit(self, estimated_bytes: Optional[int], user_id: Optional[str] = None) -> AsyncIterator[bool]:
+        """
+        Admit a query for the duration of the ``async with`` block, or raise
+        AdmissionRejectedError. Yields whether the query holds an expensive slot.
+        """
+        estimated_bytes = estimated_bytes or 0
+        user_key = user_id or "anonymous"
+        self._check_limits(estimated_bytes, user_key)
+
+        # Budgets are charged up front so concurrent queries cannot overshoot them together
+        self._budget.charge(GLOBAL_BUDGET, estimated_bytes)
+        self._budget.charge(user_key, estimated_bytes)
+
+        expensive = estimated_bytes >= self.expensive_bytes
+        try:
+            if expensive:
+                await self._acquire_expensive_slot(estimated_bytes)
+        except BaseException:
+            self._budget.refund(GLOBAL_BUDGET, estimated_bytes)
+            self._budget.refund(user_key, estimated_bytes)
+            raise
+
+        self._admitted += 1
+        try:
+            yield expensive
+        finally:
+            if expensive:
+                self._expensive_running -= 1
+                self._expensive_slots.release()
+
+    def admit_unestimated(self, user_id: Optional[str] = None) -> None:
+        """
+        Admit a query that has no byte estimate, or raise AdmissionRejectedError
+        when the user or service budget is already used up. ``charge`` the
+        bytes it processed once its job has finished.
+        """
+        self._check_limits(0, user_id or "anonymous")
+        self._admitted += 1
+
+    def charge(self, processed_bytes: Optional[int], user_id: Optional[str] = None) -> None:
+        """Charge the budgets with the bytes a query admitted without an estimate processed"""
+        processed_bytes = processed_bytes or 0
+        self._budget.charge(GLOBAL_BUDGET, processed_bytes)
+        self._budget.charge(user_id or "anonymous", processed_bytes)
+
+    def _check_limits(self, estimated_bytes: int, user_key: str) -> None:
+        if estimated_bytes > self.max_query_bytes:
+            self._reject("max_query_bytes")
+            raise AdmissionRejectedError(
+                f"Query would scan {format_bytes(estimated_bytes)}, over the "
+                f"{format_bytes(self.max_query_bytes)} limit per query",
+                QueryStatus.TOO_EXPENSIVE,
+                [
+                    "Filter on the date or partition columns to scan less data",
+                    "Select only the columns you need instead of SELECT *",
+                    "Aggregate over a shorter period"
+                ]
+            )
+
+        # Queries admitted without an estimate are only rejected once a budget is used up
+        scan = f"Query would scan {format_bytes(estimated_bytes)} and" if estimated_bytes else "Query rejected:"
+        now = time.monotonic()
+        user_used = self._budget.used(user_key, now)
+        if user_used + estimated_bytes > self.user_budget_bytes:
+            self._reject("user_budget")
+            raise AdmissionRejectedError(
+                f"{scan} only {format_bytes(max(self.user_budget_bytes - user_used, 0))} of your data budget is left",
+                QueryStatus.BUDGET_EXCEEDED,
+                ["Wait a while before running large queries again", "Narrow the query to scan less data"]
+            )
+
+        global_used = self._budget.used(GLOBAL_BUDGET, now)
+        if global_used + estimated_bytes > self.global_budget_bytes:
+            self._reject("global_budget")
+            raise AdmissionRejectedError(
+                f"{scan} the service data budget is exhausted",
+                QueryStatus.BUDGET_EXCEEDED,
+                ["Retry later", "Narrow the query to scan less data"]
+            )
+
+    async def _acquire_expensive_slot(self, estimated_bytes: int) -> None:
+        if self._expensive_slots is None:
+            self._expensive_slots = asyncio.Semaphore(self.max_expensive_running)
+
+        waiting = self._expensive_running + self._expensive_queued - self.max_expensive_running
+        if waiting >= self.max_expensive_queued:
+            self._reject("queue_full")
+            raise AdmissionRejectedError(
+                f"Too many large queries are waiting ({waiting}); "
+                f"this one would scan {format_bytes(estimated_bytes)}",
+                QueryStatus.BUDGET_EXCEEDED,
+                ["Retry in a few minutes", "Narrow the query to scan less data"]
+            )
+
+        self._expensive_queued += 1
+        try:
+            await asyncio.wait_for(self._expensive_slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+            raise AdmissionRejectedError(
+                f"Query would scan {format_bytes(estimated_bytes)} and waited more than "
+                f"{self.queue_timeout:.0f}s for a slot for large queries",
+                QueryStatus.TIMEOUT,
+                ["Retry in a few minutes", "Narrow the query to scan less data"]
+            )
+        finally:
+            self._expensive_queued -= 1
+        self._expensive_running += 1
+
+    def _reject(self, reason: str) -> None:
+        self._rejected[reason] = self._rejected.get(reason, 0) + 1
+        logger.info(f"Query rejected by admission control: {reason}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Current slot usage, budget consumption and rejection counts"""
+        return {
+            "expensive_running": self._expensive_running,
+            "expensive_queued": self._expensive_queued,
+            "max_expensive_running": self.max_expensive_running,
+            "global_bytes_used": self._budget.used(GLOBAL_BUDGET),
+            "global_budget_bytes": self.global_budget_bytes,
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+        }
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,116 @@
+from google.cloud import bigquery
+from requests.adapters import HTTPAdapter
+from threading import Lock
+from typing import Any, Dict, List, Optional
+from datetime import datetime
+import itertools
+import logging
+
+from config.settings import get_settings
+
+settings = get_settings()
+
+
+class BigQueryClientPool:
+    """
+    Small round-robin pool of long-lived BigQuery clients.
+
+    Credentials are resolved and HTTP sessions are created once per process
+    instead of once per request, so TLS connections are reused across queries.
+    """
+
+    def __init__(
+        self,
+        project_id: str = settings.GCP_DATA_PROJECT_ID,
+        dataset_id: str = settings.GCP_DATA_DATASET_ID,
+        size: int = settings.BIGQUERY_CLIENT_POOL_SIZE,
+        max_connections: int = settings.BIGQUERY_MAX_WORKERS
+    ):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.size = max(1, size)
+        self.max_connections = max_connections
+        self.logger = logging.getLogger(__name__)
+        self._clients: List[bigquery.Client] = []
+        self._cycle = None
+        self._lock = Lock()
+        self._opened_at: Optional[datetime] = None
+        self._checkouts = 0
+        self._last_warmup: Optional[datetime] = None
+        self._last_warmup_error: Optional[str] = None
+
+    def open(self) -> None:
+        """Create the clients and open their connections (blocking)"""
+        with self._lock:
+            if self._clients:
+                return
+
+            # The pool only takes the clients once every one was created, so a failure leaves it closed
+            clients = []
+            try:
+                for _ in range(self.size):
+                    client = bigquery.Client(project=self.project_id)
+                    clients.append(client)
+                    # Size the HTTP connection pool for every executor worker sharing this client
+                    adapter = HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections)
+                    client._http.mount("https://", adapter)
+            except Exception:
+                for client in clients:
+                    client.close()
+                raise
+
+            self._clients = clients
+            self._cycle = itertools.cycle(clients)
+            self._opened_at = datetime.now()
+            self.logger.info(f"BigQuery client pool opened with {self.size} client(s) for project: {self.project_id}")
+
+        self.warm_up()
+
+    def get(self) -> bigquery.Client:
+        """Return the next client of the pool, opening the pool on first use"""
+        if not self._clients:
+            self.open()
+
+        with self._lock:
+            self._checkouts += 1
+            return next(self._cycle)
+
+    def warm_up(self) -> None:
+        """
+        Issue a cheap metadata call on every client so its TLS connection
+        is open (or kept alive) before queries need it (blocking)
+        """
+        try:
+            for client in list(self._clients):
+                client.get_dataset(f"{self.project_id}.{self.dataset_id}")
+            self._last_warmup = datetime.now()
+            self._last_warmup_error = None
+        except Exception as e:
+            self._last_warmup_error = str(e)
+            self.logger.warning(f"BigQuery client warm-up failed: {str(e)}")
+
+    def close(self) -> None:
+        """Close every client and its HTTP session"""
+        with self._lock:
+            for client in self._clients:
+                try:
+                    client.close()
+                except Exception as e:
+                    self.logger.warning(f"Error closing BigQuery client: {str(e)}")
+            self._clients = []
+            self._cycle = None
+            self.logger.info("BigQuery client pool closed")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "status": "open" if self._clients else "closed",
+            "size": len(self._clients),
+            "project_id": self.project_id,
+            "opened_at": self._opened_at.isoformat() if self._opened_at else None,
+            "checkouts": self._checkouts,
+            "last_warmup": self._last_warmup.isoformat() if self._last_warmup else None,
+            "last_warmup_error": self._last_warmup_error,
+        }
+
+
+bigquery_client_pool = BigQueryClientPool()
@@ -1,180 +1,680 @@
 from google.cloud import bigquery
-from google.cloud.exceptions import BadRequest
-from typing import Dict, Any, List, Optional
+from google.cloud.exceptions import BadRequest, NotFound
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
 import logging
-from datetime import datetime
-from itertools import groupby
+import asyncio
+import hashlib
+import time
 from config.settings import get_settings
+from services.bigquery_client_pool import bigquery_client_pool
+from services.execution_backend import ExecutionBackend, BigQueryBackend
+from services.local_engine import local_engine
+from services.admission_control import admission_controller
+from services.local_replica import local_replica, replica_executor
+from services.rollups import rollup_manager
+from services.schema_registry import schema_registry
+from services.query_stats import query_stats
+from services.result_cache import CachedResult, result_cache, make_result_cache_key, estimate_result_size
 from models.query.model import QueryStatus, ValidateQueryResponse, DatasetSchema
+from utils.bounded_executor import BoundedExecutor
+from utils.lru_cache import LRUCache
+from utils.metrics import metrics, time_stage
+from utils.single_flight import SingleFlight
+from utils.query_cursor import CursorError
+from utils.row_conversion import (
+    schema_spec,
+    convert_rows,
+    compile_values_converter,
+    serialize_value,
+)
+from utils.sql_analysis import sql_analyzer
+from utils.text_parser import normalize_sql
 
 settings = get_settings()
 
+# Every blocking BigQuery call (job submission, result polling, page fetches) runs here
+bigquery_executor = BoundedExecutor(
+    max_workers=settings.BIGQUERY_MAX_WORKERS,
+    max_queue_depth=settings.BIGQUERY_MAX_QUEUE_DEPTH,
+    thread_name_prefix="bigquery"
+)
+
+# Concurrent identical queries (same result cache key) share one BigQuery job
+query_single_flight = SingleFlight("query")
+
+bytes_processed_total = metrics.counter("data_service_bytes_processed_total", "Bytes processed by finished BigQuery jobs")
+bytes_billed_total = metrics.counter("data_service_bytes_billed_total", "Bytes billed for finished BigQuery jobs")
+queries_in_flight = metrics.gauge("data_service_queries_in_flight", "Queries being executed or streamed")
+executor_queue_depth = metrics.gauge(
+    "data_service_executor_queue_depth",
+    "Blocking calls waiting for a worker thread",
+    labelnames=("executor",)
+)
+executor_queue_depth.set_function(lambda: bigquery_executor.queue_depth, executor="bigquery")
+executor_queue_depth.set_function(lambda: replica_executor.queue_depth, executor="local_replica")
+
 class BigQueryService:
-    def __init__(self, project_id: str = settings.GCP_DATA_PROJECT_ID, dataset_id: str = settings.GCP_DATA_DATASET_ID):
-        """Initialize BigQuery service with project configuration"""
-        self.client = bigquery.Client(project=project_id)
-        self.project_id = project_id or self.client.project
+    # Dry-run results shared across requests, keyed by normalized SQL and dataset schema version
+    _dry_run_cache: LRUCache[ValidateQueryResponse] = LRUCache(maxsize=settings.DRY_RUN_CACHE_SIZE)
+    _schema_version: str = ""
+    # Last-modified timestamps of tables, trusted for TABLE_METADATA_TTL_SECONDS
+    _table_versions: LRUCache[float] = LRUCache(maxsize=1024, ttl_seconds=settings.TABLE_METADATA_TTL_SECONDS)
+
+    def __init__(
+        self,
+        project_id: str = settings.GCP_DATA_PROJECT_ID,
+        dataset_id: str = settings.GCP_DATA_DATASET_ID,
+        client: Optional[bigquery.Client] = None,
+        backend: Optional[ExecutionBackend] = None
+    ):
+        """
+        Initialize BigQuery service with project configuration and an execution
+        backend: the given one, one wrapping ``client``, or the configured default
+        """
+        if backend is None:
+            backend = BigQueryBackend(client) if client is not None else get_execution_backend()
+        self.backend = backend
+        self.project_id = project_id or self.backend.project
         self.logger = logging.getLogger(__name__)
         self.dataset_id = dataset_id
-        self.logger.info(f"BigQueryService initialized with project_id: {project_id}")
         
     async def execute_query(
         self, 
         query: str, 
         timeout: Optional[int] = 30,
-        limit: Optional[int] = None
+        limit: Optional[int] = None,
+        use_cache: bool = True,
+        page_size: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a SQL query and return results with metadata.
+
+        With ``page_size`` only the first page of rows is read; when more rows
+        exist the result carries a ``next_page`` state that ``fetch_page``
+        reads from the job's destination table.
+
+        With ``use_cache`` (and RESULT_CACHE_ENABLED) an identical query (same normalized SQL and limit)
+        is answered from the result cache as long as its entry is within its
+        TTL and none of the tables it read has been modified since.
+
+        Callers running the same query at the same time share one job: only the
+        first one submits it and the others await its result.
+
+        Queries that only read tables of the local replica (told from their SQL
+        analysis, or their dry run when it is ambiguous) are answered by it
+        (``engine: local``) and skip BigQuery entirely.
+
+        With ROLLUPS_ENABLED, aggregate queries over the fact tables that a
+        rollup can answer run on the rollup instead; the result then carries
+        ``rollup`` and the ``bytes_saved`` against the original dry run.
+
+        Every call is recorded in the per-fingerprint query statistics.
+        """
+        started = time.perf_counter()
+        raw_results = None
+        queries_in_flight.inc()
+        try:
+            raw_results = await self._execute_query(query, timeout, limit, use_cache, page_size, user_id)
+            return raw_results
+
+        except BadRequest as e:
+            self.logger.error(f"Invalid query: {str(e)}")
+            raise ValueError(f"Invalid SQL query: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Query execution error: {str(e)}")
+            raise
+        finally:
+            queries_in_flight.dec()
+            query_stats.record(query, time.perf_counter() - started, raw_results)
+
+    async def _execute_query(
+        self,
+        query: str,
+        timeout: Optional[int],
+        limit: Optional[int],
+        use_cache: bool,
+        page_size: Optional[int],
+        user_id: Optional[str]
+    ) -> Dict[str, Any]:
+        """Answer a query from the result cache, the local replica, a rollup or a (shared) job"""
+        use_cache = use_cache and settings.RESULT_CACHE_ENABLED
+        cache_key = make_result_cache_key(query, limit, page_size)
+        if use_cache:
+            cached_results = await self._get_cached_result(cache_key)
+            if cached_results is not None:
+                self.logger.info(f"Result cache hit for query: {query}")
+                return cached_results
+
+        if local_replica.enabled:
+            covered = local_replica.covers_query(query)
+            if covered is None:
+                validation = await self.validate_query(query)
+                covered = validation.status == QueryStatus.SUCCESS and local_replica.covers(validation.tables_referenced)
+            if covered:
+                local_results = await local_replica.execute_query(query, limit)
+                if local_results is not None:
+                    return local_results
+
+        if rollup_manager.enabled:
+            rollup_results = await self._run_on_rollup(query, timeout, limit, use_cache, page_size, user_id, cache_key)
+            if rollup_results is not None:
+                return rollup_results
+
+        return await query_single_flight.run(
+            cache_key,
+            lambda: self._run_query(query, timeout, limit, use_cache, page_size, user_id, cache_key)
+        )
+
+    async def _run_query(
+        self,
+        query: str,
+        timeout: Optional[int],
+        limit: Optional[int],
+        use_cache: bool,
+        page_size: Optional[int],
+        user_id: Optional[str],
+        cache_key: str,
+        source_tables: Optional[List[str]] = None
     ) -> Dict[str, Any]:
         """
-        Execute a SQL query and return results with metadata
+        Run a query job, read its rows and store them in the result cache.
+        ``source_tables`` are tables the result also depends on besides the ones the query reads.
+        """
+        query_job = await self.start_query(query, timeout=timeout, limit=limit, user_id=user_id)
+
+        # Table versions are read before the job finishes so a concurrent write marks the entry stale
+        table_versions = None
+        if use_cache:
+            tables = self._referenced_tables(query)
+            if not tables:
+                # Without a dry run the tables are only known once the job has finished;
+                # their versions are still read before the rows
+                await bigquery_executor.run(self._wait_for_job, query_job, timeout)
+                tables = self._validation_from_job(query_job).tables_referenced
+            # A result whose tables are unknown could never be invalidated, so it is not cached
+            if tables:
+                table_versions = await self._get_table_versions(tables + (source_tables or []))
+        
+        # Wait for completion and read the rows off the event loop
+        raw_results = await bigquery_executor.run(self._fetch_rows, query_job, timeout, page_size)
+        self._remember_job_validation(query, query_job)
+
+        if table_versions is not None:
+            result_cache.set(cache_key, CachedResult(
+                raw_results=raw_results,
+                table_versions=table_versions,
+                size_bytes=estimate_result_size(raw_results),
+                expires_at=time.time() + settings.RESULT_CACHE_TTL_SECONDS,
+            ))
+
+        return raw_results
+
+    async def _run_on_rollup(
+        self,
+        query: str,
+        timeout: Optional[int],
+        limit: Optional[int],
+        use_cache: bool,
+        page_size: Optional[int],
+        user_id: Optional[str],
+        cache_key: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Run a query on a rollup when one answers it, is up to date with its
+        source tables and its dry run scans fewer bytes than the original's.
+        Returns None when the query should run as written.
+        """
+        # Rollups are only an optimization: a failing schema lookup or rewrite runs the query as written
+        try:
+            snapshot = await schema_registry.get(self)
+            rewrite = rollup_manager.rewrite(query, snapshot.table_columns)
+        except Exception as e:
+            self.logger.warning(f"Rollup rewrite failed, running the original query: {str(e)}")
+            return None
+        if rewrite is None:
+            return None
+        rollup, rollup_query = rewrite
+
+        source_tables = rollup_manager.source_table_ids(rollup)
+        source_versions = await self._get_table_versions(source_tables)
+        if source_versions is None or any(
+            version > rollup_manager.source_time(rollup) for version in source_versions.values()
+        ):
+            self.logger.info(f"Rollup {rollup.name} is older than its source tables, running the original query")
+            return None
+
+        original, rewritten = await asyncio.gather(self.validate_query(query), self.validate_query(rollup_query))
+        if original.status != QueryStatus.SUCCESS or rewritten.status != QueryStatus.SUCCESS:
+            return None
+        bytes_saved = (original.estimated_bytes or 0) - (rewritten.estimated_bytes or 0)
+        if bytes_saved <= 0:
+            return None
+
+        self.logger.info(f"Answering query from rollup {rollup.name}, saving {bytes_saved} bytes")
+        raw_results = await query_single_flight.run(
+            cache_key,
+            lambda: self._run_query(rollup_query, timeout, limit, use_cache, page_size, user_id, cache_key, source_tables)
+        )
+        rollup_manager.record_rewrite(rollup, bytes_saved)
+        return {**raw_results, 'rollup': rollup.name, 'bytes_saved': bytes_saved}
+
+    async def fetch_page(self, page_state: Dict[str, Any], timeout: Optional[int] = 30) -> Dict[str, Any]:
+        """
+        Read the page a cursor points at from the destination table of a finished job.
+        Nothing is re-run or billed; raises CursorError once the table is gone.
+        """
+        try:
+            return await bigquery_executor.run(self._fetch_page, page_state, timeout)
+        except NotFound as e:
+            self.logger.info(f"Result of job {page_state.get('job_id')} is no longer available: {str(e)}")
+            raise CursorError("The result set of this cursor is no longer available")
+
+    async def execute_query_arrow(
+        self,
+        query: str,
+        timeout: Optional[int] = 30,
+        limit: Optional[int] = None,
+        user_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Execute a SQL query and return its rows as an Arrow table, without
+        building Python row objects
+        """
+        started = time.perf_counter()
+        raw_results = None
+        queries_in_flight.inc()
+        try:
+            query_job = await self.start_query(query, timeout=timeout, limit=limit, user_id=user_id)
+            raw_results = await bigquery_executor.run(self._fetch_arrow, query_job, timeout)
+            self._remember_job_validation(query, query_job)
+
+            return raw_results
+
+        except BadRequest as e:
+            self.logger.error(f"Invalid query: {str(e)}")
+            raise ValueError(f"Invalid SQL query: {str(e)}")
+        except Exception as e:
+            self.logger.error(f"Query execution error: {str(e)}")
+            raise
+        finally:
+            queries_in_flight.dec()
+            query_stats.record(query, time.perf_counter() - started, raw_results)
+
+    async def start_query(
+        self,
+        query: str,
+        timeout: Optional[int] = 30,
+        limit: Optional[int] = None,
+        skip_dry_run: bool = settings.QUERY_SKIP_DRY_RUN,
+        user_id: Optional[str] = None
+    ) -> bigquery.QueryJob:
+        """
+        Validate a SQL query and submit it to BigQuery without waiting for its rows.
+
+        A cached dry-run result is always honoured. On a cache miss with
+        ``skip_dry_run`` the job is submitted directly and its errors and
+        statistics are read from the real job, saving one BigQuery round trip.
+
+        With ADMISSION_ENABLED the dry-run byte estimate is checked by the
+        admission controller, which raises AdmissionRejectedError for queries
+        over the caps. Expensive queries hold their slot until the job has
+        finished. A query submitted without a dry run only needs budget left;
+        the job is waited for here and the budgets charged the bytes it processed.
         """
         try:
 
             self.logger.info(f"\nReceived query: {query}\n")
 
             # before executing the query, check if the query is valid
-            validate_query_response = await self.validate_query(query)
-            if validate_query_response.status != QueryStatus.SUCCESS:
-                raise ValueError(validate_query_response.error_message)
-           
-            self.logger.info(f"Query is valid: {validate_query_response}")
-            
-            # Configure query job
-            job_config = bigquery.QueryJobConfig()
-            
-            # Set timeout
-            if timeout:
-                job_config.job_timeout_ms = timeout * 1000
+            cache_key = self._dry_run_cache_key(query)
+            validate_query_response = self._dry_run_cache.get(cache_key)
+            if validate_query_response is None and not skip_dry_run:
+                validate_query_response = await bigquery_executor.run(self._dry_run, query, cache_key)
 
+            if validate_query_response is not None:
+                if validate_query_response.status != QueryStatus.SUCCESS:
+                    raise ValueError(validate_query_response.error_message)
+                self.logger.info(f"Query is valid: {validate_query_response}")
+            else:
+                self.logger.info("Skipping dry run, validation is read from the query job")
+            
             # Add LIMIT clause if specified and not already present
-            if limit and 'LIMIT' not in query.upper():
+            if limit and not sql_analyzer.analyze(query).has_limit:
                 query = f"{query.rstrip(';')} LIMIT {limit}"
             
             # Start query job
             self.logger.info(f"Executing query: {query}")
-            query_job = self.client.query(query, job_config=job_config)
-            
-            # Wait for completion
-            results = query_job.result(timeout=timeout)
-            
-            # Convert results to list of dictionaries
-            rows = []
-            columns = []
-            
-            if results.total_rows and results.total_rows > 0:
-                # Get column information
-                for field in results.schema:
-                    columns.append({
-                        'name': field.name,
-                        'type': field.field_type,
-                        'mode': field.mode,
-                        'description': field.description
-                    })
-                
-                # Get row data
-                for row in results:
-                    row_dict = {}
-                    for i, value in enumerate(row):
-                        column_name = columns[i]['name']
-                        row_dict[column_name] = self._serialize_value(value)
-                    rows.append(row_dict)
-            
-            # Collect job statistics
-            job_stats = query_job._properties.get('statistics', {})
-            query_stats = job_stats.get('query', {})
-            
-            return {
-                'rows': rows,
-                'columns': columns,
-                'total_rows': results.total_rows,
-                'bytes_processed': int(query_stats.get('totalBytesProcessed', 0)),
-                'bytes_billed': int(query_stats.get('totalBytesBilled', 0)),
-                'slot_ms': int(query_stats.get('totalSlotMs', 0)),
-                'creation_time': query_job.created,
-                'start_time': query_job.started,
-                'end_time': query_job.ended,
-                'job_id': query_job.job_id,
+            if not settings.ADMISSION_ENABLED:
+                with time_stage("job_submit"):
+                    return await bigquery_executor.run(self.backend.submit, query, timeout)
+
+            if validate_query_response is None:
+                # No estimate without a dry run: charge what the job processed once it has finished
+                admission_controller.admit_unestimated(user_id)
+                with time_stage("job_submit"):
+                    query_job = await bigquery_executor.run(self.backend.submit, query, timeout)
+                await bigquery_executor.run(self._wait_for_job, query_job, timeout)
+                admission_controller.charge(self._validation_from_job(query_job).estimated_bytes, user_id)
+                return query_job
+
+            async with admission_controller.admit(validate_query_response.estimated_bytes, user_id) as expensive:
+                with time_stage("job_submit"):
+                    query_job = await bigquery_executor.run(self.backend.submit, query, timeout)
+                if expensive:
+                    # Wait for the job without reading rows, so the slot covers the BigQuery work only
+                    with time_stage("job_execution"):
+                        await bigquery_executor.run(query_job.exception, timeout)
+                return query_job
+
+        except BadRequest as e:
+            self.logger.error(f"Invalid query: {str(e)}")
+            raise ValueError(f"Invalid SQL query: {str(e)}")
+
+    async def stream_query_results(
+        self,
+        query_job: bigquery.QueryJob,
+        timeout: Optional[int] = 30,
+        page_size: int = settings.QUERY_STREAM_PAGE_SIZE,
+        query: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield the result of a submitted job page by page, so that only one
+        page of rows is held in memory at a time.
+
+        The first item is ``{'columns': [...]}``, followed by one
+        ``{'rows': [[...], ...]}`` item per BigQuery page (rows are value lists in
+        column order) and a final ``{'statistics': {...}}`` item with the job statistics.
+        Passing the submitted ``query`` lets the finished job fill the dry-run cache.
+        """
+        queries_in_flight.inc()
+        try:
+            results = await bigquery_executor.run(self._job_result, query_job, timeout, page_size)
+            if query is not None:
+                self._remember_job_validation(query, query_job)
+
+            yield {'columns': self._get_columns(results.schema)}
+
+            pages = iter(results.pages)
+            spec = schema_spec(results.schema)
+            while True:
+                rows = await bigquery_executor.run(self._next_page_rows, pages, spec)
+                if rows is None:
+                    break
+                yield {'rows': rows}
+
+            yield {
+                'statistics': {
+                    'total_rows': results.total_rows,
+                    **self._get_job_statistics(query_job),
+                }
             }
-            
+
         except BadRequest as e:
             self.logger.error(f"Invalid query: {str(e)}")
             raise ValueError(f"Invalid SQL query: {str(e)}")
-        except Exception as e:
-            self.logger.error(f"Query execution error: {str(e)}")
-            raise
+        finally:
+            queries_in_flight.dec()
+
+    def _wait_for_job(self, query_job: bigquery.QueryJob, timeout: Optional[int]) -> None:
+        """Wait for a job to finish without reading its rows (blocking)"""
+        self._job_result(query_job, timeout)
+
+    def _job_result(
+        self,
+        query_job: bigquery.QueryJob,
+        timeout: Optional[int],
+        page_size: Optional[int] = None
+    ) -> bigquery.table.RowIterator:
+        """
+        Wait for a job and return its row iterator (blocking). The wait is timed
+        as job_execution unless the job had already finished, so every job is
+        observed once however many times its result is read.
+        """
+        if query_job.state == "DONE":
+            return query_job.result(timeout=timeout, page_size=page_size)
+        with time_stage("job_execution"):
+            return query_job.result(timeout=timeout, page_size=page_size)
+
+    def _fetch_rows(
+        self,
+        query_job: bigquery.QueryJob,
+        timeout: Optional[int],
+        page_size: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Wait for a job and convert its rows to dictionaries (blocking).
+        With ``page_size`` only the first page is converted.
+        """
+        results = self._job_result(query_job, timeout, page_size)
+        statistics = self._get_job_statistics(query_job)
+        with time_stage("row_conversion"):
+            page_results = self._convert_rows(results, page_size)
+
+        next_page_token = page_results.pop('next_page_token')
+        if next_page_token:
+            destination = query_job.destination
+            page_results['next_page'] = {
+                'destination': f"{destination.project}.{destination.dataset_id}.{destination.table_id}",
+                'page_token': next_page_token,
+                'page_size': page_size,
+                'job_id': statistics['job_id'],
+            }
+
+        return {
+            **page_results,
+            **statistics,
+        }
+
+    def _fetch_page(self, page_state: Dict[str, Any], timeout: Optional[int]) -> Dict[str, Any]:
+        """List one page of a job's destination table and convert it to dictionaries (blocking)"""
+        results = self.backend.list_rows(
+            page_state['destination'],
+            page_state['page_token'],
+            page_state['page_size'],
+            timeout
+        )
+        with time_stage("row_conversion"):
+            page_results = self._convert_rows(results, page_state['page_size'])
+
+        next_page_token = page_results.pop('next_page_token')
+        if next_page_token:
+            page_results['next_page'] = {**page_state, 'page_token': next_page_token}
+
+        return {
+            **page_results,
+            'job_id': page_state.get('job_id'),
+        }
+
+    def _convert_rows(self, results: Any, page_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Convert the rows of a result iterator to dictionaries (blocking). With
+        ``page_size`` only its current page is read and the token of the next
+        page is returned as ``next_page_token``.
+
+        Rows go through a converter compiled for the result schema.
+        """
+        rows = []
+        columns = []
+        next_page_token = None
+        
+        if results.total_rows and results.total_rows > 0:
+            columns = self._get_columns(results.schema)
+            spec = schema_spec(results.schema)
+            if page_size:
+                rows = convert_rows(spec, next(iter(results.pages), []))
+                next_page_token = results.next_page_token
+            else:
+                rows = convert_rows(spec, results)
+        
+        return {
+            'rows': rows,
+            'columns': columns,
+            'total_rows': results.total_rows,
+            'next_page_token': next_page_token,
+        }
+
+    def _fetch_arrow(self, query_job: bigquery.QueryJob, timeout: Optional[int]) -> Dict[str, Any]:
+        """Wait for a job and download its rows as an Arrow table (blocking)"""
+        results = self._job_result(query_job, timeout)
+        with time_stage("row_conversion"):
+            table = results.to_arrow(create_bqstorage_client=False)
+
+        return {
+            'table': table,
+            'total_rows': results.total_rows,
+            **self._get_job_statistics(query_job),
+        }
+
+    def _next_page_rows(self, pages: Iterator[Any], spec: Tuple[Any, ...]) -> Optional[List[List[Any]]]:
+        """Fetch the next result page as value lists, or None when exhausted (blocking)"""
+        page = next(pages, None)
+        if page is None:
+            return None
+        with time_stage("row_conversion"):
+            return list(map(compile_values_converter(spec), page))
     
     async def validate_query(self, query: str) -> ValidateQueryResponse:
         """
-        Validate a SQL query using BigQuery's dry run feature
+        Validate a SQL query using BigQuery's dry run feature.
+        Results are cached per normalized SQL and dataset schema version.
         """
+        cache_key = self._dry_run_cache_key(query)
+        cached_response = self._dry_run_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+
+        return await bigquery_executor.run(self._dry_run, query, cache_key)
+
+    def _dry_run(self, query: str, cache_key: Tuple[str, str]) -> ValidateQueryResponse:
+        """Run a BigQuery dry run and cache its outcome, including SQL errors (blocking)"""
         try:
-            job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
-            query_job = self.client.query(query, job_config=job_config)
-            
-            # Get statistics from dry run
-            job_stats = query_job._properties.get('statistics', {})
-            query_stats = job_stats.get('query', {})
-            
-            bytes_processed = int(query_job.total_bytes_processed)
-            
-            # Get referenced tables
-            referenced_tables = []
-            if 'referencedTables' in query_stats:
-                for table_ref in query_stats['referencedTables']:
-                    table_name = f"{table_ref['projectId']}.{table_ref['datasetId']}.{table_ref['tableId']}"
-                    referenced_tables.append(table_name)
-            
-            return ValidateQueryResponse(
-                status=QueryStatus.SUCCESS,
-                estimated_bytes=bytes_processed,
-                estimated_cost=self._estimate_cost(bytes_processed),
-                tables_referenced=referenced_tables
-            )
+            with time_stage("dry_run"):
+                query_job = self.backend.dry_run(query)
+            validate_query_response = self._validation_from_job(query_job)
             
         except BadRequest as e:
-            return ValidateQueryResponse(
+            validate_query_response = ValidateQueryResponse(
                 status=QueryStatus.INVALID_SQL,
                 error_message=str(e),
             )
 
+        self._dry_run_cache.set(cache_key, validate_query_response)
+        return validate_query_response
+
+    def _validation_from_job(self, query_job: bigquery.QueryJob) -> ValidateQueryResponse:
+        """Build a validation result from the statistics of a dry-run or finished job"""
+        job_stats = query_job._properties.get('statistics', {})
+        query_stats = job_stats.get('query', {})
+        
+        bytes_processed = int(query_stats.get('totalBytesProcessed', 0))
+        
+        # Get referenced tables
+        referenced_tables = []
+        if 'referencedTables' in query_stats:
+            for table_ref in query_stats['referencedTables']:
+                table_name = f"{table_ref['projectId']}.{table_ref['datasetId']}.{table_ref['tableId']}"
+                referenced_tables.append(table_name)
+        
+        return ValidateQueryResponse(
+            status=QueryStatus.SUCCESS,
+            estimated_bytes=bytes_processed,
+            estimated_cost=self._estimate_cost(bytes_processed),
+            tables_referenced=referenced_tables
+        )
+
+    def _remember_job_validation(self, query: str, query_job: bigquery.QueryJob) -> None:
+        """Store the statistics of a successfully finished job as the query's dry-run result"""
+        self._dry_run_cache.set(self._dry_run_cache_key(query), self._validation_from_job(query_job))
+
+    def _dry_run_cache_key(self, query: str) -> Tuple[str, str]:
+        return normalize_sql(query), BigQueryService._schema_version
+
+    def _referenced_tables(self, query: str) -> List[str]:
+        """Tables a query reads, as recorded by its dry run or finished job"""
+        validation = self._dry_run_cache.get(self._dry_run_cache_key(query))
+        if validation is None or validation.tables_referenced is None:
+            return []
+        return validation.tables_referenced
+
+    async def _get_cached_result(self, cache_key: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a cached result if none of its tables changed since it was stored.
+        Hits carry ``cache_hit`` and report no bytes billed, since no job ran.
+        """
+        entry = result_cache.get(cache_key)
+        if entry is None:
+            return None
+
+        current_versions = await self._get_table_versions(list(entry.table_versions))
+        if current_versions is None or any(
+            current_versions[table_id] > version
+            for table_id, version in entry.table_versions.items()
+        ):
+            result_cache.delete(cache_key)
+            return None
+
+        return {
+            **entry.raw_results,
+            'bytes_processed': 0,
+            'bytes_billed': 0,
+            'slot_ms': 0,
+            'start_time': None,
+            'end_time': None,
+            'cache_hit': True,
+        }
+
+    async def _get_table_versions(self, table_ids: List[str]) -> Optional[Dict[str, float]]:
+        """
+        Last-modified timestamps for the given tables, or None when any of
+        them cannot be read (the result is then neither cached nor served)
+        """
+        versions = {}
+        missing = []
+        for table_id in table_ids:
+            version = self._table_versions.get(table_id)
+            if version is None:
+                missing.append(table_id)
+            else:
+                versions[table_id] = version
+
+        if missing:
+            try:
+                fetched = await bigquery_executor.run(self._fetch_table_versions, missing)
+            except Exception as e:
+                self.logger.warning(f"Could not read table metadata for result cache: {str(e)}")
+                return None
+
+            for table_id, version in fetched.items():
+                self._table_versions.set(table_id, version)
+                versions[table_id] = version
+                # Results read before this version can never be served again, free them now
+                result_cache.invalidate_table(table_id, version)
+
+        return versions
+
+    def _fetch_table_versions(self, table_ids: List[str]) -> Dict[str, float]:
+        """Read the last-modified time of each table from the backend (blocking)"""
+        return {table_id: self.backend.table_modified(table_id) for table_id in table_ids}
+
     async def get_schemas(self) -> List[DatasetSchema]:
         """
         Retrieves all tables and their schemas from a specific BigQuery dataset.
         """
         try:
             self.logger.info(f"Fetching schemas for dataset: {self.dataset_id} in project: {self.project_id}")
-            
-            sql = f"""
-                SELECT table_name, column_name, data_type
-                FROM `{self.project_id}.{self.dataset_id}.INFORMATION_SCHEMA.COLUMNS`
-                ORDER BY table_name, ordinal_position
-            """
 
-            self.logger.info(f"Executing query: {sql}")
-            
-            query_job = self.client.query(sql)
-            results = query_job.result()
-
-            
-            tables = []
-            for table_name, columns in groupby(results, key=lambda r: r.table_name):
-                
-                schema_info = [
-                    {
-                        "name": col.column_name,
-                        "type": col.data_type,
-                    }
-                    for col in columns
-                ]
-
-                tables.append({
-                    "table_id": table_name,
-                    "schema": schema_info
-                })
+            tables = await bigquery_executor.run(self.backend.schema_tables, self.project_id, self.dataset_id)
             
             dataset_schema = DatasetSchema(
                 dataset_id=f"{self.project_id}.{self.dataset_id}",
                 tables=tables
             )
+
+            # A schema change invalidates every cached dry-run result
+            BigQueryService._schema_version = hashlib.sha256(
+                dataset_schema.model_dump_json().encode("utf-8")
+            ).hexdigest()[:16]
             
             self.logger.info(f"Successfully fetched schema for dataset: {self.dataset_id}")
             return [dataset_schema]
@@ -183,6 +683,38 @@ class BigQueryService:
             self.logger.error(f"Error fetching schemas: {str(e)}")
             raise
 
+    def _get_columns(self, schema: List[bigquery.SchemaField]) -> List[Dict[str, Any]]:
+        """Build the column description list from a BigQuery result schema"""
+        return [
+            {
+                'name': field.name,
+                'type': field.field_type,
+                'mode': field.mode,
+                'description': field.description
+            }
+            for field in schema
+        ]
+
+    def _get_job_statistics(self, query_job: bigquery.QueryJob) -> Dict[str, Any]:
+        """Collect the statistics of a finished query job"""
+        job_stats = query_job._properties.get('statistics', {})
+        query_stats = job_stats.get('query', {})
+        bytes_processed = int(query_stats.get('totalBytesProcessed', 0))
+        bytes_billed = int(query_stats.get('totalBytesBilled', 0))
+        # Read once per finished job, so the totals count every job once
+        bytes_processed_total.inc(bytes_processed)
+        bytes_billed_total.inc(bytes_billed)
+
+        return {
+            'bytes_processed': bytes_processed,
+            'bytes_billed': bytes_billed,
+            'slot_ms': int(query_stats.get('totalSlotMs', 0)),
+            'creation_time': query_job.created,
+            'start_time': query_job.started,
+            'end_time': query_job.ended,
+            'job_id': query_job.job_id,
+        }
+
     def _estimate_cost(self, bytes_processed: int) -> float:
         """Estimate query cost based on bytes processed
         
@@ -198,17 +730,8 @@ class BigQueryService:
         return round(cost_usd, 4)
     
     def _serialize_value(self, value: Any) -> Any:
-        """Serialize BigQuery values to JSON-compatible format"""
-        if value is None:
-            return None
-        elif isinstance(value, datetime):
-            return value.isoformat()
-        elif isinstance(value, (list, tuple)):
-            return [self._serialize_value(item) for item in value]
-        elif isinstance(value, dict):
-            return {k: self._serialize_value(v) for k, v in value.items()}
-        else:
-            return value
+        """Serialize a BigQuery value of unknown type to JSON-compatible format"""
+        return serialize_value(value)
         
     async def get_embedding_of_query(self, text: str) -> Dict[str, Any]:
         """
@@ -219,4 +742,16 @@ class BigQueryService:
             return response
         except Exception as e:
             self.logger.error(f"Error getting embeddings: {str(e)}")
-            return {"error": f"[Error parsing embeddings response] {e}"}
\ No newline at end of file
+            return {"error": f"[Error parsing embeddings response] {e}"}
+
+
+def get_execution_backend() -> ExecutionBackend:
+    """The EXECUTION_BACKEND engine: a pooled BigQuery client or the local engine"""
+    if settings.EXECUTION_BACKEND == "local":
+        return local_engine
+    return BigQueryBackend(bigquery_client_pool.get())
+
+
+def get_bigquery_service() -> BigQueryService:
+    """FastAPI dependency returning a BigQueryService bound to the configured execution backend"""
+    return BigQueryService()
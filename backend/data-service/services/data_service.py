@@ -1,29 +1,129 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import logging
 
+import numpy as np
+
+from config.settings import get_settings
 from models.data.model import FlChartType
+from utils.downsampling import NUMERIC_TYPES, to_float_array, lttb_indices, sample_indices, group_sums, top_n_indices
+
+settings = get_settings()
 
 
 class DataService:
     """Service for processing and transforming query results into frontend-friendly formats"""
-    
+
     def __init__(self):
         self.logger = logging.getLogger(__name__)
 
 
-    def process_results(self, raw_results: Dict[str, Any], type: FlChartType) -> Dict[str, Any]:
+    def process_results(
+        self,
+        raw_results: Dict[str, Any],
+        type: Optional[FlChartType] = None,
+        max_points: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Shape query rows for the chart that will draw them.
 
+        Without a chart type the rows are returned as they are. Otherwise the
+        first column is the x axis / category and the first numeric column
+        after it the measure; ``max_points`` overrides the chart's default
+        point budget. Shaped results also report ``source_rows``.
+        """
         try:
             rows = raw_results.get('rows', [])
             columns = raw_results.get('columns', [])
 
-            return self._process_line_chart(rows, columns)
+            if type is None or not rows:
+                return self._build_result(rows, columns)
+
+            if type == FlChartType.LINE_CHART:
+                return self._process_line_chart(rows, columns, max_points or settings.CHART_MAX_POINTS)
+            if type == FlChartType.PIE_CHART:
+                return self._process_pie_chart(rows, columns, max_points or settings.CHART_PIE_TOP_N)
+            if type == FlChartType.BAR_CHART:
+                return self._process_bar_chart(rows, columns, max_points or settings.CHART_MAX_CATEGORIES)
+            return self._process_scatter_chart(rows, columns, max_points or settings.CHART_MAX_POINTS)
         except Exception as e:
             self.logger.error(f"Error processing results: {e}")
             raise e
-        
-    def _process_line_chart(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]]) -> Dict[str, Any]:
-        return {
+
+    def _build_result(
+        self,
+        rows: List[Dict[str, Any]],
+        columns: List[Dict[str, Any]],
+        source_rows: Optional[int] = None
+    ) -> Dict[str, Any]:
+        result = {
             "data": rows,
             "columns": columns
-        }
\ No newline at end of file
+        }
+        if source_rows is not None:
+            result["source_rows"] = source_rows
+        return result
+
+    def _chart_axes(self, columns: List[Dict[str, Any]]) -> Tuple[Optional[str], Optional[str]]:
+        """Pick the category / x column and the measure column of a result"""
+        if not columns:
+            return None, None
+        category = columns[0]['name']
+        measure = next((c['name'] for c in columns[1:] if c['type'] in NUMERIC_TYPES), None)
+        if measure is None and columns[0]['type'] in NUMERIC_TYPES and len(columns) == 1:
+            measure = category
+        return category, measure
+
+    def _select_rows(self, rows: List[Dict[str, Any]], indices: np.ndarray) -> List[Dict[str, Any]]:
+        return [rows[i] for i in indices.tolist()]
+
+    def _process_line_chart(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]], max_points: int) -> Dict[str, Any]:
+        """Downsample with LTTB on the measure; a non-numeric x axis (dates, labels) is spaced by row order"""
+        x_column, y_column = self._chart_axes(columns)
+        if y_column is None or len(rows) <= max_points:
+            return self._build_result(rows, columns, len(rows))
+
+        if columns[0]['type'] in NUMERIC_TYPES:
+            x = to_float_array([row[x_column] for row in rows])
+        else:
+            x = np.arange(len(rows), dtype=np.float64)
+        y = to_float_array([row[y_column] for row in rows])
+
+        indices = lttb_indices(x, y, max_points)
+        return self._build_result(self._select_rows(rows, indices), columns, len(rows))
+
+    def _process_pie_chart(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]], top_n: int) -> Dict[str, Any]:
+        """Sum the measure per label, keep the largest ``top_n - 1`` slices and fold the rest into one "other" slice"""
+        label_column, value_column = self._chart_axes(columns)
+        if value_column is None or value_column == label_column:
+            return self._build_result(rows, columns, len(rows))
+
+        labels, totals = group_sums([row[label_column] for row in rows], to_float_array([row[value_column] for row in rows]))
+        pie_columns = [c for c in columns if c['name'] in (label_column, value_column)]
+
+        keep = top_n_indices(totals, top_n if len(labels) <= top_n else top_n - 1)
+        data = [{label_column: labels[i], value_column: float(totals[i])} for i in keep.tolist()]
+        if len(keep) < len(labels):
+            other_total = float(totals.sum() - totals[keep].sum())
+            data.append({label_column: settings.CHART_OTHER_LABEL, value_column: other_total})
+
+        return self._build_result(data, pie_columns, len(rows))
+
+    def _process_bar_chart(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]], max_categories: int) -> Dict[str, Any]:
+        """Keep the rows of the ``max_categories`` categories with the largest total measure, in their original order"""
+        category_column, value_column = self._chart_axes(columns)
+        if value_column is None or value_column == category_column:
+            return self._build_result(rows, columns, len(rows))
+
+        categories = [row[category_column] for row in rows]
+        labels, totals = group_sums(categories, to_float_array([row[value_column] for row in rows]))
+        if len(labels) <= max_categories:
+            return self._build_result(rows, columns, len(rows))
+
+        kept_labels = {str(labels[i]) for i in top_n_indices(totals, max_categories).tolist()}
+        mask = np.fromiter((str(category) in kept_labels for category in categories), dtype=bool, count=len(categories))
+        return self._build_result(self._select_rows(rows, np.flatnonzero(mask)), columns, len(rows))
+
+    def _process_scatter_chart(self, rows: List[Dict[str, Any]], columns: List[Dict[str, Any]], max_points: int) -> Dict[str, Any]:
+        """Uniform sample of at most ``max_points`` rows, in their original order"""
+        indices = sample_indices(len(rows), max_points)
+        return self._build_result(self._select_rows(rows, indices), columns, len(rows))
@@ -0,0 +1,87 @@
+"""
+Execution backends: the SQL engine BigQueryService submits queries to.
+
+BigQueryService reads jobs the way ``google.cloud.bigquery`` returns them
+(``result()`` iterators with pages, ``destination``, ``_properties``
+statistics...), so a backend returns objects with those attributes. Every
+method is blocking and is called on the BigQuery executor.
+"""
+from abc import ABC, abstractmethod
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+from google.cloud import bigquery
+
+
+class ExecutionBackend(ABC):
+    """SQL engine behind BigQueryService"""
+
+    name: str
+    project: str
+
+    @abstractmethod
+    def submit(self, query: str, timeout: Optional[int] = None) -> Any:
+        """Submit a query and return its job; raises BadRequest for invalid SQL"""
+
+    @abstractmethod
+    def dry_run(self, query: str) -> Any:
+        """Validate a query without running it and return the dry-run job; raises BadRequest for invalid SQL"""
+
+    @abstractmethod
+    def list_rows(self, destination: str, page_token: str, page_size: int, timeout: Optional[int] = None) -> Any:
+        """Read one page of a finished job's result table; raises NotFound once it is gone"""
+
+    @abstractmethod
+    def table_modified(self, table_id: str) -> float:
+        """Last-modified time of a table as a timestamp"""
+
+    @abstractmethod
+    def schema_tables(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        """Tables of a dataset as ``{"table_id", "schema": [{"name", "type"}]}`` dictionaries"""
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name}
+
+
+class BigQueryBackend(ExecutionBackend):
+    """Runs queries on BigQuery through one of the pooled clients"""
+
+    name = "bigquery"
+
+    def __init__(self, client: bigquery.Client):
+        self.client = client
+        self.project = client.project
+
+    def submit(self, query: str, timeout: Optional[int] = None) -> bigquery.QueryJob:
+        job_config = bigquery.QueryJobConfig()
+        if timeout:
+            job_config.job_timeout_ms = timeout * 1000
+        return self.client.query(query, job_config=job_config)
+
+    def dry_run(self, query: str) -> bigquery.QueryJob:
+        job_config = bigquery.QueryJobConfig(dry_run=True, use_query_cache=False)
+        return self.client.query(query, job_config=job_config)
+
+    def list_rows(self, destination: str, page_token: str, page_size: int, timeout: Optional[int] = None) -> Any:
+        return self.client.list_rows(destination, page_token=page_token, page_size=page_size, timeout=timeout)
+
+    def table_modified(self, table_id: str) -> float:
+        table = self.client.get_table(table_id)
+        return table.modified.timestamp() if table.modified else 0.0
+
+    def schema_tables(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        """Read INFORMATION_SCHEMA.COLUMNS and group the columns per table"""
+        sql = f"""
+            SELECT table_name, column_name, data_type
+            FROM `{project_id}.{dataset_id}.INFORMATION_SCHEMA.COLUMNS`
+            ORDER BY table_name, ordinal_position
+        """
+        results = self.client.query(sql).result()
+
+        tables = []
+        for table_name, columns in groupby(results, key=lambda r: r.table_name):
+            tables.append({
+                "table_id": table_name,
+                "schema": [{"name": col.column_name, "type": col.data_type} for col in columns]
+            })
+        return tables
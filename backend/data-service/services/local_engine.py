@@ -0,0 +1,435 @@
+"""
+Local stand-in for BigQuery: an in-memory DuckDB database with the
+``entregas_facturacion`` tables, filled with generated data.
+
+The tables are read from the DDL in LOCAL_ENGINE_SCHEMA_FILE, by default
+config/local_engine_schema.sql: a copy of the ``schema_constant`` of the
+llm-service, so the engine has exactly the schema the agent writes SQL for. Foreign keys in the DDL comments (``FK a TABLE(COLUMN)``)
+are honoured, so joins between generated tables match. Each header table
+(FACCAB, DOCCRG) gets LOCAL_ENGINE_SCALE rows and their line tables three
+lines per header; master tables get a fixed number of rows.
+
+Queries are translated from BigQuery SQL to DuckDB with sqlglot and answered
+with objects that look like BigQuery jobs, so the whole /query path (admission,
+caching, pagination, result formats) runs unchanged without GCP.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from threading import Lock
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import ast
+import hashlib
+import logging
+import re
+import time
+
+import duckdb
+import numpy as np
+import pyarrow as pa
+import sqlglot
+from google.cloud import bigquery
+from google.cloud.exceptions import BadRequest, NotFound
+from sqlglot import exp
+
+from config.settings import get_settings
+from services.execution_backend import ExecutionBackend
+from utils.lru_cache import LRUCache
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MASTER_ROWS = 50
+LINES_PER_HEADER = 3
+RESULTS_DATASET = "_local_results"
+
+_TABLE_PATTERN = re.compile(r"CREATE TABLE (\w+) \((.*?)\n\);", re.DOTALL)
+_COLUMN_PATTERN = re.compile(r"^\s*(\w+)\s+(\w+)(\s+PRIMARY KEY)?,?\s*(?:--\s*(.*))?$")
+_FOREIGN_KEY_PATTERN = re.compile(r"FK a (\w+)\((\w+)\)")
+
+_DUCKDB_TYPES = {
+    "INT64": "BIGINT",
+    "NUMERIC": "DECIMAL(38, 9)",
+    "FLOAT64": "DOUBLE",
+    "STRING": "VARCHAR",
+    "BOOL": "BOOLEAN",
+    "DATE": "DATE",
+    "DATETIME": "TIMESTAMP",
+    "TIMESTAMP": "TIMESTAMPTZ",
+}
+
+
+@dataclass
+class ColumnDefinition:
+    name: str
+    type: str
+    primary_key: bool = False
+    references: Optional[Tuple[str, str]] = None
+
+
+@dataclass
+class TableDefinition:
+    name: str
+    columns: List[ColumnDefinition] = field(default_factory=list)
+
+    def parents(self) -> List[str]:
+        return sorted({c.references[0] for c in self.columns if c.references and c.references[0] != self.name})
+
+
+def load_schema_ddl(path: str) -> str:
+    """
+    Read the schema DDL from a SQL file, or from the ``schema_constant`` string
+    of a Python file (such as the llm-service constants) without importing it
+    """
+    with open(path, encoding="utf-8") as schema_file:
+        source = schema_file.read()
+    if not path.endswith(".py"):
+        return source
+
+    module = ast.parse(source)
+    for node in module.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "schema_constant" for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"No schema_constant in {path}")
+
+
+def parse_schema(ddl: str) -> List[TableDefinition]:
+    """Tables and columns of the CREATE TABLE statements in the schema DDL"""
+    tables = []
+    for table_name, body in _TABLE_PATTERN.findall(ddl):
+        table = TableDefinition(name=table_name.upper())
+        for line in body.splitlines():
+            match = _COLUMN_PATTERN.match(line)
+            if match is None:
+                continue
+            name, column_type, primary_key, comment = match.groups()
+            reference = _FOREIGN_KEY_PATTERN.search(comment or "")
+            table.columns.append(ColumnDefinition(
+                name=name.upper(),
+                type=column_type.upper(),
+                primary_key=bool(primary_key),
+                references=(reference.group(1).upper(), reference.group(2).upper()) if reference else None
+            ))
+        tables.append(table)
+    return tables
+
+
+class DataGenerator:
+    """Generates rows for the schema tables, parents before the tables that reference them"""
+
+    def __init__(self, tables: List[TableDefinition], scale: int, seed: int = 0):
+        self.tables = {table.name: table for table in tables}
+        self.scale = scale
+        self.rng = np.random.default_rng(seed)
+        self.generated: Dict[str, Dict[str, np.ndarray]] = {}
+        # Columns other tables join to; numeric ones are generated as unique keys
+        self.referenced = {c.references for table in tables for c in table.columns if c.references}
+
+    def generate(self) -> Dict[str, pa.Table]:
+        arrow_tables = {}
+        for name in self._load_order():
+            columns = self._generate_table(self.tables[name])
+            self.generated[name] = columns
+            arrow_tables[name] = pa.table({column: pa.array(values) for column, values in columns.items()})
+        return arrow_tables
+
+    def _load_order(self) -> List[str]:
+        order: List[str] = []
+
+        def visit(name: str, path: Tuple[str, ...]) -> None:
+            if name in order or name in path or name not in self.tables:
+                return
+            for parent in self.tables[name].parents():
+                visit(parent, path + (name,))
+            order.append(name)
+
+        for name in self.tables:
+            visit(name, ())
+        return order
+
+    def _header_of(self, table: TableDefinition) -> Optional[str]:
+        """Parent table a line table copies several key columns from"""
+        counts: Dict[str, int] = {}
+        for column in table.columns:
+            if column.references:
+                counts[column.references[0]] = counts.get(column.references[0], 0) + 1
+        return next((parent for parent, count in counts.items() if count > 1), None)
+
+    def _is_header(self, table: TableDefinition) -> bool:
+        return any(self._header_of(other) == table.name for other in self.tables.values())
+
+    def _row_count(self, table: TableDefinition) -> int:
+        header = self._header_of(table)
+        if header is not None:
+            return len(next(iter(self.generated[header].values()))) * LINES_PER_HEADER
+        if self._is_header(table):
+            return self.scale
+        return MASTER_ROWS
+
+    def _generate_table(self, table: TableDefinition) -> Dict[str, np.ndarray]:
+        n = self._row_count(table)
+        header = self._header_of(table)
+        header_rows = None
+        if header is not None:
+            header_size = len(next(iter(self.generated[header].values())))
+            header_rows = np.sort(self.rng.integers(0, header_size, n))
+
+        columns = {}
+        for column in table.columns:
+            if column.references and column.references[0] == header:
+                columns[column.name] = self.generated[header][column.references[1]][header_rows]
+            elif column.references and column.references[0] in self.generated:
+                parent_values = self.generated[column.references[0]][column.references[1]]
+                columns[column.name] = parent_values[self.rng.integers(0, len(parent_values), n)]
+            else:
+                columns[column.name] = self._generate_values(table, column, n)
+        return columns
+
+    def _generate_values(self, table: TableDefinition, column: ColumnDefinition, n: int) -> np.ndarray:
+        is_key = column.primary_key or (table.name, column.name) in self.referenced
+        master = self._header_of(table) is None and not self._is_header(table)
+        if column.type in ("INT64", "NUMERIC") and (is_key or column.name.endswith(("ID", "NRO", "IDDIR"))):
+            return np.arange(1, n + 1, dtype=np.int64)
+        if column.type == "STRING":
+            if is_key and column.primary_key:
+                return np.array([f"{column.name[:3]}{i}" for i in range(1, n + 1)], dtype=object)
+            labels = np.array([f"{column.name} {i}" for i in range(1, (n if master else 5) + 1)], dtype=object)
+            return labels if master else labels[self.rng.integers(0, len(labels), n)]
+        if column.type == "DATE":
+            days = self.rng.integers(0, 3 * 365, n)
+            return (np.datetime64("2022-01-01") + days).astype("datetime64[D]")
+        if column.type == "INT64":
+            return self.rng.integers(1, 1000, n)
+        if column.type in ("NUMERIC", "FLOAT64"):
+            return np.round(self.rng.gamma(2.0, 500.0, n), 2)
+        if column.type == "BOOL":
+            return self.rng.random(n) < 0.5
+        return np.array([None] * n, dtype=object)
+
+
+def _field_type(data_type: pa.DataType) -> str:
+    """BigQuery type name of an Arrow result column"""
+    if pa.types.is_integer(data_type):
+        return "INTEGER"
+    if pa.types.is_decimal(data_type):
+        return "NUMERIC"
+    if pa.types.is_floating(data_type):
+        return "FLOAT"
+    if pa.types.is_boolean(data_type):
+        return "BOOLEAN"
+    if pa.types.is_date(data_type):
+        return "DATE"
+    if pa.types.is_timestamp(data_type):
+        return "TIMESTAMP" if data_type.tz else "DATETIME"
+    if pa.types.is_time(data_type):
+        return "TIME"
+    if pa.types.is_binary(data_type):
+        return "BYTES"
+    return "STRING"
+
+
+class LocalRowIterator:
+    """Rows of a local result from ``start`` on, read like a BigQuery RowIterator"""
+
+    def __init__(self, table: pa.Table, page_size: Optional[int] = None, start: int = 0):
+        self.table = table
+        self.page_size = page_size or max(table.num_rows, 1)
+        self.start = start
+        self.total_rows = table.num_rows
+        self.schema = [bigquery.SchemaField(f.name, _field_type(f.type), mode="NULLABLE") for f in table.schema]
+        self.next_page_token: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Tuple[Any, ...]]:
+        for page in self.pages:
+            yield from page
+
+    @property
+    def pages(self) -> Iterator[List[Tuple[Any, ...]]]:
+        offset = self.start
+        while offset < self.table.num_rows:
+            page = self.table.slice(offset, self.page_size)
+            offset += self.page_size
+            self.next_page_token = str(offset) if offset < self.table.num_rows else None
+            yield list(zip(*(column.to_pylist() for column in page.columns)))
+
+    def to_arrow(self, **kwargs) -> pa.Table:
+        return self.table.slice(self.start)
+
+
+class LocalQueryJob:
+    """Finished query on the local engine with the QueryJob attributes BigQueryService reads"""
+
+    state = "DONE"
+
+    def __init__(
+        self,
+        job_id: str,
+        project: str,
+        table: Optional[pa.Table],
+        statistics: Dict[str, Any],
+        created: datetime
+    ):
+        self.job_id = job_id
+        self.table = table
+        self.created = self.started = created
+        self.ended = datetime.now(timezone.utc)
+        self.destination = bigquery.TableReference.from_string(f"{project}.{RESULTS_DATASET}.{job_id}")
+        self._properties = {"statistics": {"query": statistics}}
+
+    def result(self, timeout: Optional[float] = None, page_size: Optional[int] = None, **kwargs) -> LocalRowIterator:
+        return LocalRowIterator(self.table, page_size)
+
+    def exception(self, timeout: Optional[float] = None) -> None:
+        return None
+
+
+class LocalEngine(ExecutionBackend):
+    """DuckDB database with generated ``entregas_facturacion`` data"""
+
+    name = "local"
+
+    def __init__(
+        self,
+        project_id: str = settings.GCP_DATA_PROJECT_ID,
+        dataset_id: str = settings.GCP_DATA_DATASET_ID,
+        schema_file: str = settings.LOCAL_ENGINE_SCHEMA_FILE,
+        scale: int = settings.LOCAL_ENGINE_SCALE,
+        seed: int = settings.LOCAL_ENGINE_SEED
+    ):
+        self.project = project_id
+        self.dataset_id = dataset_id
+        self.schema_file = schema_file
+        self.scale = scale
+        self.seed = seed
+        self.tables: Dict[str, TableDefinition] = {}
+        self._connection: Optional[duckdb.DuckDBPyConnection] = None
+        self._row_counts: Dict[str, int] = {}
+        self._loaded_at = 0.0
+        self._lock = Lock()
+        # Results kept for list_rows, like the temporary destination tables of BigQuery jobs
+        self._results: LRUCache[pa.Table] = LRUCache(maxsize=64, ttl_seconds=settings.QUERY_CURSOR_TTL_SECONDS)
+        self._queries = 0
+
+    def open(self) -> None:
+        """Create the tables and generate their data (blocking, once)"""
+        with self._lock:
+            if self._connection is not None:
+                return
+            started = time.perf_counter()
+            tables = parse_schema(load_schema_ddl(self.schema_file))
+            connection = duckdb.connect(database=":memory:")
+            for name, data in DataGenerator(tables, self.scale, self.seed).generate().items():
+                definition = next(table for table in tables if table.name == name)
+                column_sql = ", ".join(f'"{c.name}" {_DUCKDB_TYPES.get(c.type, "VARCHAR")}' for c in definition.columns)
+                connection.execute(f'CREATE TABLE "{name}" ({column_sql})')
+                connection.register("generated", data)
+                connection.execute(f'INSERT INTO "{name}" SELECT * FROM generated')
+                connection.unregister("generated")
+                self._row_counts[name] = data.num_rows
+            self.tables = {table.name: table for table in tables}
+            self._loaded_at = time.time()
+            self._connection = connection
+            logger.info(
+                f"Local engine loaded {len(tables)} tables ({sum(self._row_counts.values())} rows) "
+                f"in {time.perf_counter() - started:.1f}s"
+            )
+
+    def submit(self, query: str, timeout: Optional[int] = None) -> LocalQueryJob:
+        local_query, referenced = self._translate(query)
+        created = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        cursor = self._cursor()
+        try:
+            table = cursor.sql(local_query).fetch_arrow_table()
+        except duckdb.Error as e:
+            raise BadRequest(str(e))
+        finally:
+            cursor.close()
+        self._queries += 1
+
+        job_id = f"local_{hashlib.sha256(f'{query}{time.time_ns()}'.encode('utf-8')).hexdigest()[:16]}"
+        self._results.set(job_id, table)
+        bytes_processed = self._estimate_bytes(referenced)
+        return LocalQueryJob(job_id, self.project, table, {
+            "totalBytesProcessed": str(bytes_processed),
+            "totalBytesBilled": str(bytes_processed),
+            "totalSlotMs": str(int((time.perf_counter() - started) * 1000)),
+            "referencedTables": self._table_references(referenced),
+        }, created)
+
+    def dry_run(self, query: str) -> LocalQueryJob:
+        local_query, referenced = self._translate(query)
+        cursor = self._cursor()
+        try:
+            # Building the relation binds the query without running it
+            cursor.sql(local_query)
+        except duckdb.Error as e:
+            raise BadRequest(str(e))
+        finally:
+            cursor.close()
+        return LocalQueryJob("local_dry_run", self.project, None, {
+            "totalBytesProcessed": str(self._estimate_bytes(referenced)),
+            "referencedTables": self._table_references(referenced),
+        }, datetime.now(timezone.utc))
+
+    def list_rows(self, destination: str, page_token: str, page_size: int, timeout: Optional[int] = None) -> LocalRowIterator:
+        table = self._results.get(destination.rsplit(".", 1)[-1])
+        if table is None:
+            raise NotFound(f"Result table {destination} not found")
+        return LocalRowIterator(table, page_size, int(page_token or 0))
+
+    def table_modified(self, table_id: str) -> float:
+        if table_id.rsplit(".", 1)[-1].upper() not in self._row_counts:
+            raise NotFound(f"Table {table_id} not found")
+        return self._loaded_at
+
+    def schema_tables(self, project_id: str, dataset_id: str) -> List[Dict[str, Any]]:
+        return [
+            {"table_id": name, "schema": [{"name": c.name, "type": c.type} for c in self.tables[name].columns]}
+            for name in sorted(self.tables)
+        ]
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        if self._connection is None:
+            self.open()
+        return self._connection.cursor()
+
+    def _translate(self, query: str) -> Tuple[str, List[str]]:
+        """DuckDB SQL for a BigQuery query and the schema tables it reads"""
+        if self._connection is None:
+            self.open()
+        try:
+            tree = sqlglot.parse_one(query, read="bigquery")
+        except sqlglot.errors.SqlglotError as e:
+            raise BadRequest(f"Syntax error: {e}")
+
+        referenced = []
+        for table in tree.find_all(exp.Table):
+            name = table.name.upper()
+            if name in self.tables:
+                # Every schema table lives in the single local database
+                table.set("this", exp.to_identifier(name, quoted=True))
+                table.set("db", None)
+                table.set("catalog", None)
+                if name not in referenced:
+                    referenced.append(name)
+        return tree.sql(dialect="duckdb"), referenced
+
+    def _estimate_bytes(self, tables: List[str]) -> int:
+        """Full-scan size of the tables, at 8 bytes per value"""
+        return sum(self._row_counts.get(name, 0) * len(self.tables[name].columns) * 8 for name in tables)
+
+    def _table_references(self, tables: List[str]) -> List[Dict[str, str]]:
+        return [{"projectId": self.project, "datasetId": self.dataset_id, "tableId": name} for name in tables]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "scale": self.scale,
+            "tables": dict(self._row_counts),
+            "queries": self._queries,
+        }
+
+
+local_engine = LocalEngine()
@@ -0,0 +1,256 @@
+"""
+Embedded DuckDB copy of the small master-data tables.
+
+Queries that only read master tables (plants, currencies, products...) are
+answered here, translated to DuckDB with sqlglot, instead of paying a
+BigQuery round trip. The tables are loaded from Parquet snapshots, one
+folder of ``*.parquet`` files per table under LOCAL_REPLICA_SNAPSHOT_URI
+(a local path or ``gs://bucket/prefix``), and reloaded every
+LOCAL_REPLICA_REFRESH_SECONDS. Snapshots can be produced with
+``export_snapshots``, which runs a BigQuery EXPORT DATA per table.
+"""
+from datetime import datetime
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional
+import hashlib
+import logging
+import os
+import tempfile
+import time
+
+import duckdb
+import sqlglot
+from google.cloud import storage
+from sqlglot import exp
+
+from config.settings import get_settings
+from utils.bounded_executor import BoundedExecutor
+from utils.row_conversion import serialize_value
+from utils.sql_analysis import sql_analyzer
+from utils.text_parser import normalize_sql
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# DuckDB result types mapped to the BigQuery names used in the column descriptions
+_BIGQUERY_TYPES = {
+    "VARCHAR": "STRING",
+    "BIGINT": "INTEGER",
+    "INTEGER": "INTEGER",
+    "SMALLINT": "INTEGER",
+    "TINYINT": "INTEGER",
+    "HUGEINT": "INTEGER",
+    "DOUBLE": "FLOAT",
+    "FLOAT": "FLOAT",
+    "BOOLEAN": "BOOLEAN",
+    "DATE": "DATE",
+    "TIME": "TIME",
+    "TIMESTAMP": "DATETIME",
+    "TIMESTAMP WITH TIME ZONE": "TIMESTAMP",
+    "BLOB": "BYTES",
+}
+
+replica_executor = BoundedExecutor(
+    max_workers=settings.LOCAL_REPLICA_MAX_WORKERS,
+    max_queue_depth=settings.BIGQUERY_MAX_QUEUE_DEPTH,
+    thread_name_prefix="replica"
+)
+
+
+class LocalReplica:
+    """In-memory DuckDB database holding a copy of the configured master tables"""
+
+    def __init__(
+        self,
+        project_id: str = settings.GCP_DATA_PROJECT_ID,
+        dataset_id: str = settings.GCP_DATA_DATASET_ID,
+        tables: Iterable[str] = settings.LOCAL_REPLICA_TABLES,
+        snapshot_uri: str = settings.LOCAL_REPLICA_SNAPSHOT_URI
+    ):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.tables = [table.upper() for table in tables]
+        self.snapshot_uri = snapshot_uri.rstrip("/")
+        self._connection = duckdb.connect(database=":memory:")
+        self._lock = Lock()
+        self._loaded: Dict[str, Dict[str, Any]] = {}
+        self._queries = 0
+        self._fallbacks = 0
+        self._last_refresh: Optional[float] = None
+        self._last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.snapshot_uri)
+
+    def covers(self, tables_referenced: Optional[List[str]]) -> bool:
+        """Whether every table a query reads is one of the loaded master tables"""
+        if not tables_referenced:
+            return False
+        for table_ref in tables_referenced:
+            project_id, dataset_id, table_id = (["", ""] + table_ref.split("."))[-3:]
+            if dataset_id != self.dataset_id or (project_id and project_id != self.project_id):
+                return False
+            if table_id.upper() not in self._loaded:
+                return False
+        return True
+
+    def covers_query(self, query: str) -> Optional[bool]:
+        """
+        Whether a query only reads loaded master tables, decided from its SQL
+        analysis. None when the analysis cannot tell (unparsable SQL, no
+        tables or not a SELECT); the caller then asks the dry run.
+        """
+        analysis = sql_analyzer.analyze(query)
+        if analysis.error or analysis.statement_type != "SELECT" or not analysis.qualified_tables:
+            return None
+        return self.covers(list(analysis.qualified_tables))
+
+    async def execute_query(self, query: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run a BigQuery SQL query on the replica, returning results shaped like
+        BigQueryService.execute_query, or None if DuckDB cannot run it (the
+        caller then falls back to BigQuery).
+        """
+        try:
+            return await replica_executor.run(self._execute, query, limit)
+        except (duckdb.Error, sqlglot.errors.SqlglotError) as e:
+            self._fallbacks += 1
+            logger.info(f"Local replica could not run query, falling back to BigQuery: {str(e)}")
+            return None
+
+    def _execute(self, query: str, limit: Optional[int]) -> Dict[str, Any]:
+        """Translate the query to DuckDB and run it on a DuckDB cursor (blocking)"""
+        local_query = self._translate(query)
+        if limit and not sql_analyzer.analyze(query).has_limit:
+            local_query = f"{local_query.rstrip().rstrip(';')} LIMIT {limit}"
+
+        started = datetime.now()
+        cursor = self._connection.cursor()
+        try:
+            result = cursor.sql(local_query)
+            columns = [
+                {
+                    'name': name,
+                    'type': _BIGQUERY_TYPES.get(str(column_type), "NUMERIC" if str(column_type).startswith("DECIMAL") else str(column_type)),
+                    'mode': 'NULLABLE',
+                    'description': None
+                }
+                for name, column_type in zip(result.columns, result.types)
+            ]
+            names = [column['name'] for column in columns]
+            # Same rules as the BigQuery path (Decimal and DATE values are kept), so both give the same JSON
+            rows = [
+                {name: serialize_value(value) for name, value in zip(names, row)}
+                for row in result.fetchall()
+            ]
+        finally:
+            cursor.close()
+        self._queries += 1
+
+        return {
+            'rows': rows,
+            'columns': columns,
+            'total_rows': len(rows),
+            'bytes_processed': 0,
+            'bytes_billed': 0,
+            'slot_ms': 0,
+            'creation_time': started,
+            'start_time': started,
+            'end_time': datetime.now(),
+            'job_id': f"local_{hashlib.sha256(normalize_sql(query).encode('utf-8')).hexdigest()[:16]}",
+            'engine': 'local',
+        }
+
+    def _translate(self, query: str) -> str:
+        """DuckDB SQL for a BigQuery query, reading the replica tables instead of the BigQuery ones"""
+        tree = sqlglot.parse_one(query, read="bigquery")
+        for table in tree.find_all(exp.Table):
+            name = table.name.upper()
+            if name not in self.tables or table.db not in ("", self.dataset_id) or table.catalog not in ("", self.project_id):
+                continue
+            table.set("this", exp.to_identifier(name, quoted=True))
+            table.set("db", None)
+            table.set("catalog", None)
+        return tree.sql(dialect="duckdb")
+
+    async def refresh(self) -> Dict[str, Any]:
+        """Reload every table from its snapshot; tables whose snapshot is missing keep their old copy"""
+        return await replica_executor.run(self._refresh)
+
+    def _refresh(self) -> Dict[str, Any]:
+        """Download the snapshots if needed and swap them into DuckDB (blocking)"""
+        with self._lock:
+            errors = {}
+            with tempfile.TemporaryDirectory(prefix="replica_") as download_dir:
+                for table in self.tables:
+                    try:
+                        files = self._snapshot_files(table, download_dir)
+                        if not files:
+                            errors[table] = "no snapshot"
+                            continue
+                        cursor = self._connection.cursor()
+                        try:
+                            # CREATE OR REPLACE swaps the table atomically for concurrent readers
+                            cursor.execute(f'CREATE OR REPLACE TABLE "{table}" AS SELECT * FROM read_parquet(?)', [files])
+                            row_count = cursor.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0]
+                        finally:
+                            cursor.close()
+                        self._loaded[table] = {"rows": row_count, "loaded_at": time.time()}
+                    except Exception as e:
+                        errors[table] = str(e)
+
+            self._last_refresh = time.time()
+            self._last_error = "; ".join(f"{table}: {error}" for table, error in errors.items()) or None
+            if errors:
+                logger.warning(f"Local replica refresh incomplete: {self._last_error}")
+            return self.stats()
+
+    def _snapshot_files(self, table: str, download_dir: str) -> List[str]:
+        """Local paths of the Parquet files of a table's snapshot, downloading them from GCS if needed"""
+        if not self.snapshot_uri.startswith("gs://"):
+            folder = os.path.join(self.snapshot_uri, table)
+            if not os.path.isdir(folder):
+                return []
+            return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".parquet"))
+
+        bucket_name, _, prefix = self.snapshot_uri[len("gs://"):].partition("/")
+        client = storage.Client(project=settings.GCP_PROJECT_ID)
+        files = []
+        for blob in client.list_blobs(bucket_name, prefix=f"{prefix}/{table}/".lstrip("/")):
+            if not blob.name.endswith(".parquet"):
+                continue
+            path = os.path.join(download_dir, f"{table}_{len(files)}.parquet")
+            blob.download_to_filename(path)
+            files.append(path)
+        return files
+
+    def export_snapshots(self, bigquery_client) -> None:
+        """
+        Write a fresh Parquet snapshot of every table to a ``gs://`` snapshot URI
+        with BigQuery EXPORT DATA, so no rows pass through this service (blocking)
+        """
+        if not self.snapshot_uri.startswith("gs://"):
+            raise ValueError("Snapshots can only be exported to a gs:// LOCAL_REPLICA_SNAPSHOT_URI")
+        for table in self.tables:
+            bigquery_client.query(f"""
+                EXPORT DATA OPTIONS (
+                    uri = '{self.snapshot_uri}/{table}/*.parquet',
+                    format = 'PARQUET',
+                    overwrite = true
+                ) AS SELECT * FROM `{self.project_id}.{self.dataset_id}.{table}`
+            """).result()
+
+    def stats(self) -> Dict[str, Any]:
+        """Loaded tables, query counts and the outcome of the last refresh"""
+        return {
+            "enabled": self.enabled,
+            "tables": {table: info["rows"] for table, info in self._loaded.items()},
+            "queries": self._queries,
+            "fallbacks": self._fallbacks,
+            "last_refresh": datetime.fromtimestamp(self._last_refresh).isoformat() if self._last_refresh else None,
+            "last_error": self._last_error,
+        }
+
+
+local_replica = LocalReplica()
@@ -0,0 +1,157 @@
+"""
+Running statistics of executed queries, grouped by SQL fingerprint.
+
+Queries that differ only in their literals share a fingerprint (see
+utils.sql_analysis), so each entry describes one query shape: how often it
+runs, how often it is answered without a job, how long callers wait for it
+and what it costs in billed bytes and slot time.
+
+Memory is bounded: p95 latency is computed over the most recent calls of a
+fingerprint, and once QUERY_STATS_MAX_FINGERPRINTS shapes are tracked the
+least used tenth is evicted to make room for new ones.
+"""
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from threading import Lock
+from typing import Any, Deque, Dict, List, Optional
+import math
+import time
+
+from config.settings import get_settings
+from utils.sql_analysis import sql_analyzer
+
+settings = get_settings()
+
+# SQL kept per fingerprint to show what the shape looks like
+_SAMPLE_SQL_MAX_CHARS = 1000
+# Jobs remembered per fingerprint so callers sharing a job count its bytes once
+_RECENT_JOB_IDS = 16
+
+ORDER_KEYS = ("bytes_billed", "total_time", "p95_time", "slot_ms", "calls", "errors")
+
+
+@dataclass
+class FingerprintStats:
+    sample_sql: str
+    first_seen: float
+    last_seen: float
+    latencies: Deque[float]
+    calls: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    total_seconds: float = 0.0
+    bytes_billed: int = 0
+    slot_ms: int = 0
+    recent_job_ids: Deque[str] = field(default_factory=lambda: deque(maxlen=_RECENT_JOB_IDS), repr=False)
+
+    def p95_seconds(self) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[math.ceil(0.95 * len(ordered)) - 1]
+
+
+class QueryStats:
+    """Per-fingerprint aggregates of calls, cache hits, errors, latency, bytes billed and slot time"""
+
+    def __init__(self, max_fingerprints: int, latency_samples: int):
+        self.max_fingerprints = max(1, max_fingerprints)
+        self.latency_samples = latency_samples
+        self._lock = Lock()
+        self._fingerprints: Dict[str, FingerprintStats] = {}
+        self._evicted = 0
+
+    def record(self, query: str, seconds: float, raw_results: Optional[Dict[str, Any]]) -> None:
+        """
+        Record one call of ``query`` that took ``seconds``; ``raw_results`` is
+        None when it failed. Callers that joined another caller's job share its
+        results, so a job's bytes and slot time are counted once.
+        """
+        analysis = sql_analyzer.analyze(query)
+        now = time.time()
+        with self._lock:
+            entry = self._fingerprints.get(analysis.fingerprint)
+            if entry is None:
+                if len(self._fingerprints) >= self.max_fingerprints:
+                    self._evict_rarest()
+                entry = FingerprintStats(
+                    sample_sql=analysis.normalized[:_SAMPLE_SQL_MAX_CHARS],
+                    first_seen=now,
+                    last_seen=now,
+                    latencies=deque(maxlen=self.latency_samples)
+                )
+                self._fingerprints[analysis.fingerprint] = entry
+
+            entry.calls += 1
+            entry.last_seen = now
+            entry.total_seconds += seconds
+            entry.latencies.append(seconds)
+
+            if raw_results is None:
+                entry.errors += 1
+                return
+            if raw_results.get('cache_hit'):
+                entry.cache_hits += 1
+
+            # Calls sharing a job can interleave with other jobs of the same shape
+            job_id = raw_results.get('job_id')
+            if job_id is None or job_id not in entry.recent_job_ids:
+                entry.bytes_billed += raw_results.get('bytes_billed', 0) or 0
+                entry.slot_ms += raw_results.get('slot_ms', 0) or 0
+                if job_id is not None:
+                    entry.recent_job_ids.append(job_id)
+
+    def _evict_rarest(self) -> None:
+        """Drop the least called tenth of the fingerprints, the least recent first among equals"""
+        ranked = sorted(self._fingerprints.items(), key=lambda item: (item[1].calls, item[1].last_seen))
+        for fingerprint, _ in ranked[:max(1, self.max_fingerprints // 10)]:
+            del self._fingerprints[fingerprint]
+            self._evicted += 1
+
+    def top(self, order_by: str = "bytes_billed", limit: int = 20) -> List[Dict[str, Any]]:
+        """The ``limit`` fingerprints with the highest ``order_by`` (one of ORDER_KEYS)"""
+        if order_by not in ORDER_KEYS:
+            raise ValueError(f"order_by must be one of {', '.join(ORDER_KEYS)}")
+
+        with self._lock:
+            entries = [(fingerprint, entry, entry.p95_seconds()) for fingerprint, entry in self._fingerprints.items()]
+
+        sort_keys = {
+            "bytes_billed": lambda item: item[1].bytes_billed,
+            "total_time": lambda item: item[1].total_seconds,
+            "p95_time": lambda item: item[2],
+            "slot_ms": lambda item: item[1].slot_ms,
+            "calls": lambda item: item[1].calls,
+            "errors": lambda item: item[1].errors,
+        }
+        entries.sort(key=sort_keys[order_by], reverse=True)
+
+        return [
+            {
+                "fingerprint": fingerprint,
+                "sample_sql": entry.sample_sql,
+                "calls": entry.calls,
+                "cache_hits": entry.cache_hits,
+                "errors": entry.errors,
+                "total_time_ms": round(entry.total_seconds * 1000, 1),
+                "mean_time_ms": round(entry.total_seconds * 1000 / entry.calls, 1),
+                "p95_time_ms": round(p95 * 1000, 1),
+                "bytes_billed": entry.bytes_billed,
+                "slot_ms": entry.slot_ms,
+                "first_seen": datetime.fromtimestamp(entry.first_seen),
+                "last_seen": datetime.fromtimestamp(entry.last_seen),
+            }
+            for fingerprint, entry, p95 in entries[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "fingerprints": len(self._fingerprints),
+                "max_fingerprints": self.max_fingerprints,
+                "evicted": self._evicted,
+            }
+
+
+query_stats = QueryStats(settings.QUERY_STATS_MAX_FINGERPRINTS, settings.QUERY_STATS_LATENCY_SAMPLES)
@@ -0,0 +1,172 @@
+"""
+Query result cache.
+
+``ResultCache`` is the interface the query path talks to; the in-process
+``InMemoryResultCache`` can later be swapped for a shared backend (e.g. Redis)
+without touching BigQueryService.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set
+import hashlib
+import json
+import time
+
+from config.settings import get_settings
+from utils.text_parser import normalize_sql
+
+settings = get_settings()
+
+# Rows sampled to estimate the memory footprint of a result
+_SIZE_SAMPLE_ROWS = 20
+
+
+@dataclass
+class CachedResult:
+    raw_results: Dict[str, Any]
+    table_versions: Dict[str, float]
+    size_bytes: int
+    expires_at: float
+    created_at: float = field(default_factory=time.time)
+
+
+class ResultCache(ABC):
+    """Storage for executed query results keyed by normalized SQL and limit"""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CachedResult]:
+        """Return a live entry or None"""
+
+    @abstractmethod
+    def set(self, key: str, entry: CachedResult) -> None:
+        """Store an entry, evicting others if needed"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Drop a single entry"""
+
+    @abstractmethod
+    def invalidate_table(self, table_id: str, version: Optional[float] = None) -> int:
+        """
+        Drop every entry that read from ``table_id`` (only those that read it
+        before ``version``, when given); returns how many were dropped
+        """
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit-rate figures"""
+
+
+class InMemoryResultCache(ResultCache):
+    """
+    Process-local result cache bounded by an approximate memory budget,
+    evicting least recently used entries first.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedResult]" = OrderedDict()
+        self._keys_by_table: Dict[str, Set[str]] = {}
+        self._size_bytes = 0
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.time():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, entry: CachedResult) -> None:
+        # A single result larger than a quarter of the budget would just churn the cache
+        if entry.size_bytes > self.max_bytes // 4:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = entry
+            self._size_bytes += entry.size_bytes
+            for table_id in entry.table_versions:
+                self._keys_by_table.setdefault(table_id, set()).add(key)
+
+            while self._size_bytes > self.max_bytes and self._entries:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+                self.invalidations += 1
+
+    def invalidate_table(self, table_id: str, version: Optional[float] = None) -> int:
+        with self._lock:
+            keys = [
+                key for key in self._keys_by_table.get(table_id, ())
+                if version is None or self._entries[key].table_versions[table_id] < version
+            ]
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "entries": len(self._entries),
+                "size_bytes": self._size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._size_bytes -= entry.size_bytes
+        for table_id in entry.table_versions:
+            keys = self._keys_by_table.get(table_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table_id]
+
+
+def make_result_cache_key(query: str, limit: Optional[int], page_size: Optional[int] = None) -> str:
+    """Cache key for a query: hash of its normalized SQL plus the row limit and page size"""
+    key = f"{normalize_sql(query)}\x00{limit}"
+    if page_size:
+        key += f"\x00{page_size}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def estimate_result_size(raw_results: Dict[str, Any]) -> int:
+    """Approximate the memory held by a result from the JSON size of a few sample rows"""
+    rows: List[Dict[str, Any]] = raw_results.get("rows", [])
+    if not rows:
+        return 1024
+
+    sample = rows[:_SIZE_SAMPLE_ROWS]
+    sample_size = len(json.dumps(sample, default=str))
+    # Python objects take a few times more memory than their JSON encoding
+    return int(sample_size / len(sample) * len(rows) * 4) + 1024
+
+
+result_cache: ResultCache = InMemoryResultCache(max_bytes=settings.RESULT_CACHE_MAX_BYTES)
@@ -0,0 +1,398 @@
+"""
+Daily rollup tables of the fact tables and the query rewriter that uses them.
+
+Each rollup groups a fact table (or a header/lines pair joined on its keys)
+by day and a set of dimension columns, keeping SUM and COUNT of every
+measure plus the row count. An aggregate query can read the rollup instead
+of the fact tables when:
+- it reads exactly the rollup's fact tables, joined on their keys, plus any
+  other (dimension) tables;
+- every fact column outside an aggregate is a rollup dimension;
+- its aggregates are COUNT(*), SUM/AVG/COUNT of a measure, COUNT(DISTINCT)
+  or MIN/MAX of dimensions, or any aggregate of dimension-table columns that
+  ignores duplicates (MIN, MAX, COUNT DISTINCT).
+Filters and joins on dimensions commute with the pre-aggregation, so WHERE,
+GROUP BY, HAVING and ORDER BY are kept as written.
+
+Rollups are rebuilt in BigQuery with CREATE OR REPLACE TABLE; the time the
+rebuild started is stored as a label so a rollup is only used while none of
+its source tables has been modified since.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+import logging
+import time
+
+import sqlglot
+from sqlglot import exp
+
+from config.settings import get_settings
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+SOURCE_TIME_LABEL = "rollup_source_time"
+
+
+@dataclass(frozen=True)
+class RollupDefinition:
+    name: str
+    fact_tables: Tuple[str, ...]
+    # Columns with the same name in every fact table that join them
+    join_keys: Tuple[str, ...]
+    # Column name -> fact table it is read from
+    dimensions: Dict[str, str]
+    measures: Dict[str, str]
+
+    def build_sql(self, project_id: str, dataset_id: str) -> str:
+        """SELECT that computes the rollup from its fact tables"""
+        aliases = {table: f"t{index}" for index, table in enumerate(self.fact_tables)}
+        select = [f"{aliases[table]}.{column} AS {column}" for column, table in self.dimensions.items()]
+        for column, table in self.measures.items():
+            select.append(f"SUM({aliases[table]}.{column}) AS SUM_{column}")
+            select.append(f"COUNT({aliases[table]}.{column}) AS CNT_{column}")
+        select.append("COUNT(*) AS ROW_COUNT")
+
+        from_clause = f"`{project_id}.{dataset_id}.{self.fact_tables[0]}` AS t0"
+        for index, table in enumerate(self.fact_tables[1:], start=1):
+            on = " AND ".join(f"t0.{key} = t{index}.{key}" for key in self.join_keys)
+            from_clause += f"\nJOIN `{project_id}.{dataset_id}.{table}` AS t{index} ON {on}"
+
+        group_by = ", ".join(str(position) for position in range(1, len(self.dimensions) + 1))
+        return f"SELECT {', '.join(select)}\nFROM {from_clause}\nGROUP BY {group_by}"
+
+
+ROLLUPS: List[RollupDefinition] = [
+    RollupDefinition(
+        name="ROLLUP_FACCAB_DIA",
+        fact_tables=("FACCAB",),
+        join_keys=(),
+        dimensions={column: "FACCAB" for column in (
+            "FACFCH", "FACPLAID", "FACTPODOC", "FACNEGID", "DSTID", "FACMONID", "POLID"
+        )},
+        measures={"FACTOT": "FACCAB"},
+    ),
+    RollupDefinition(
+        name="ROLLUP_FACLINPR_DIA",
+        fact_tables=("FACCAB", "FACLINPR"),
+        join_keys=("FACPLAID", "FACTPODOC", "FACNRO", "FACSERIE"),
+        dimensions={
+            **{column: "FACCAB" for column in ("FACFCH", "FACPLAID", "FACTPODOC", "FACNEGID", "DSTID", "FACMONID", "POLID")},
+            **{column: "FACLINPR" for column in ("PRDID", "FACUNDFAC")},
+        },
+        measures={"FACLINCNT": "FACLINPR"},
+    ),
+    RollupDefinition(
+        name="ROLLUP_DOCCRG_DIA",
+        fact_tables=("DOCCRG",),
+        join_keys=(),
+        dimensions={column: "DOCCRG" for column in ("DOCFCH", "PLAID", "DOCDSTID", "DOCNEGID", "POLID")},
+        measures={},
+    ),
+    RollupDefinition(
+        name="ROLLUP_DCPRDLIN_DIA",
+        fact_tables=("DOCCRG", "DCPRDLIN"),
+        join_keys=("PLAID", "DOCID"),
+        dimensions={
+            **{column: "DOCCRG" for column in ("DOCFCH", "PLAID", "DOCDSTID", "DOCNEGID", "POLID")},
+            **{column: "DCPRDLIN" for column in ("PRDID", "DCCNTCORUI")},
+        },
+        measures={"DOCCNTCORL": "DCPRDLIN"},
+    ),
+]
+
+
+class _NoMatch(Exception):
+    """The query cannot be answered from the rollup being tried"""
+
+
+def _conjuncts(condition: exp.Expression) -> List[exp.Expression]:
+    return list(condition.flatten()) if isinstance(condition, exp.And) else [condition]
+
+
+class _RollupMatcher:
+    """Checks one parsed query against one rollup and rewrites it (single use)"""
+
+    def __init__(
+        self,
+        tree: exp.Select,
+        rollup: RollupDefinition,
+        project_id: str,
+        dataset_id: str,
+        table_columns: Dict[str, Set[str]]
+    ):
+        self.tree = tree
+        self.rollup = rollup
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.table_columns = table_columns
+        self.fact_aliases: Dict[str, str] = {}
+        self.other_aliases: Set[str] = set()
+
+    def rewrite(self, rollup_table: exp.Table) -> str:
+        tree = self.tree
+        if tree.find(exp.Window) or tree.args.get("with") or len(list(tree.find_all(exp.Select))) != 1:
+            raise _NoMatch("not a single-level query")
+        if any(not isinstance(star.parent, exp.Count) for star in tree.find_all(exp.Star)):
+            raise _NoMatch("SELECT *")
+
+        sources = self._sources()
+        primary, secondary_joins = self._check_fact_joins(sources)
+
+        aggregates = list(tree.find_all(exp.AggFunc))
+        if not aggregates and not tree.args.get("group"):
+            raise _NoMatch("not an aggregate query")
+
+        primary_alias = primary.alias_or_name
+        replacements = [(aggregate, self._rollup_aggregate(aggregate, primary_alias)) for aggregate in aggregates]
+        replaced = {id(aggregate) for aggregate, replacement in replacements if replacement is not None}
+        join_columns = {id(column) for join in secondary_joins for column in join.find_all(exp.Column)}
+
+        select_aliases = {expression.alias.upper() for expression in tree.expressions if expression.alias}
+        for column in tree.find_all(exp.Column):
+            if id(column) in join_columns or self._inside(column, replaced):
+                continue
+            self._check_dimension_column(column, select_aliases)
+
+        # Everything matched: rewrite the tree in place
+        for aggregate, replacement in replacements:
+            if replacement is not None:
+                aggregate.replace(replacement)
+        for join in secondary_joins:
+            join.pop()
+        rollup_table.set("alias", exp.TableAlias(this=exp.to_identifier(primary_alias)))
+        primary.replace(rollup_table)
+        for column in tree.find_all(exp.Column):
+            if column.table and column.table.upper() in self.fact_aliases:
+                column.set("table", exp.to_identifier(primary_alias))
+                column.set("db", None)
+                column.set("catalog", None)
+
+        return tree.sql(dialect="bigquery")
+
+    def _sources(self) -> List[exp.Table]:
+        """Tables in FROM and JOIN order; records fact and dimension-table aliases"""
+        from_clause = self.tree.args.get("from_")
+        if from_clause is None:
+            raise _NoMatch("no FROM")
+        sources = [from_clause.this] + [join.this for join in self.tree.args.get("joins") or []]
+        if any(not isinstance(source, exp.Table) for source in sources):
+            raise _NoMatch("FROM is not a plain table")
+
+        facts = []
+        for table in sources:
+            name = table.name.upper()
+            if name in self.rollup.fact_tables and table.db in ("", self.dataset_id) and table.catalog in ("", self.project_id):
+                facts.append(name)
+                self.fact_aliases[table.alias_or_name.upper()] = name
+            else:
+                self.other_aliases.add(table.alias_or_name.upper())
+        if sorted(facts) != sorted(self.rollup.fact_tables):
+            raise _NoMatch("different fact tables")
+        return sources
+
+    def _check_fact_joins(self, sources: List[exp.Table]) -> Tuple[exp.Table, List[exp.Join]]:
+        """The first fact table and the joins that bring in the others, which must join on the keys"""
+        fact_sources = [table for table in sources if table.alias_or_name.upper() in self.fact_aliases]
+        primary = fact_sources[0]
+        secondary_joins = []
+        for table in fact_sources[1:]:
+            join = table.parent
+            if not isinstance(join, exp.Join) or join.side or (join.kind or "INNER").upper() != "INNER":
+                raise _NoMatch("fact tables not inner-joined")
+            using = join.args.get("using")
+            if using:
+                keys = [identifier.name.upper() for identifier in using]
+            elif join.args.get("on") is not None:
+                keys = self._join_keys(join.args["on"], table.alias_or_name.upper())
+            else:
+                raise _NoMatch("fact tables not joined on keys")
+            if sorted(keys) != sorted(self.rollup.join_keys):
+                raise _NoMatch("fact tables joined on other columns")
+            secondary_joins.append(join)
+        return primary, secondary_joins
+
+    def _join_keys(self, condition: exp.Expression, alias: str) -> List[str]:
+        keys = []
+        for conjunct in _conjuncts(condition):
+            if not isinstance(conjunct, exp.EQ):
+                raise _NoMatch("fact join is not an equi-join")
+            left, right = conjunct.this, conjunct.expression
+            if not (isinstance(left, exp.Column) and isinstance(right, exp.Column)):
+                raise _NoMatch("fact join is not on columns")
+            qualifiers = {left.table.upper(), right.table.upper()}
+            if alias not in qualifiers or not qualifiers <= set(self.fact_aliases) or left.name.upper() != right.name.upper():
+                raise _NoMatch("fact join is not on matching key columns")
+            keys.append(left.name.upper())
+        return keys
+
+    def _fact_column(self, column: exp.Column) -> Optional[str]:
+        """Upper-case name of a column read from a fact table, or None for any other column"""
+        qualifier = column.table.upper()
+        name = column.name.upper()
+        if qualifier:
+            return name if qualifier in self.fact_aliases else None
+        if name in self.rollup.dimensions or name in self.rollup.measures:
+            return name
+        if any(name in self.table_columns.get(table, set()) for table in self.rollup.fact_tables):
+            return name
+        return None
+
+    def _rollup_aggregate(self, aggregate: exp.AggFunc, alias: str) -> Optional[exp.Expression]:
+        """Equivalent aggregate over the rollup columns, or None to keep the aggregate as written"""
+        argument = aggregate.this
+        measure = self._fact_column(argument) if isinstance(argument, exp.Column) else None
+        if measure is not None and measure not in self.rollup.measures:
+            measure = None
+
+        if isinstance(aggregate, exp.Count) and isinstance(argument, (exp.Star, exp.Literal)):
+            return exp.func("COALESCE", exp.Sum(this=exp.column("ROW_COUNT", table=alias)), exp.Literal.number(0))
+        if isinstance(aggregate, exp.Count) and isinstance(argument, exp.Distinct):
+            self._check_no_measures(aggregate)
+            return None
+        if measure is not None and isinstance(aggregate, exp.Count):
+            return exp.func("COALESCE", exp.Sum(this=exp.column(f"CNT_{measure}", table=alias)), exp.Literal.number(0))
+        if measure is not None and isinstance(aggregate, exp.Sum):
+            return exp.Sum(this=exp.column(f"SUM_{measure}", table=alias))
+        if measure is not None and isinstance(aggregate, exp.Avg):
+            return exp.func(
+                "SAFE_DIVIDE",
+                exp.Sum(this=exp.column(f"SUM_{measure}", table=alias)),
+                exp.Sum(this=exp.column(f"CNT_{measure}", table=alias))
+            )
+        if isinstance(aggregate, (exp.Min, exp.Max)):
+            self._check_no_measures(aggregate)
+            return None
+        raise _NoMatch(f"aggregate {aggregate.sql(dialect='bigquery')} cannot be read from the rollup")
+
+    def _check_no_measures(self, aggregate: exp.AggFunc) -> None:
+        for column in aggregate.find_all(exp.Column):
+            fact_column = self._fact_column(column)
+            if fact_column is not None and fact_column not in self.rollup.dimensions:
+                raise _NoMatch(f"{aggregate.sql(dialect='bigquery')} needs fact rows")
+
+    def _check_dimension_column(self, column: exp.Column, select_aliases: Set[str]) -> None:
+        name = column.name.upper()
+        if not column.table and name in select_aliases:
+            return
+        fact_column = self._fact_column(column)
+        if fact_column is not None:
+            if fact_column not in self.rollup.dimensions:
+                raise _NoMatch(f"column {column.sql(dialect='bigquery')} is not a rollup dimension")
+            return
+        if column.table:
+            return
+        # Unqualified and not a fact column: only accepted if a joined table is known to have it
+        if not any(name in columns for columns in self.table_columns.values()):
+            raise _NoMatch(f"unknown column {name}")
+
+    def _inside(self, node: exp.Expression, ancestors: Set[int]) -> bool:
+        parent = node.parent
+        while parent is not None:
+            if id(parent) in ancestors:
+                return True
+            parent = parent.parent
+        return False
+
+
+class RollupManager:
+    """Builds the rollup tables and rewrites aggregate queries to read them"""
+
+    def __init__(
+        self,
+        project_id: str = settings.GCP_DATA_PROJECT_ID,
+        dataset_id: str = settings.GCP_DATA_DATASET_ID,
+        rollup_dataset_id: str = settings.ROLLUP_DATASET_ID,
+        rollups: List[RollupDefinition] = ROLLUPS
+    ):
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.rollup_dataset_id = rollup_dataset_id or dataset_id
+        self.rollups = rollups
+        # Time each rollup's source data was read; a rollup without one is never used
+        self._source_times: Dict[str, float] = {}
+        self._rewrites: Dict[str, int] = {}
+        self._bytes_saved = 0
+        self._last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.ROLLUPS_ENABLED
+
+    def table_id(self, rollup: RollupDefinition) -> str:
+        return f"{self.project_id}.{self.rollup_dataset_id}.{rollup.name}"
+
+    def source_table_ids(self, rollup: RollupDefinition) -> List[str]:
+        return [f"{self.project_id}.{self.dataset_id}.{table}" for table in rollup.fact_tables]
+
+    def source_time(self, rollup: RollupDefinition) -> Optional[float]:
+        return self._source_times.get(rollup.name)
+
+    def rewrite(self, query: str, table_columns: Dict[str, Set[str]]) -> Optional[Tuple[RollupDefinition, str]]:
+        """
+        Rewrite an aggregate query to read a built rollup, or return None.
+        ``table_columns`` maps upper-case table names to their upper-case columns
+        and is used to tell fact columns from dimension-table columns.
+        """
+        try:
+            parsed = sqlglot.parse_one(query, read="bigquery")
+        except sqlglot.errors.SqlglotError:
+            return None
+        if not isinstance(parsed, exp.Select):
+            return None
+
+        for rollup in self.rollups:
+            if rollup.name not in self._source_times:
+                continue
+            try:
+                matcher = _RollupMatcher(parsed.copy(), rollup, self.project_id, self.dataset_id, table_columns)
+                rollup_table = exp.table_(rollup.name, db=self.rollup_dataset_id, catalog=self.project_id, quoted=True)
+                return rollup, matcher.rewrite(rollup_table)
+            except _NoMatch as e:
+                logger.debug(f"{rollup.name} does not answer query: {e}")
+        return None
+
+    def record_rewrite(self, rollup: RollupDefinition, bytes_saved: int) -> None:
+        self._rewrites[rollup.name] = self._rewrites.get(rollup.name, 0) + 1
+        self._bytes_saved += max(bytes_saved, 0)
+
+    def load_state(self, client) -> None:
+        """Read the source time of rollups built earlier from their table labels (blocking)"""
+        for rollup in self.rollups:
+            try:
+                label = (client.get_table(self.table_id(rollup)).labels or {}).get(SOURCE_TIME_LABEL)
+                if label:
+                    self._source_times[rollup.name] = float(label)
+            except Exception as e:
+                logger.info(f"Rollup {rollup.name} not available yet: {e}")
+
+    def refresh(self, client) -> None:
+        """Rebuild every rollup table from its fact tables (blocking)"""
+        errors = []
+        for rollup in self.rollups:
+            source_time = int(time.time())
+            try:
+                client.query(
+                    f"CREATE OR REPLACE TABLE `{self.table_id(rollup)}`\n"
+                    f"OPTIONS (labels = [('{SOURCE_TIME_LABEL}', '{source_time}')]) AS\n"
+                    f"{rollup.build_sql(self.project_id, self.dataset_id)}"
+                ).result()
+                self._source_times[rollup.name] = float(source_time)
+            except Exception as e:
+                errors.append(f"{rollup.name}: {e}")
+        self._last_error = "; ".join(errors) or None
+        if errors:
+            logger.error(f"Rollup refresh incomplete: {self._last_error}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Built rollups, rewrite counts and bytes saved"""
+        return {
+            "enabled": self.enabled,
+            "built": {name: int(source_time) for name, source_time in self._source_times.items()},
+            "rewrites": dict(self._rewrites),
+            "bytes_saved": self._bytes_saved,
+            "last_error": self._last_error,
+        }
+
+
+rollup_manager = RollupManager()
@@ -0,0 +1,139 @@
+"""
+In-memory, versioned copy of the dataset schema served by /schemas.
+
+The schema is read from INFORMATION_SCHEMA once and then refreshed in the
+background. Its version is a content hash, so clients can revalidate with
+If-None-Match, and a few previous versions are remembered so a client that
+is behind can ask only for the tables that changed.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import hashlib
+import logging
+import time
+
+from config.settings import get_settings
+from models.query.model import DatasetSchema, SchemaDiff
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SchemaSnapshot:
+    version: str
+    schemas: List[DatasetSchema]
+    table_hashes: Dict[str, str]
+    # Upper-case table name -> upper-case column names, for SQL analysis
+    table_columns: Dict[str, Set[str]] = field(default_factory=dict)
+    fetched_at: float = field(default_factory=time.time)
+
+
+def _content_hash(payload: str) -> str:
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SchemaRegistry:
+    """Current schema snapshot plus the per-table hashes of recent versions"""
+
+    def __init__(self, history_size: int = settings.SCHEMA_HISTORY_SIZE):
+        self.history_size = history_size
+        self._current: Optional[SchemaSnapshot] = None
+        self._history: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+        self._lock = asyncio.Lock()
+        self._refreshes = 0
+        self._last_error: Optional[str] = None
+
+    async def get(self, bigquery_service) -> SchemaSnapshot:
+        """Current snapshot, fetching it on first use"""
+        if self._current is None:
+            async with self._lock:
+                if self._current is None:
+                    await self._refresh_locked(bigquery_service)
+        return self._current
+
+    async def refresh(self, bigquery_service) -> SchemaSnapshot:
+        """Read the schema from BigQuery and publish it as a new version if it changed"""
+        async with self._lock:
+            return await self._refresh_locked(bigquery_service)
+
+    async def _refresh_locked(self, bigquery_service) -> SchemaSnapshot:
+        try:
+            schemas = await bigquery_service.get_schemas()
+        except Exception as e:
+            self._last_error = str(e)
+            raise
+        self._last_error = None
+        self._refreshes += 1
+
+        version = _content_hash("".join(schema.model_dump_json() for schema in schemas))
+        if self._current is not None and self._current.version == version:
+            self._current.fetched_at = time.time()
+            return self._current
+
+        table_hashes = {
+            table.table_id: _content_hash(table.model_dump_json())
+            for schema in schemas
+            for table in schema.tables
+        }
+        if self._current is not None:
+            logger.info(f"Schema changed from version {self._current.version} to {version}")
+            self._history[self._current.version] = self._current.table_hashes
+            while len(self._history) > self.history_size:
+                self._history.popitem(last=False)
+
+        table_columns = {
+            table.table_id.upper(): {column.name.upper() for column in table.schema}
+            for schema in schemas
+            for table in schema.tables
+        }
+        self._current = SchemaSnapshot(
+            version=version,
+            schemas=schemas,
+            table_hashes=table_hashes,
+            table_columns=table_columns
+        )
+        return self._current
+
+    def diff(self, snapshot: SchemaSnapshot, since: str) -> SchemaDiff:
+        """
+        Tables added or changed, and tables removed, between ``since`` and
+        ``snapshot``. An unknown ``since`` version yields a full diff with every table.
+        """
+        previous_hashes = self._history.get(since) if since != snapshot.version else snapshot.table_hashes
+        full = previous_hashes is None
+        previous_hashes = previous_hashes or {}
+
+        changed_tables = [
+            table
+            for schema in snapshot.schemas
+            for table in schema.tables
+            if full or previous_hashes.get(table.table_id) != snapshot.table_hashes[table.table_id]
+        ]
+        removed_tables = [table_id for table_id in previous_hashes if table_id not in snapshot.table_hashes]
+
+        return SchemaDiff(
+            version=snapshot.version,
+            since=since,
+            full=full,
+            dataset_id=snapshot.schemas[0].dataset_id if snapshot.schemas else "",
+            changed_tables=changed_tables,
+            removed_tables=removed_tables
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Current version, its age and refresh outcome"""
+        current = self._current
+        return {
+            "version": current.version if current else None,
+            "tables": len(current.table_hashes) if current else 0,
+            "age_seconds": round(time.time() - current.fetched_at, 1) if current else None,
+            "known_versions": len(self._history) + (1 if current else 0),
+            "refreshes": self._refreshes,
+            "last_error": self._last_error,
+        }
+
+
+schema_registry = SchemaRegistry()
@@ -0,0 +1,122 @@
+"""
+Log of requests slower than SLOW_QUERY_LOG_THRESHOLD_SECONDS.
+
+Each slow request is written as one JSON line with the SQL fingerprint and
+normalized text, the total time and its breakdown per stage, the rows and
+the bytes. Entries are queued and written to a rotating file by a
+background thread, so a slow disk never blocks the event loop; when the
+queue is full new entries are dropped and counted.
+"""
+from datetime import datetime
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, Optional
+import json
+import logging
+import os
+import queue
+
+from config.settings import get_settings
+from utils.sql_analysis import sql_analyzer
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+# Entries waiting for the writer thread
+_QUEUE_SIZE = 10_000
+# SQL kept per entry
+_SQL_MAX_CHARS = 4000
+
+
+class SlowQueryLog:
+    """Asynchronous writer of slow request entries to a rotating file"""
+
+    def __init__(self, path: str, threshold_seconds: float, max_bytes: int, backup_count: int):
+        self.path = path
+        self.threshold_seconds = threshold_seconds
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=_QUEUE_SIZE)
+        self._listener: Optional[QueueListener] = None
+        self._logged = 0
+        self._dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_seconds > 0 and bool(self.path)
+
+    def start(self) -> None:
+        """Open the file and start the writer thread"""
+        if not self.enabled or self._listener is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handler = RotatingFileHandler(
+            self.path,
+            maxBytes=self.max_bytes,
+            backupCount=self.backup_count,
+            encoding="utf-8",
+            delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = QueueListener(self._queue, handler)
+        self._listener.start()
+        logger.info(f"Slow query log: requests over {self.threshold_seconds}s go to {self.path}")
+
+    def stop(self) -> None:
+        """Write the queued entries and stop the writer thread"""
+        if self._listener is None:
+            return
+        self._listener.stop()
+        for handler in self._listener.handlers:
+            handler.close()
+        self._listener = None
+
+    def record(
+        self,
+        query: str,
+        seconds: float,
+        stages: Optional[Dict[str, float]],
+        rows: Optional[int],
+        bytes_processed: Optional[int],
+        status: Any
+    ) -> None:
+        """Queue an entry for a request that took ``seconds``, if it is over the threshold"""
+        if self._listener is None or seconds < self.threshold_seconds:
+            return
+
+        analysis = sql_analyzer.analyze(query)
+        entry = {
+            "timestamp": datetime.now().isoformat(),
+            "fingerprint": analysis.fingerprint,
+            "sql": analysis.normalized[:_SQL_MAX_CHARS],
+            "status": getattr(status, "value", status),
+            "total_seconds": round(seconds, 6),
+            "stages": {stage: round(elapsed, 6) for stage, elapsed in (stages or {}).items()},
+            "rows": rows,
+            "bytes_processed": bytes_processed,
+        }
+        record = logging.makeLogRecord({"msg": json.dumps(entry, ensure_ascii=False), "levelno": logging.WARNING})
+        try:
+            self._queue.put_nowait(record)
+            self._logged += 1
+        except queue.Full:
+            self._dropped += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._listener is not None,
+            "threshold_seconds": self.threshold_seconds,
+            "path": self.path,
+            "logged": self._logged,
+            "dropped": self._dropped,
+            "queued": self._queue.qsize(),
+        }
+
+
+slow_query_log = SlowQueryLog(
+    settings.SLOW_QUERY_LOG_PATH,
+    settings.SLOW_QUERY_LOG_THRESHOLD_SECONDS,
+    settings.SLOW_QUERY_LOG_MAX_BYTES,
+    settings.SLOW_QUERY_LOG_BACKUP_COUNT
+)
@@ -0,0 +1,8 @@
+import os
+
+# Settings the service requires; the tests never reach GCP
+for _name in ("GCP_PROJECT_ID", "GCP_DATA_PROJECT_ID", "GCP_DATA_DATASET_ID", "GCS_BUCKET_NAME", "BIGQUERY_DATASET",
+              "INDEX_DISPLAY_NAME", "ENDPOINT_DISPLAY_NAME", "DEPLOYED_INDEX_ID",
+              "FIRESTORE_DATABASE_NAME", "FIRESTORE_COLLECTION_NAME"):
+    os.environ.setdefault(_name, "test")
+os.environ.setdefault("SIMILARITY_THRESHOLD", "0.3")
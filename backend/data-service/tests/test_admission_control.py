@@ -0,0 +1,170 @@
+import asyncio
+import time
+
+import pytest
+
+from models.query.model import QueryStatus
+from services.admission_control import (
+    GLOBAL_BUDGET,
+    AdmissionController,
+    AdmissionRejectedError,
+    RollingByteBudget,
+)
+
+GIB = 1024 ** 3
+
+
+def _controller(**overrides) -> AdmissionController:
+    limits = dict(
+        max_query_bytes=100 * GIB,
+        expensive_bytes=10 * GIB,
+        user_budget_bytes=50 * GIB,
+        global_budget_bytes=80 * GIB,
+        window_seconds=3600,
+        max_expensive_running=1,
+        max_expensive_queued=1,
+        queue_timeout=0.05,
+    )
+    limits.update(overrides)
+    return AdmissionController(**limits)
+
+
+async def _run(controller: AdmissionController, estimated_bytes, user_id="alice"):
+    async with controller.admit(estimated_bytes, user_id) as expensive:
+        return expensive
+
+
+def test_query_over_the_hard_cap_is_rejected_without_charging():
+    controller = _controller()
+    with pytest.raises(AdmissionRejectedError) as error:
+        asyncio.run(_run(controller, 101 * GIB))
+    assert error.value.status == QueryStatus.TOO_EXPENSIVE
+    assert error.value.suggestions
+    assert controller.stats()["global_bytes_used"] == 0
+    assert controller.stats()["rejected"] == {"max_query_bytes": 1}
+
+
+def test_user_budget_is_per_user():
+    controller = _controller()
+    asyncio.run(_run(controller, 5 * GIB, "alice"))
+    asyncio.run(_run(controller, 40 * GIB, "alice"))
+    with pytest.raises(AdmissionRejectedError) as error:
+        asyncio.run(_run(controller, 6 * GIB, "alice"))
+    assert error.value.status == QueryStatus.BUDGET_EXCEEDED
+    assert "5.0 GiB of your data budget is left" in str(error.value)
+
+    # Another user still has the whole budget
+    asyncio.run(_run(controller, 6 * GIB, "bob"))
+    assert controller.stats()["rejected"] == {"user_budget": 1}
+
+
+def test_global_budget_covers_every_user():
+    controller = _controller()
+    for user_id in ("alice", "bob", "carol", "dave", "erin", "frank", "grace", "heidi"):
+        asyncio.run(_run(controller, 9 * GIB, user_id))
+    with pytest.raises(AdmissionRejectedError, match="service data budget is exhausted"):
+        asyncio.run(_run(controller, 9 * GIB, "ivan"))
+    assert controller.stats()["global_bytes_used"] == 72 * GIB
+
+
+def test_missing_estimate_and_user_are_admitted_as_zero_bytes():
+    controller = _controller()
+    assert asyncio.run(_run(controller, None, None)) is False
+    assert controller.stats()["admitted"] == 1
+
+
+def test_cheap_queries_do_not_take_an_expensive_slot():
+    controller = _controller(max_expensive_queued=0)
+
+    async def scenario():
+        async with controller.admit(20 * GIB, "alice") as expensive:
+            assert expensive
+            assert await _run(controller, 1 * GIB, "bob") is False
+
+    asyncio.run(scenario())
+
+
+def test_waiting_expensive_query_runs_once_the_slot_is_released():
+    controller = _controller(queue_timeout=1)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def holder():
+            async with controller.admit(20 * GIB, "alice"):
+                await release.wait()
+
+        task = asyncio.create_task(holder())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(_run(controller, 20 * GIB, "bob"))
+        await asyncio.sleep(0.01)
+        assert controller.stats()["expensive_queued"] == 1
+        release.set()
+        assert await waiter is True
+        await task
+
+    asyncio.run(scenario())
+    assert controller.stats()["expensive_running"] == 0
+
+
+def test_full_queue_rejects_and_refunds_the_budget():
+    controller = _controller(max_expensive_queued=0)
+
+    async def scenario():
+        async with controller.admit(20 * GIB, "alice"):
+            with pytest.raises(AdmissionRejectedError, match="Too many large queries"):
+                await _run(controller, 20 * GIB, "bob")
+
+    asyncio.run(scenario())
+    assert controller.stats()["global_bytes_used"] == 20 * GIB
+    assert controller.stats()["rejected"] == {"queue_full": 1}
+
+
+def test_slot_wait_times_out():
+    controller = _controller()
+
+    async def scenario():
+        async with controller.admit(20 * GIB, "alice"):
+            with pytest.raises(AdmissionRejectedError) as error:
+                await _run(controller, 20 * GIB, "bob")
+            assert error.value.status == QueryStatus.TIMEOUT
+
+    asyncio.run(scenario())
+    stats = controller.stats()
+    assert stats["global_bytes_used"] == 20 * GIB
+    assert stats["expensive_queued"] == 0
+    assert stats["rejected"] == {"queue_timeout": 1}
+
+
+def test_budget_charges_expire_after_the_window():
+    budget = RollingByteBudget(window_seconds=60)
+    budget.charge("alice", 10)
+    budget.charge("alice", 5)
+    assert budget.used("alice") == 15
+    assert budget.used("alice", now=time.monotonic() + 61) == 0
+    # Users without recent charges leave no state behind
+    assert "alice" not in budget._totals
+
+
+def test_refund_removes_the_latest_matching_charge():
+    budget = RollingByteBudget(window_seconds=60)
+    budget.charge(GLOBAL_BUDGET, 10)
+    budget.charge(GLOBAL_BUDGET, 5)
+    budget.refund(GLOBAL_BUDGET, 10)
+    assert budget.used(GLOBAL_BUDGET) == 5
+    budget.refund(GLOBAL_BUDGET, 7)
+    assert budget.used(GLOBAL_BUDGET) == 5
+
+
+def test_unestimated_query_is_charged_what_it_processed():
+    controller = _controller()
+    controller.admit_unestimated("alice")
+    controller.charge(120 * GIB, "alice")
+    assert controller.stats()["global_bytes_used"] == 120 * GIB
+
+    # Only admitted while budget is left, and never held to the per-query cap
+    with pytest.raises(AdmissionRejectedError, match="Query rejected: only 0.0 B of your data budget is left"):
+        controller.admit_unestimated("alice")
+    with pytest.raises(AdmissionRejectedError, match="service data budget is exhausted"):
+        controller.admit_unestimated("bob")
+    assert controller.stats()["admitted"] == 1
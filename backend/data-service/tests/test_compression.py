@@ -0,0 +1,36 @@
+import pytest
+
+from utils.compression import negotiate_encoding
+
+
+@pytest.mark.parametrize("accept_encoding, expected", [
+    (None, None),
+    ("", None),
+    ("gzip", "gzip"),
+    ("GZIP", "gzip"),
+    ("zstd", "zstd"),
+    ("br", None),
+    ("identity", None),
+    # Ties go to the preferred coding, whatever the header order
+    ("gzip, zstd", "zstd"),
+    ("gzip;q=0.8, zstd;q=0.8", "zstd"),
+    # Higher q-values win over preference
+    ("gzip;q=0.5, zstd;q=0.4", "gzip"),
+    ("zstd;q=0.1, gzip", "gzip"),
+    # q=0 refuses a coding
+    ("zstd;q=0, gzip", "gzip"),
+    ("zstd;q=0, gzip;q=0", None),
+    ("gzip;q=0", None),
+    # * stands for every coding not listed
+    ("*", "zstd"),
+    ("*;q=0", None),
+    ("zstd;q=0, *", "gzip"),
+    ("gzip, *;q=0.5", "gzip"),
+    ("zstd;q=0, gzip;q=0, *", None),
+    # An unreadable q-value counts as 0
+    ("gzip;q=abc", None),
+    ("zstd;q=x, gzip;q=0.2", "gzip"),
+    (" gzip ; q=1.0 ,zstd; q=0.9", "gzip"),
+])
+def test_negotiate_encoding(accept_encoding, expected):
+    assert negotiate_encoding(accept_encoding) == expected
@@ -0,0 +1,27 @@
+from pathlib import Path
+
+import pytest
+
+from config.settings import get_settings
+from services.local_engine import LocalEngine, load_schema_ddl, parse_schema
+
+LLM_SERVICE_CONSTANTS = Path(__file__).resolve().parents[2] / "llm-service" / "utils" / "constants.py"
+
+
+def test_schema_ships_with_the_service():
+    schema_file = Path(get_settings().LOCAL_ENGINE_SCHEMA_FILE)
+    assert schema_file.is_relative_to(Path(__file__).resolve().parents[1])
+    tables = {table.name for table in parse_schema(load_schema_ddl(str(schema_file)))}
+    assert {"FACCAB", "FACLINPR", "DOCCRG", "DCPRDLIN", "PLANTAS"} <= tables
+
+
+@pytest.mark.skipif(not LLM_SERVICE_CONSTANTS.exists(), reason="llm-service is not checked out next to this service")
+def test_schema_matches_the_agent_schema():
+    shipped = parse_schema(load_schema_ddl(get_settings().LOCAL_ENGINE_SCHEMA_FILE))
+    assert shipped == parse_schema(load_schema_ddl(str(LLM_SERVICE_CONSTANTS)))
+
+
+def test_engine_answers_bigquery_sql():
+    engine = LocalEngine(project_id="proj", dataset_id="ds", scale=20)
+    job = engine.submit("SELECT COUNT(*) AS n FROM `proj.ds.FACCAB`")
+    assert list(job.result()) == [(20,)]
@@ -0,0 +1,56 @@
+import asyncio
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from services.local_replica import LocalReplica
+
+
+@pytest.fixture
+def replica(tmp_path):
+    (tmp_path / "PLANTAS").mkdir()
+    pq.write_table(
+        pa.table({
+            "PLAID": [1, 2],
+            "PLANOM": ["PLANTAS norte", "Sur"],
+            "PLACAP": pa.array([Decimal("10.50"), Decimal("3.25")], pa.decimal128(10, 2)),
+        }),
+        tmp_path / "PLANTAS" / "part-0.parquet",
+    )
+    replica = LocalReplica(project_id="proj", dataset_id="ds", tables=["PLANTAS"], snapshot_uri=str(tmp_path))
+    replica._refresh()
+    return replica
+
+
+def _rows(replica, query, limit=None):
+    result = asyncio.run(replica.execute_query(query, limit))
+    return None if result is None else result["rows"]
+
+
+def test_string_literals_naming_a_table_are_left_alone(replica):
+    assert _rows(replica, "SELECT PLAID FROM ds.PLANTAS WHERE PLANOM = 'PLANTAS norte'") == [{"PLAID": 1}]
+
+
+@pytest.mark.parametrize("table", ["PLANTAS", "ds.PLANTAS", "`ds.PLANTAS`", "`proj.ds.PLANTAS`", "`proj`.`ds`.`PLANTAS`"])
+def test_every_way_of_naming_a_table_reads_the_replica(replica, table):
+    assert _rows(replica, f"SELECT PLAID FROM {table} ORDER BY PLAID") == [{"PLAID": 1}, {"PLAID": 2}]
+
+
+def test_bigquery_functions_are_translated(replica):
+    rows = _rows(replica, "SELECT SAFE_DIVIDE(PLAID, 0) AS ratio, PLACAP FROM ds.PLANTAS WHERE PLAID = 2")
+    assert rows == [{"ratio": None, "PLACAP": Decimal("3.25")}]
+
+
+def test_limit_is_added_when_the_query_has_none(replica):
+    assert len(_rows(replica, "SELECT PLAID FROM ds.PLANTAS", limit=1)) == 1
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT PLAID FROM other.PLANTAS",
+    "SELECT PLAID FROM ds.PLANTAS WHERE (",
+])
+def test_queries_the_replica_cannot_run_fall_back(replica, query):
+    assert _rows(replica, query) is None
+    assert replica.stats()["fallbacks"] == 1
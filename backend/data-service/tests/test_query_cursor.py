@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+from utils import query_cursor
+from utils.query_cursor import CursorError, _b64decode, _b64encode, decode_cursor, encode_cursor
+
+STATE = {"destination": "proj._anon.result", "page_token": "token-1", "page_size": 500, "job_id": "job_1"}
+
+
+def _payload_and_signature(cursor):
+    payload, signature = cursor.split(".")
+    return json.loads(_b64decode(payload)), signature
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(STATE)) == STATE
+
+
+def test_changed_payload_is_rejected():
+    body, signature = _payload_and_signature(encode_cursor(STATE))
+    body["destination"] = "other_project.private.table"
+    forged = f"{_b64encode(json.dumps(body).encode('utf-8'))}.{signature}"
+    with pytest.raises(CursorError, match="Invalid cursor"):
+        decode_cursor(forged)
+
+
+def test_later_expiry_is_rejected():
+    body, signature = _payload_and_signature(encode_cursor(STATE, ttl_seconds=1))
+    body["expires_at"] += 3600
+    forged = f"{_b64encode(json.dumps(body).encode('utf-8'))}.{signature}"
+    with pytest.raises(CursorError, match="Invalid cursor"):
+        decode_cursor(forged)
+
+
+def test_changed_signature_is_rejected():
+    payload, signature = encode_cursor(STATE).split(".")
+    flipped = ("A" if signature[0] != "A" else "B") + signature[1:]
+    with pytest.raises(CursorError, match="Invalid cursor"):
+        decode_cursor(f"{payload}.{flipped}")
+
+
+def test_cursor_of_another_secret_is_rejected(monkeypatch):
+    monkeypatch.setattr(query_cursor, "_SECRET", b"another instance")
+    cursor = encode_cursor(STATE)
+    monkeypatch.undo()
+    with pytest.raises(CursorError, match="Invalid cursor"):
+        decode_cursor(cursor)
+
+
+def test_expired_cursor_is_rejected():
+    with pytest.raises(CursorError, match="expired"):
+        decode_cursor(encode_cursor(STATE, ttl_seconds=-1))
+
+
+@pytest.mark.parametrize("cursor", ["", "no-separator", "é.abc", "abc.é", "abc.ü" * 3])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(CursorError):
+        decode_cursor(cursor)
@@ -0,0 +1,28 @@
+from services.query_stats import QueryStats
+
+
+def _result(job_id, bytes_billed=100, slot_ms=10):
+    return {"job_id": job_id, "bytes_billed": bytes_billed, "slot_ms": slot_ms}
+
+
+def test_shared_job_is_billed_once_when_calls_interleave():
+    stats = QueryStats(max_fingerprints=10, latency_samples=10)
+    # Two jobs of the same shape, each shared by two coalesced callers
+    for job_id in ("job1", "job2", "job1", "job2"):
+        stats.record("SELECT * FROM ds.FACCAB WHERE A = 1", 0.5, _result(job_id))
+
+    [entry] = stats.top()
+    assert entry["calls"] == 4
+    assert entry["bytes_billed"] == 200
+    assert entry["slot_ms"] == 20
+
+
+def test_results_without_job_are_always_counted():
+    stats = QueryStats(max_fingerprints=10, latency_samples=10)
+    stats.record("SELECT * FROM ds.FACCAB", 0.1, _result(None))
+    stats.record("SELECT * FROM ds.FACCAB", 0.1, _result(None))
+    stats.record("SELECT * FROM ds.FACCAB", 0.1, None)
+
+    [entry] = stats.top()
+    assert entry["bytes_billed"] == 200
+    assert entry["errors"] == 1
@@ -0,0 +1,28 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+from fastapi.responses import JSONResponse
+from pydantic_core import to_jsonable_python
+
+from utils.result_formats import encode_json
+
+
+@pytest.mark.parametrize("row", [
+    [1, "ñandú", True, None, 1.5],
+    [Decimal("1.50"), date(2024, 1, 2), datetime(2024, 1, 2, 3, 4, 5)],
+    # Written by the json module fallback
+    [1e-05, 1e16, 2 ** 70],
+])
+def test_same_bytes_as_json_response(row):
+    document = {"rows": [row], "total_rows": 1}
+    assert encode_json(document) == JSONResponse(to_jsonable_python(document)).body
+
+
+@pytest.mark.parametrize("row, expected", [
+    ([float("nan"), float("inf"), 1.5], b"[null,null,1.5]"),
+    ([float("nan"), 1e-05], b"[null,1e-05]"),
+    ([{"a": float("-inf")}, 2 ** 70], b'[{"a":null},1180591620717411303424]'),
+])
+def test_non_finite_floats_are_null(row, expected):
+    assert encode_json(row) == expected
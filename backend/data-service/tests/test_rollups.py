@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+
+import pytest
+
+from services.rollups import SOURCE_TIME_LABEL, RollupManager
+
+TABLE_COLUMNS = {
+    "FACCAB": {
+        "FACFCH", "FACPLAID", "FACTPODOC", "FACNRO", "FACSERIE", "FACNEGID", "DSTID",
+        "FACMONID", "POLID", "FACTOT", "FACCLIID",
+    },
+    "FACLINPR": {"FACPLAID", "FACTPODOC", "FACNRO", "FACSERIE", "PRDID", "FACUNDFAC", "FACLINCNT", "FACLINPRE"},
+    "PLANTAS": {"PLAID", "PLANOM"},
+}
+
+
+@pytest.fixture
+def manager():
+    """Manager whose rollups all read as built, from the source-time label on each table"""
+    manager = RollupManager(project_id="proj", dataset_id="ds", rollup_dataset_id="rollups")
+    client = SimpleNamespace(get_table=lambda table_id: SimpleNamespace(labels={SOURCE_TIME_LABEL: "1700000000"}))
+    manager.load_state(client)
+    return manager
+
+
+def test_count_and_sum_read_the_rollup(manager):
+    rollup, sql = manager.rewrite(
+        "SELECT FACFCH, SUM(FACTOT) AS total, COUNT(*) AS n FROM ds.FACCAB GROUP BY FACFCH", TABLE_COLUMNS
+    )
+    assert rollup.name == "ROLLUP_FACCAB_DIA"
+    assert sql == (
+        "SELECT FACFCH, SUM(FACCAB.SUM_FACTOT) AS total, COALESCE(SUM(FACCAB.ROW_COUNT), 0) AS n "
+        "FROM `proj`.`rollups`.`ROLLUP_FACCAB_DIA` AS FACCAB GROUP BY FACFCH"
+    )
+
+
+def test_avg_is_rebuilt_from_sum_and_count(manager):
+    _, sql = manager.rewrite("SELECT AVG(FACTOT) FROM `proj.ds.FACCAB` WHERE FACFCH >= '2024-01-01'", TABLE_COLUMNS)
+    assert "SAFE_DIVIDE(SUM(FACCAB.SUM_FACTOT), SUM(FACCAB.CNT_FACTOT))" in sql
+    assert "WHERE FACFCH >= '2024-01-01'" in sql
+
+
+def test_dimension_joins_are_kept(manager):
+    _, sql = manager.rewrite(
+        "SELECT p.PLANOM, SUM(f.FACTOT) FROM ds.FACCAB f JOIN ds.PLANTAS p ON p.PLAID = f.FACPLAID GROUP BY p.PLANOM",
+        TABLE_COLUMNS,
+    )
+    assert sql == (
+        "SELECT p.PLANOM, SUM(f.SUM_FACTOT) FROM `proj`.`rollups`.`ROLLUP_FACCAB_DIA` AS f "
+        "JOIN ds.PLANTAS AS p ON p.PLAID = f.FACPLAID GROUP BY p.PLANOM"
+    )
+
+
+def test_header_and_line_join_reads_the_line_rollup(manager):
+    rollup, sql = manager.rewrite(
+        "SELECT l.PRDID, SUM(l.FACLINCNT) FROM ds.FACCAB c "
+        "JOIN ds.FACLINPR l USING (FACPLAID, FACTPODOC, FACNRO, FACSERIE) GROUP BY l.PRDID",
+        TABLE_COLUMNS,
+    )
+    assert rollup.name == "ROLLUP_FACLINPR_DIA"
+    assert "FACLINPR" not in sql.replace("ROLLUP_FACLINPR_DIA", "")
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM ds.FACCAB",
+    "SELECT FACFCH, FACTOT FROM ds.FACCAB",
+    # Columns and aggregates the rollup does not keep
+    "SELECT FACCLIID, SUM(FACTOT) FROM ds.FACCAB GROUP BY FACCLIID",
+    "SELECT MAX(FACTOT) FROM ds.FACCAB",
+    "SELECT FACFCH, SUM(FACTOT) OVER () FROM ds.FACCAB",
+    # Fact tables joined on something other than the document keys
+    "SELECT l.PRDID, SUM(l.FACLINCNT) FROM ds.FACCAB c JOIN ds.FACLINPR l USING (FACPLAID, FACNRO) GROUP BY l.PRDID",
+    "WITH f AS (SELECT * FROM ds.FACCAB) SELECT FACFCH, SUM(FACTOT) FROM f GROUP BY FACFCH",
+    "SELECT FACFCH, SUM(FACTOT) FROM (SELECT * FROM ds.FACCAB) GROUP BY FACFCH",
+    "SELECT FACFCH, SUM(FACTOT) FROM other.FACCAB GROUP BY FACFCH",
+    "SELECT FACFCH, SUM(FACTOT) FROM other_proj.ds.FACCAB GROUP BY FACFCH",
+])
+def test_queries_the_rollup_cannot_answer_are_left_alone(manager, query):
+    assert manager.rewrite(query, TABLE_COLUMNS) is None
+
+
+def test_rollups_not_built_yet_are_not_used():
+    manager = RollupManager(project_id="proj", dataset_id="ds", rollup_dataset_id="rollups")
+    assert manager.rewrite("SELECT COUNT(*) FROM ds.FACCAB", TABLE_COLUMNS) is None
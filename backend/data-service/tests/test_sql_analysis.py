@@ -0,0 +1,102 @@
+import pytest
+from pydantic import ValidationError
+
+from models.query.model import DANGEROUS_STATEMENTS, SQLQueryRequest
+from utils.sql_analysis import SQLAnalyzer, UNKNOWN_STATEMENT, sql_analyzer
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM ds.FACCAB",
+    "select * from ds.FACCAB;",
+    # Keywords inside identifiers, string literals and comments are not statements
+    "SELECT LAST_UPDATE, CREATED_BY FROM ds.FACCAB",
+    "SELECT * FROM ds.FACCAB WHERE NOTE = 'DROP TABLE ds.FACCAB'",
+    "SELECT * FROM ds.FACCAB -- DELETE everything",
+    "WITH recent AS (SELECT * FROM ds.FACCAB) SELECT * FROM recent",
+    "(SELECT A FROM ds.FACCAB) UNION ALL (SELECT A FROM ds.DOCCRG)",
+    "```sql\nSELECT * FROM ds.FACCAB\n```",
+])
+def test_select_queries_are_accepted(query):
+    assert SQLQueryRequest(query=query).query == query
+
+
+@pytest.mark.parametrize("query", [
+    "DROP TABLE ds.FACCAB",
+    "delete from ds.FACCAB where 1 = 1",
+    "TRUNCATE TABLE ds.FACCAB",
+    "UPDATE ds.FACCAB SET A = 1 WHERE TRUE",
+    "ALTER TABLE ds.FACCAB ADD COLUMN B INT64",
+    "CREATE TABLE ds.COPY AS SELECT * FROM ds.FACCAB",
+    "INSERT INTO ds.FACCAB SELECT * FROM ds.DOCCRG",
+    "MERGE ds.FACCAB USING ds.DOCCRG ON TRUE WHEN MATCHED THEN DELETE",
+    # A write after a leading WITH, or as a second statement
+    "WITH x AS (SELECT 1) DELETE FROM ds.FACCAB WHERE TRUE",
+    "SELECT * FROM ds.FACCAB; DROP TABLE ds.FACCAB",
+    "```sql\nDROP TABLE ds.FACCAB\n```",
+])
+def test_writes_are_rejected(query):
+    with pytest.raises(ValidationError, match="Dangerous SQL keyword"):
+        SQLQueryRequest(query=query)
+
+
+@pytest.mark.parametrize("query, message", [
+    ("   ", "Could not read the SQL query"),
+    ("SELECT 1", "must contain a FROM"),
+    ("EXPORT DATA OPTIONS (uri = 'gs://b/*.csv') AS SELECT * FROM ds.FACCAB", "must contain a SELECT"),
+    ("CALL ds.PROC()", "must contain a SELECT"),
+])
+def test_other_queries_are_rejected(query, message):
+    with pytest.raises(ValidationError, match=message):
+        SQLQueryRequest(query=query)
+
+
+def test_every_dangerous_statement_is_detected():
+    for statement in DANGEROUS_STATEMENTS:
+        analysis = SQLAnalyzer(maxsize=8).analyze(f"{statement} ds.FACCAB")
+        assert analysis.statement_types[0] == statement
+
+
+def test_statement_type_of_several_statements_is_unknown():
+    analysis = sql_analyzer.analyze("SELECT * FROM ds.A; SELECT * FROM ds.B")
+    assert analysis.statement_types == ("SELECT", "SELECT")
+    assert analysis.statement_type == UNKNOWN_STATEMENT
+
+
+def test_tables_exclude_cte_names():
+    analysis = sql_analyzer.analyze(
+        "WITH recent AS (SELECT * FROM ds.FACCAB) SELECT * FROM recent JOIN `proj.ds.DOCCRG` USING (ID)"
+    )
+    assert set(analysis.tables) == {"FACCAB", "DOCCRG"}
+    assert set(analysis.qualified_tables) == {"ds.FACCAB", "proj.ds.DOCCRG"}
+
+
+def test_limit_is_only_read_at_the_top_level():
+    assert sql_analyzer.analyze("SELECT * FROM ds.FACCAB LIMIT 5").has_limit
+    assert not sql_analyzer.analyze("SELECT * FROM (SELECT * FROM ds.FACCAB LIMIT 5)").has_limit
+    assert not sql_analyzer.analyze("SELECT LIMIT_DATE FROM ds.FACCAB").has_limit
+
+
+def test_markdown_block_is_extracted():
+    analysis = sql_analyzer.analyze("Here it is:\n```sql\nSELECT * FROM ds.FACCAB LIMIT 5\n```")
+    assert analysis.sql == "SELECT * FROM ds.FACCAB LIMIT 5"
+    assert analysis.has_limit
+
+
+def test_fingerprint_ignores_literals_case_and_whitespace():
+    first = sql_analyzer.analyze("SELECT * FROM ds.FACCAB WHERE A = 1 AND B = 'x'")
+    second = sql_analyzer.analyze("select *\n  from ds.FACCAB where a = 42 and b = 'other'")
+    other = sql_analyzer.analyze("SELECT * FROM ds.FACCAB WHERE C = 1")
+    assert first.fingerprint == second.fingerprint
+    assert first.fingerprint != other.fingerprint
+
+
+def test_normalized_keeps_literals():
+    analysis = sql_analyzer.analyze("SELECT  *\nFROM ds.FACCAB   WHERE B = 'two  spaces';")
+    assert analysis.normalized == "SELECT * FROM ds.FACCAB WHERE B = 'two  spaces'"
+
+
+def test_analyses_are_memoized():
+    analyzer = SQLAnalyzer(maxsize=8)
+    first = analyzer.analyze("SELECT * FROM ds.FACCAB")
+    assert analyzer.analyze("SELECT * FROM ds.FACCAB") is first
+    assert analyzer.stats()["hits"] == 1
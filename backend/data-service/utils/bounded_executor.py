@@ -0,0 +1,106 @@
+"""
+Size-limited thread pool for running blocking client calls off the event loop.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from threading import Lock
+from typing import Any, Callable, Dict, TypeVar
+import asyncio
+import contextvars
+import time
+
+
+T = TypeVar("T")
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when the executor queue is full and a call is rejected."""
+
+
+class BoundedExecutor:
+    """
+    Runs blocking callables on a fixed number of worker threads.
+
+    At most ``max_workers`` calls run at once and at most ``max_queue_depth``
+    wait for a free worker; further calls fail fast with ExecutorSaturatedError
+    instead of piling up behind a slow backend.
+    """
+
+    def __init__(self, max_workers: int, max_queue_depth: int, thread_name_prefix: str = "executor"):
+        self.max_workers = max_workers
+        self.max_queue_depth = max_queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+        self._lock = Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run ``func(*args, **kwargs)`` on a worker thread and await its result.
+        The call sees the context variables of the caller.
+        """
+        with self._lock:
+            if self._queued >= self.max_queue_depth:
+                self._rejected += 1
+                raise ExecutorSaturatedError(
+                    f"Executor queue is full ({self._queued} calls waiting for {self.max_workers} workers)"
+                )
+            self._queued += 1
+
+        submitted_at = time.perf_counter()
+        call = partial(contextvars.copy_context().run, self._run_and_record, submitted_at, func, *args, **kwargs)
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        # A call cancelled before a worker picked it up never runs, so release its queue slot here
+        future.add_done_callback(self._release_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def _release_if_cancelled(self, future: "Future[Any]") -> None:
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+
+    def _run_and_record(self, submitted_at: float, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        wait = time.perf_counter() - submitted_at
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._total_wait += wait
+            self._max_wait = max(self._max_wait, wait)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._completed += 1
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and cumulative wait-time figures"""
+        with self._lock:
+            started = self._completed + self._running
+            return {
+                "max_workers": self.max_workers,
+                "max_queue_depth": self.max_queue_depth,
+                "running": self._running,
+                "queue_depth": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 3) if started else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
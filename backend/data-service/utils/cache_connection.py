@@ -1,6 +1,10 @@
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from threading import Lock
+import hashlib
 import logging
-from typing import List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 
 
 import vertexai
@@ -9,11 +13,14 @@ from google.cloud import firestore
 from google.cloud.aiplatform.matching_engine import MatchingEngineIndex
 from google.cloud.aiplatform.matching_engine import MatchingEngineIndexEndpoint
 from vertexai.language_models import TextEmbeddingModel
+from google.cloud.firestore_v1.base_query import FieldFilter
 from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
 from google.cloud.firestore_v1.vector import Vector
 from config.settings import get_settings
+from utils.lru_cache import LRUCache
+from utils.metrics import metrics
+from utils.vector_index import VectorIndex
 from langchain_google_vertexai import VertexAIEmbeddings
-from langchain_google_firestore import FirestoreVectorStore
 
 
 settings = get_settings()  
@@ -35,6 +42,13 @@ DEPLOYED_INDEX_ID = settings.DEPLOYED_INDEX_ID
 FIRESTORE_DATABASE_NAME = settings.FIRESTORE_DATABASE_NAME
 FIRESTORE_COLLECTION_NAME = settings.FIRESTORE_COLLECTION_NAME
 TTL_DAYS = 1
+FIRESTORE_COLLECTION = "query_cache"
+
+semantic_cache_lookups = metrics.counter(
+    "data_service_semantic_cache_lookups_total",
+    "Semantic cache lookups (retrieve_query) by result: hit, miss or error",
+    labelnames=("result",)
+)
 
 
 
@@ -44,39 +58,202 @@ embedding = VertexAIEmbeddings(
     project=PROJECT_ID
 )
 
-# Create/connect your Firestore vector store
-vector_store = FirestoreVectorStore(
-    collection="query_cache",
-    embedding_service=embedding
+
+def _normalize_query_text(text: str) -> str:
+    """Whitespace collapsed and case folded, so retyped questions share an embedding"""
+    return " ".join(text.split()).casefold()
+
+
+class EmbeddingMemo:
+    """
+    Recent query embeddings by normalized text, so a question embedded for a
+    cache lookup is not embedded again when its SQL is saved. The handle
+    ``embed`` returns is the hash of the normalized text, so it names the
+    vector of that text only.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self._vectors: LRUCache[List[float]] = LRUCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+        self._computed = 0
+
+    @staticmethod
+    def handle(text: str) -> str:
+        return hashlib.sha256(_normalize_query_text(text).encode("utf-8")).hexdigest()[:32]
+
+    def embed(self, text: str) -> Tuple[str, List[float]]:
+        """Handle and vector of ``text``, calling the embedding model only when it is not memoized"""
+        handle = self.handle(text)
+        vector = self._vectors.get(handle)
+        if vector is None:
+            vector = embedding.embed_query(text)
+            self._vectors.set(handle, vector)
+            self._computed += 1
+        return handle, vector
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._vectors),
+            "hits": self._vectors.hits,
+            "misses": self._vectors.misses,
+            "computed": self._computed,
+        }
+
+
+embedding_memo = EmbeddingMemo(settings.EMBEDDING_MEMO_SIZE, settings.EMBEDDING_MEMO_TTL_SECONDS)
+
+
+@lru_cache()
+def get_firestore_client() -> firestore.Client:
+    """Firestore client shared by cache lookups and index syncs"""
+    return firestore.Client(project="ancap-equipo2")
+
+
+def _expiration_timestamp(value: Any) -> Optional[float]:
+    """Epoch seconds of a Firestore expiration; naive datetimes are UTC, as save_query writes them"""
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+class SemanticCacheIndex:
+    """
+    In-process copy of the query_cache vectors, so lookups are a local
+    search instead of a Firestore ``find_nearest`` round trip.
+
+    ``sync`` reads entries whose expiration is at or after the newest one
+    already loaded (expiration is set on save, so this is every entry saved
+    since), and reloads the whole collection every ``full_sync_seconds`` to
+    drop entries deleted in Firestore. Entries saved by this instance are
+    added right away.
+    """
+
+    def __init__(self, index: VectorIndex, full_sync_seconds: int):
+        self.index = index
+        self.full_sync_seconds = full_sync_seconds
+        self._sync_lock = Lock()
+        self._newest_expiration: Optional[datetime] = None
+        self._last_full_sync = 0.0
+        self._last_sync: Optional[datetime] = None
+        self._last_sync_error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        """Whether a full sync has loaded the collection"""
+        return self._last_full_sync > 0
+
+    def sync(self) -> int:
+        """Load new entries from Firestore (blocking); returns how many were read"""
+        with self._sync_lock:
+            try:
+                full = (
+                    not self.ready
+                    or self._newest_expiration is None
+                    or time.time() - self._last_full_sync >= self.full_sync_seconds
+                )
+                collection = get_firestore_client().collection(FIRESTORE_COLLECTION)
+                query = collection.select(["embedding", "metadata", "expiration"])
+                if not full:
+                    query = query.where(filter=FieldFilter("expiration", ">=", self._newest_expiration)).order_by("expiration")
+
+                entries = []
+                for doc in query.stream():
+                    data = doc.to_dict()
+                    if data.get("embedding") is None:
+                        continue
+                    expiration = data.get("expiration")
+                    if expiration is not None and (self._newest_expiration is None or expiration > self._newest_expiration):
+                        self._newest_expiration = expiration
+                    entries.append((
+                        doc.id,
+                        list(data["embedding"]),
+                        (data.get("metadata") or {}).get("sql"),
+                        _expiration_timestamp(expiration)
+                    ))
+
+                if full:
+                    self.index.replace(entries)
+                    self._last_full_sync = time.time()
+                else:
+                    for entry in entries:
+                        self.index.upsert(*entry)
+                    self.index.prune()
+                self._last_sync = datetime.now()
+                self._last_sync_error = None
+                return len(entries)
+
+            except Exception as e:
+                self._last_sync_error = str(e)
+                raise
+
+    def add(self, doc_id: str, vector: List[float], sql: str, expiration: datetime) -> None:
+        self.index.upsert(doc_id, vector, sql, _expiration_timestamp(expiration))
+
+    def search(self, vector: List[float], num_results: int, threshold: float) -> List[Dict[str, Any]]:
+        """Entries within ``threshold`` cosine distance, closest first"""
+        return [
+            {"id": doc_id, "distance": distance, "sql": sql}
+            for doc_id, distance, sql in self.index.search(vector, num_results, max_distance=threshold)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.index.stats(),
+            "ready": self.ready,
+            "last_sync": self._last_sync.isoformat() if self._last_sync else None,
+            "last_sync_error": self._last_sync_error,
+        }
+
+
+semantic_cache_index = SemanticCacheIndex(
+    VectorIndex(
+        EMBEDDING_DIMENSIONS,
+        ivf_min_size=settings.SEMANTIC_INDEX_IVF_MIN_SIZE,
+        probes=settings.SEMANTIC_INDEX_IVF_PROBES
+    ),
+    full_sync_seconds=settings.SEMANTIC_INDEX_FULL_SYNC_SECONDS
 )
 
 
-def save_query(query_text: str, sql_query: str) -> str:
+def save_query(query_text: str, sql_query: str, embedding_handle: Optional[str] = None) -> str:
     """
-    Saves a new query and its corresponding SQL to Firestore metadata,
-    and directly adds its embedding to the deployed streaming Vector Search Index.
-    Includes a TTL expiration timestamp.
+    Saves a new query, its embedding and its corresponding SQL to Firestore,
+    with a TTL expiration timestamp. The embedding comes from the memo, so
+    a question looked up first is not embedded twice.
 
     Args:
         query_text: The natural language query.
         sql_query: The SQL query corresponding to the natural language query.
+        embedding_handle: Handle returned by the search of this same query; a
+            handle of another text is rejected, so no entry is saved under
+            another question's vector.
 
     Returns:
-        The unique datapoint ID generated for this entry.
-    """
-    expiration_time = datetime.utcnow() + timedelta(days=TTL_DAYS)
+        The unique document ID generated for this entry.
 
+    Raises:
+        ValueError: ``embedding_handle`` does not belong to ``query_text``.
+    """
+    if embedding_handle and embedding_handle != EmbeddingMemo.handle(query_text):
+        raise ValueError("embedding_handle does not belong to query_text")
+    _, vector = embedding_memo.embed(query_text)
 
-    ids = vector_store.add_texts(
-        texts=[query_text],
-        metadatas=[{"sql": sql_query}]
-    )
-    doc_id = ids[0]
+    expiration_time = datetime.utcnow() + timedelta(days=TTL_DAYS)
 
+    # Same fields FirestoreVectorStore writes, plus the expiration in the same write
+    doc_ref = get_firestore_client().collection(FIRESTORE_COLLECTION).document()
+    doc_ref.set({
+        "content": query_text,
+        "embedding": Vector(vector),
+        "metadata": {"sql": sql_query},
+        "expiration": expiration_time
+    })
+    doc_id = doc_ref.id
 
-    db = firestore.Client()
-    doc_ref = db.collection("query_cache").document(doc_id)
-    doc_ref.update({"expiration": expiration_time})
+    if settings.SEMANTIC_INDEX_ENABLED:
+        # Searchable here right away; other instances pick it up on their next sync
+        semantic_cache_index.add(doc_id, vector, sql_query, expiration_time)
 
     return doc_id
 
@@ -84,7 +261,9 @@ def save_query(query_text: str, sql_query: str) -> str:
 def retrieve_query(query_text: str, num_results: int = 1, threshold: float = 0.4) -> Optional[List[str]]:
     """
     Retrieves SQL queries from Firestore whose natural language embeddings are similar
-    to the input query, within a distance threshold.
+    to the input query, within a distance threshold. Once the local semantic
+    index has loaded the collection it is searched instead of Firestore. The
+    query's embedding is memoized for a later save_query.
 
     Args:
         query_text: The natural language query to search for.
@@ -95,11 +274,18 @@ def retrieve_query(query_text: str, num_results: int = 1, threshold: float = 0.4
         A list of SQL strings (max one by default) or None if no good match found.
     """
     try:
-        query_vector = embedding.embed_query(query_text)  
+        _, query_vector = embedding_memo.embed(query_text)
 
+        if settings.SEMANTIC_INDEX_ENABLED and semantic_cache_index.ready:
+            matches = semantic_cache_index.search(query_vector, num_results, threshold)
+            if not matches:
+                logging.info("No cached query within the threshold in the local semantic index.")
+                semantic_cache_lookups.inc(result="miss")
+                return None
+            semantic_cache_lookups.inc(result="hit")
+            return matches[0]["sql"]
 
-        db = firestore.Client(project="ancap-equipo2")
-        collection = db.collection("query_cache")
+        db = get_firestore_client()
 
         docs = list(db.collection("query_cache").find_nearest(
             vector_field="embedding",
@@ -114,8 +300,10 @@ def retrieve_query(query_text: str, num_results: int = 1, threshold: float = 0.4
         if not docs:
             print("No documents found in Firestore for the given query.")
             logging.info("No documents found in Firestore for the given query.")
+            semantic_cache_lookups.inc(result="miss")
             return None
         else:
+            semantic_cache_lookups.inc(result="hit")
 
             data = docs[0].to_dict()
             metadata = data.get("metadata")
@@ -124,4 +312,5 @@ def retrieve_query(query_text: str, num_results: int = 1, threshold: float = 0.4
     except Exception as e:
         print(f"Error in retrieve_query: {e}")
         logging.exception("retrieve_query failed")
+        semantic_cache_lookups.inc(result="error")
         return None
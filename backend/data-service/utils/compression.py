@@ -0,0 +1,236 @@
+"""
+Response compression negotiated through Accept-Encoding (zstd and gzip).
+
+Whole bodies at or above the size threshold are compressed in one go, on a
+worker thread when they are large. Streamed bodies (NDJSON) are compressed
+chunk by chunk and flushed after every chunk, so clients still get rows as
+soon as they are sent.
+
+backend/llm-service/utils/compression.py is a copy without the statistics,
+since each service is built on its own: keep the negotiation and the
+middleware of the two in sync. tests/test_compression.py of both services
+checks the negotiation.
+"""
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional
+import time
+import zlib
+
+import zstandard
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+# Encodings in order of preference when the client accepts several equally
+ENCODINGS = ("zstd", "gzip")
+
+# Bodies this large are compressed off the event loop (zlib and zstd release the GIL)
+_THREAD_MIN_SIZE = 256 * 1024
+
+_COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/msgpack",
+    "application/x-msgpack",
+    "application/vnd.apache.arrow.stream",
+    "application/javascript",
+    "application/xml",
+}
+
+Message = Dict[str, Any]
+Send = Callable[[Message], Awaitable[None]]
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the content coding for an Accept-Encoding header, honouring q-values.
+    Returns None when the body should be sent as is.
+    """
+    if not accept_encoding:
+        return None
+
+    qualities: Dict[str, float] = {}
+    for coding in accept_encoding.split(","):
+        name, *params = [part.strip() for part in coding.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        qualities[name.lower()] = quality
+
+    candidates = [
+        (-qualities.get(encoding, qualities.get("*", 0.0)), position, encoding)
+        for position, encoding in enumerate(ENCODINGS)
+    ]
+    candidates = [candidate for candidate in candidates if candidate[0] < 0]
+    return min(candidates)[2] if candidates else None
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Whether a media type is worth compressing (text, JSON, NDJSON, MessagePack, Arrow)"""
+    if not content_type:
+        return False
+    media_type = content_type.split(";")[0].strip().lower()
+    return media_type.startswith("text/") or media_type.endswith("+json") or media_type in _COMPRESSIBLE_TYPES
+
+
+class _Compressor:
+    """Streaming compressor of one response body"""
+
+    def __init__(self, encoding: str, gzip_level: int, zstd_level: int):
+        self.encoding = encoding
+        if encoding == "gzip":
+            # wbits 31: deflate with a gzip header and trailer
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+            self._sync_flush = zlib.Z_SYNC_FLUSH
+            self._finish = zlib.Z_FINISH
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._sync_flush = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+            self._finish = zstandard.COMPRESSOBJ_FLUSH_FINISH
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.seconds = 0.0
+
+    def compress(self, chunk: bytes, last: bool) -> bytes:
+        """Compress a chunk and flush it, closing the stream after the last one"""
+        start = time.perf_counter()
+        output = self._compressor.compress(chunk) + self._compressor.flush(self._finish if last else self._sync_flush)
+        self.seconds += time.perf_counter() - start
+        self.bytes_in += len(chunk)
+        self.bytes_out += len(output)
+        return output
+
+
+class CompressionStats:
+    """Bytes saved and time spent compressing, per encoding"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._encodings: Dict[str, Dict[str, float]] = {}
+        self._skipped_small = 0
+
+    def record(self, compressor: _Compressor) -> None:
+        with self._lock:
+            totals = self._encodings.setdefault(
+                compressor.encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0, "seconds": 0.0}
+            )
+            totals["responses"] += 1
+            totals["bytes_in"] += compressor.bytes_in
+            totals["bytes_out"] += compressor.bytes_out
+            totals["seconds"] += compressor.seconds
+
+    def record_skipped(self) -> None:
+        with self._lock:
+            self._skipped_small += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            encodings = {}
+            for encoding, totals in self._encodings.items():
+                encodings[encoding] = {
+                    "responses": totals["responses"],
+                    "bytes_in": totals["bytes_in"],
+                    "bytes_out": totals["bytes_out"],
+                    "ratio": round(totals["bytes_in"] / totals["bytes_out"], 2) if totals["bytes_out"] else None,
+                    "cpu_ms": round(totals["seconds"] * 1000, 1),
+                    "mb_per_s": round(totals["bytes_in"] / totals["seconds"] / 1e6, 1) if totals["seconds"] else None,
+                }
+            return {"encodings": encodings, "skipped_below_threshold": self._skipped_small}
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with the coding negotiated from
+    Accept-Encoding. Bodies smaller than ``minimum_size``, media types that do
+    not compress and responses that already carry a Content-Encoding are
+    sent unchanged.
+    """
+
+    def __init__(self, app: Any, minimum_size: int = 1024, gzip_level: int = 1, zstd_level: int = 1):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Holds the response start until the first body chunk decides whether to compress"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.compressor: Optional[_Compressor] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start_message, self.start_message = self.start_message, None
+            if self._should_compress(start_message, body, more_body):
+                self.compressor = _Compressor(self.encoding, self.middleware.gzip_level, self.middleware.zstd_level)
+                headers = MutableHeaders(raw=start_message["headers"])
+                headers["Content-Encoding"] = self.encoding
+                headers.add_vary_header("Accept-Encoding")
+                if more_body:
+                    del headers["Content-Length"]
+                else:
+                    body = await self._compress(body, last=True)
+                    headers["Content-Length"] = str(len(body))
+                    await self.downstream(start_message)
+                    await self.downstream({"type": "http.response.body", "body": body})
+                    compression_stats.record(self.compressor)
+                    return
+            await self.downstream(start_message)
+
+        if self.compressor is None:
+            await self.downstream(message)
+            return
+
+        # Streamed body: every chunk is flushed so the client can decode it right away
+        chunk = await self._compress(body, last=not more_body)
+        await self.downstream({"type": "http.response.body", "body": chunk, "more_body": more_body})
+        if not more_body:
+            compression_stats.record(self.compressor)
+
+    def _should_compress(self, start_message: Message, body: bytes, more_body: bool) -> bool:
+        headers = Headers(raw=start_message["headers"])
+        if "content-encoding" in headers or not is_compressible(headers.get("content-type")):
+            return False
+        if not more_body and len(body) < self.middleware.minimum_size:
+            compression_stats.record_skipped()
+            return False
+        return True
+
+    async def _compress(self, body: bytes, last: bool) -> bytes:
+        if len(body) >= _THREAD_MIN_SIZE:
+            return await run_in_threadpool(self.compressor.compress, body, last)
+        return self.compressor.compress(body, last)
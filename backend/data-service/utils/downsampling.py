@@ -0,0 +1,86 @@
+"""
+NumPy helpers that pick which rows of a query result a chart should draw.
+
+Every function returns row indices (or grouped values), so the callers keep
+the original row dictionaries and column order untouched.
+"""
+from typing import Any, List, Sequence, Tuple
+
+import numpy as np
+
+
+NUMERIC_TYPES = {"INTEGER", "INT64", "FLOAT", "FLOAT64", "NUMERIC", "BIGNUMERIC"}
+
+
+def to_float_array(values: Sequence[Any]) -> np.ndarray:
+    """Convert a column to float64; None and non-numeric values become NaN"""
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.array([value if isinstance(value, (int, float)) else np.nan for value in values], dtype=np.float64)
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets downsampling. Keeps the first and last point
+    and, from each of ``threshold - 2`` equal buckets in between, the point that
+    forms the largest triangle with the previously kept point and the mean of
+    the next bucket. NaN values in ``y`` are treated as 0.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    y = np.nan_to_num(y)
+    # Bucket boundaries over the points between the first and the last one
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+
+    # Mean of each bucket, used as the third vertex of the triangles of the previous bucket
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / counts
+    mean_x = np.append(mean_x[1:], x[n - 1])
+    mean_y = np.append(mean_y[1:], y[n - 1])
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        # Twice the triangle areas for every candidate of the bucket at once
+        areas = np.abs(
+            (x[previous] - mean_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (mean_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        selected[bucket + 1] = previous
+
+    return selected
+
+
+def sample_indices(n: int, size: int, seed: int = 0) -> np.ndarray:
+    """Sorted uniform sample of ``size`` row indices, reproducible for the same input"""
+    if size >= n:
+        return np.arange(n)
+    rng = np.random.default_rng(seed)
+    return np.sort(rng.choice(n, size=size, replace=False))
+
+
+def group_sums(labels: Sequence[Any], values: np.ndarray) -> Tuple[List[Any], np.ndarray]:
+    """
+    Sum ``values`` per distinct label. Returns the labels in first-seen order
+    and their totals; NaN values count as 0.
+    """
+    keys = [str(label) for label in labels]
+    unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    totals = np.bincount(inverse, weights=np.nan_to_num(values), minlength=len(unique_keys))
+
+    order = np.argsort(first_index)
+    return [labels[i] for i in first_index[order]], totals[order]
+
+
+def top_n_indices(totals: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the ``n`` largest totals, largest first (ties keep their original order)"""
+    order = np.argsort(-totals, kind="stable")
+    return order[:n]
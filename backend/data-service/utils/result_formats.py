@@ -0,0 +1,168 @@
+"""
+Wire formats for /query results and Accept header negotiation.
+"""
+from typing import Any, Dict, List, Optional
+import io
+import json
+import math
+import re
+
+import msgpack
+import orjson
+import pyarrow as pa
+from fastapi.encoders import jsonable_encoder
+from pydantic_core import to_jsonable_python
+
+from models.data.model import ResultFormat
+
+
+MEDIA_TYPES = {
+    ResultFormat.ROWS: "application/json",
+    ResultFormat.COLUMNAR: "application/vnd.ancap.columnar+json",
+    ResultFormat.ARROW: "application/vnd.apache.arrow.stream",
+    ResultFormat.MSGPACK: "application/msgpack",
+    ResultFormat.NDJSON: "application/x-ndjson",
+}
+
+_FORMATS_BY_MEDIA_TYPE = {
+    **{media_type: result_format for result_format, media_type in MEDIA_TYPES.items()},
+    "application/x-msgpack": ResultFormat.MSGPACK,
+    "application/*": ResultFormat.ROWS,
+    "*/*": ResultFormat.ROWS,
+}
+
+ARROW_METADATA_KEY = b"query_metadata"
+
+_ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+# orjson writes floats below 1e-4 or from 1e16 up as 0.00001 / 1e16, where
+# Python writes 1e-05 / 1e+16. Each hint (a literal prefix, which re scans for
+# quickly) is checked to be such a number outside a string: a number token
+# always sits between a delimiter and the next one
+_FLOAT_FORM_HINT = re.compile(rb"e[-\d]")
+_SMALL_FLOAT_HINT = re.compile(rb"0\.0000\d")
+_FLOAT_FORM_TOKEN = re.compile(rb"[:,\[]-?(?:\d+(?:\.\d+)?e-?\d+|0\.0000\d+)[,}\]]")
+_NUMBER_BYTES = frozenset(b"0123456789.-")
+
+
+def negotiate_result_format(accept: Optional[str]) -> ResultFormat:
+    """
+    Pick the result format for an Accept header, honouring q-values.
+    Falls back to the row-dict JSON layout when nothing supported is requested.
+    """
+    if not accept:
+        return ResultFormat.ROWS
+
+    candidates = []
+    for position, media_range in enumerate(accept.split(",")):
+        media_type, *params = [part.strip() for part in media_range.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0 and media_type.lower() in _FORMATS_BY_MEDIA_TYPE:
+            candidates.append((-quality, position, _FORMATS_BY_MEDIA_TYPE[media_type.lower()]))
+
+    if not candidates:
+        return ResultFormat.ROWS
+
+    return min(candidates)[2]
+
+
+def to_columnar(rows: List[Dict[str, Any]], columns: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """Pivot row dicts into one value list per column"""
+    names = [column['name'] for column in columns]
+    if not rows:
+        return {name: [] for name in names}
+
+    values = zip(*(row.values() for row in rows))
+    return dict(zip(names, (list(column_values) for column_values in values)))
+
+
+def from_columnar(data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """Rebuild row dicts from the columnar layout"""
+    names = list(data.keys())
+    return [dict(zip(names, row)) for row in zip(*data.values())]
+
+
+def _has_float_form(payload: bytes) -> bool:
+    """Whether orjson wrote a float in a form Python's json module writes differently"""
+    for hint_pattern in (_FLOAT_FORM_HINT, _SMALL_FLOAT_HINT):
+        for hint in hint_pattern.finditer(payload):
+            start = hint.start()
+            while start > 0 and payload[start - 1] in _NUMBER_BYTES:
+                start -= 1
+            if start > 0 and _FLOAT_FORM_TOKEN.match(payload, start - 1):
+                return True
+    return False
+
+
+def _finite(value: Any) -> Any:
+    """``value`` with NaN and infinities replaced by None, as orjson writes them"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def _encode_json_standard(document: Any) -> bytes:
+    return json.dumps(
+        _finite(to_jsonable_python(document)), ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_json(document: Any) -> bytes:
+    """
+    Encode a response document byte for byte as FastAPI's JSONResponse renders
+    the pydantic JSON-mode dump of it, with orjson. Values orjson has no native
+    form for (Decimal, datetime, bytes...) go through pydantic's serializer,
+    and NaN and infinities, which JSONResponse refuses, are written as null.
+    The rare documents orjson cannot encode identically (floats in exponent
+    form, integers beyond 64 bits) are encoded with the json module instead.
+    """
+    try:
+        payload = orjson.dumps(document, default=to_jsonable_python, option=_ORJSON_OPTIONS)
+    except orjson.JSONEncodeError:
+        return _encode_json_standard(document)
+
+    if _has_float_form(payload):
+        return _encode_json_standard(document)
+    return payload
+
+
+def encode_msgpack(document: Dict[str, Any]) -> bytes:
+    """Encode a response document as MessagePack"""
+    return msgpack.packb(document, default=jsonable_encoder, use_bin_type=True)
+
+
+def decode_msgpack(payload: bytes) -> Dict[str, Any]:
+    """Decode a MessagePack response document"""
+    return msgpack.unpackb(payload, raw=False)
+
+
+def encode_arrow(table: pa.Table, metadata: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Encode an Arrow table as an IPC stream. The QueryMetadata, if given,
+    travels as JSON in the schema metadata under ``query_metadata``.
+    """
+    if metadata is not None:
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            ARROW_METADATA_KEY: json.dumps(metadata, default=jsonable_encoder).encode("utf-8"),
+        })
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def decode_arrow(payload: bytes) -> pa.Table:
+    """Decode an Arrow IPC stream"""
+    return pa.ipc.open_stream(payload).read_all()
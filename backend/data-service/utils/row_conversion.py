@@ -0,0 +1,137 @@
+"""
+Row converters compiled once per BigQuery result schema.
+
+A result schema is turned into a plain, hashable spec of
+``(name, field_type, mode, subfields)`` tuples, and a converter is compiled
+for it once and reused, in process, for every page with that schema. Each
+column gets a converter chosen by its type and mode, and columns whose
+values are already JSON-ready (strings, numbers, dates...) get none at
+all, so converting a row is a ``dict(zip(...))`` plus the few columns that
+need work. The output is the same as
+``BigQueryService._serialize_value``: DATETIME and TIMESTAMP values become
+ISO strings, REPEATED fields lists and RECORD fields dictionaries.
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+FieldSpec = Tuple[str, str, str, tuple]
+SchemaSpec = Tuple[FieldSpec, ...]
+Converter = Optional[Callable[[Any], Any]]
+
+# Types whose values need converting; every other scalar type is returned as is
+_DATETIME_TYPES = {"DATETIME", "TIMESTAMP"}
+_RECORD_TYPES = {"RECORD", "STRUCT"}
+# Types whose values have no fixed shape and go through the generic serializer
+_GENERIC_TYPES = {"JSON", "RANGE"}
+
+
+def schema_spec(schema: Iterable[Any]) -> SchemaSpec:
+    """Hashable spec of a list of ``bigquery.SchemaField``, the key compiled converters are cached under"""
+    return tuple(
+        (field.name, (field.field_type or "").upper(), (field.mode or "NULLABLE").upper(), schema_spec(field.fields or ()))
+        for field in schema
+    )
+
+
+def serialize_value(value: Any) -> Any:
+    """Generic serializer for values of unknown shape (same rules as BigQueryService._serialize_value)"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return [serialize_value(item) for item in value]
+    if isinstance(value, dict):
+        return {k: serialize_value(v) for k, v in value.items()}
+    return value
+
+
+def _isoformat(value: Any) -> Any:
+    # DATETIME columns can also hold plain strings (e.g. from the local engines)
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _scalar_converter(field_type: str, subfields: SchemaSpec) -> Converter:
+    if field_type in _DATETIME_TYPES:
+        return _isoformat
+    if field_type in _RECORD_TYPES:
+        return _record_converter(subfields) if subfields else serialize_value
+    if field_type in _GENERIC_TYPES or not field_type:
+        return serialize_value
+    return None
+
+
+def _record_converter(subfields: SchemaSpec) -> Callable[[Any], Any]:
+    converters = [(spec[0], _field_converter(spec)) for spec in subfields]
+    active = [(name, converter) for name, converter in converters if converter is not None]
+
+    def convert(value: Any) -> Any:
+        if not isinstance(value, dict):
+            return serialize_value(value)
+        if not active:
+            return dict(value)
+        record = dict(value)
+        for name, converter in active:
+            item = record.get(name)
+            if item is not None:
+                record[name] = converter(item)
+        return record
+
+    return convert
+
+
+def _field_converter(spec: FieldSpec) -> Converter:
+    """Converter of one (non-None) value of a field, or None when values are returned as is"""
+    _, field_type, mode, subfields = spec
+    item_converter = _scalar_converter(field_type, subfields)
+    if mode != "REPEATED":
+        return item_converter
+    if item_converter is None:
+        return list
+    return lambda items: [None if item is None else item_converter(item) for item in items]
+
+
+@lru_cache(maxsize=256)
+def compile_row_converter(spec: SchemaSpec) -> Callable[[Sequence[Any]], Dict[str, Any]]:
+    """Function converting one result row (a value sequence in schema order) to a dictionary"""
+    names = [field[0] for field in spec]
+    active = [(name, converter) for name, converter in zip(names, map(_field_converter, spec)) if converter is not None]
+
+    if not active:
+        return lambda row: dict(zip(names, row))
+
+    def convert(row: Sequence[Any]) -> Dict[str, Any]:
+        record = dict(zip(names, row))
+        for name, converter in active:
+            value = record[name]
+            if value is not None:
+                record[name] = converter(value)
+        return record
+
+    return convert
+
+
+@lru_cache(maxsize=256)
+def compile_values_converter(spec: SchemaSpec) -> Callable[[Sequence[Any]], List[Any]]:
+    """Function converting one result row to a list of values in schema order"""
+    converters = list(enumerate(map(_field_converter, spec)))
+    active = [(index, converter) for index, converter in converters if converter is not None]
+
+    if not active:
+        return list
+
+    def convert(row: Sequence[Any]) -> List[Any]:
+        values = list(row)
+        for index, converter in active:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return values
+
+    return convert
+
+
+def convert_rows(spec: SchemaSpec, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Convert rows to dictionaries with the compiled converter of ``spec``"""
+    return list(map(compile_row_converter(spec), rows))
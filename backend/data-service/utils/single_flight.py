@@ -0,0 +1,69 @@
+"""
+Single-flight execution: concurrent calls with the same key share one run.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+import asyncio
+
+from utils.metrics import metrics, time_stage
+
+
+T = TypeVar("T")
+
+single_flight_calls = metrics.counter(
+    "data_service_single_flight_calls_total",
+    "Calls that started a run (started) or joined one in flight (coalesced), per single-flight group",
+    labelnames=("flight", "result")
+)
+
+
+class SingleFlight:
+    """
+    Runs at most one coroutine per key at a time. The first caller for a key
+    starts the work as a separate task; callers arriving while it is in flight
+    await the same task instead of starting their own.
+
+    Callers are shielded from each other: cancelling one caller (e.g. a client
+    disconnecting) only stops that caller from waiting, while the shared task
+    keeps running for the others and finishes even if every caller has left.
+
+    The task runs in the first caller's context, so only that caller's
+    request stage timings hold the stages of the run. A joined caller's
+    time waiting for it is timed as the ``coalesced_wait`` stage instead.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[Hashable, "asyncio.Task[Any]"] = {}
+        self._started = 0
+        self._coalesced = 0
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        """Await ``func()``, or the in-flight run of another caller with the same key"""
+        task = self._in_flight.get(key)
+        if task is None:
+            self._started += 1
+            single_flight_calls.inc(flight=self.name, result="started")
+            task = asyncio.ensure_future(func())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda finished: self._forget(key, finished))
+            return await asyncio.shield(task)
+
+        self._coalesced += 1
+        single_flight_calls.inc(flight=self.name, result="coalesced")
+        with time_stage("coalesced_wait"):
+            return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Nobody may be left to await a failed run; mark its exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Runs started, callers that joined an in-flight run, and runs in flight now"""
+        return {
+            "started": self._started,
+            "coalesced": self._coalesced,
+            "in_flight": len(self._in_flight),
+        }
@@ -0,0 +1,249 @@
+"""
+Single-pass SQL analysis shared by request validation, LIMIT injection,
+cache keys and table permissions.
+
+A query text is tokenized once with the BigQuery dialect and the same
+tokens are parsed. From that pass come the SQL itself (extracted from a
+markdown ``sql`` block if there is one), a normalized form, a fingerprint,
+the statement type, the referenced tables and whether a top-level LIMIT
+exists. Keywords are read from tokens, so identifiers like ``LAST_UPDATE``
+and string literals never count as statements. Analyses are memoized by
+the hash of the text.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import re
+
+from sqlglot import exp
+from sqlglot.dialects.dialect import Dialect
+from sqlglot.errors import SqlglotError
+from sqlglot.tokens import Token, TokenType
+
+from config.settings import get_settings
+from utils.lru_cache import LRUCache
+
+settings = get_settings()
+
+_DIALECT = Dialect.get_or_raise("bigquery")
+
+_MARKDOWN_SQL = re.compile(r"```sql\s*(.*?)\s*```", re.DOTALL)
+_QUOTED_OR_TEXT = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)""")
+
+_LITERAL_TOKENS = {
+    TokenType.STRING, TokenType.NUMBER, TokenType.BIT_STRING, TokenType.HEX_STRING,
+    TokenType.BYTE_STRING, TokenType.RAW_STRING, TokenType.NATIONAL_STRING,
+}
+# Keywords that open a statement; WITH and parentheses are looked through
+_STATEMENT_TOKENS = {
+    TokenType.SELECT: "SELECT",
+    TokenType.INSERT: "INSERT",
+    TokenType.UPDATE: "UPDATE",
+    TokenType.DELETE: "DELETE",
+    TokenType.MERGE: "MERGE",
+    TokenType.CREATE: "CREATE",
+    TokenType.DROP: "DROP",
+    TokenType.ALTER: "ALTER",
+    TokenType.TRUNCATE: "TRUNCATE",
+}
+
+UNKNOWN_STATEMENT = "UNKNOWN"
+
+
+@dataclass(frozen=True)
+class SQLAnalysis:
+    sql: str
+    normalized: str
+    fingerprint: str
+    statement_types: Tuple[str, ...]
+    tables: Tuple[str, ...]
+    has_limit: bool
+    error: Optional[str] = None
+    # Tables as written, with their project and dataset when given: ``project.dataset.NAME``
+    qualified_tables: Tuple[str, ...] = ()
+
+    @property
+    def statement_type(self) -> str:
+        """Type of the only statement; UNKNOWN for none or several"""
+        return self.statement_types[0] if len(self.statement_types) == 1 else UNKNOWN_STATEMENT
+
+
+def _normalize_text(sql: str) -> str:
+    """Collapse whitespace outside quoted literals and drop trailing semicolons (used when tokenizing fails)"""
+    parts = _QUOTED_OR_TEXT.split(sql.strip())
+    normalized = "".join(
+        part if index % 2 else re.sub(r"\s+", " ", part)
+        for index, part in enumerate(parts)
+    )
+    return normalized.strip().rstrip(";").strip()
+
+
+def _statements(tokens: List[Token]) -> List[List[Token]]:
+    statements: List[List[Token]] = [[]]
+    for token in tokens:
+        if token.token_type == TokenType.SEMICOLON:
+            statements.append([])
+        else:
+            statements[-1].append(token)
+    return [statement for statement in statements if statement]
+
+
+def _statement_type(tokens: List[Token]) -> str:
+    """
+    Type from the first keyword; after a leading WITH or parenthesis, from the
+    first statement keyword outside parentheses (or inside them, for
+    ``(SELECT ...) UNION ALL (SELECT ...)``)
+    """
+    first = tokens[0]
+    if first.token_type in _STATEMENT_TOKENS:
+        return _STATEMENT_TOKENS[first.token_type]
+    if first.token_type not in (TokenType.WITH, TokenType.L_PAREN):
+        return first.text.upper()
+
+    depth = 0
+    nested = None
+    for token in tokens:
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        elif token.token_type in _STATEMENT_TOKENS:
+            if depth == 0:
+                return _STATEMENT_TOKENS[token.token_type]
+            nested = nested or _STATEMENT_TOKENS[token.token_type]
+    return nested or UNKNOWN_STATEMENT
+
+
+def _has_top_level_limit(tokens: List[Token]) -> bool:
+    depth = 0
+    for token in tokens:
+        if token.token_type == TokenType.L_PAREN:
+            depth += 1
+        elif token.token_type == TokenType.R_PAREN:
+            depth -= 1
+        elif token.token_type == TokenType.LIMIT and depth == 0:
+            return True
+    return False
+
+
+def _normalized_text(sql: str, tokens: List[Token]) -> str:
+    """Text rebuilt from token spans, with one space wherever the original had whitespace or comments"""
+    parts = []
+    previous_end = None
+    for token in tokens:
+        if previous_end is not None and token.start > previous_end + 1:
+            parts.append(" ")
+        parts.append(sql[token.start:token.end + 1])
+        previous_end = token.end
+    return "".join(parts)
+
+
+def _fingerprint_text(sql: str, tokens: List[Token]) -> str:
+    """Upper-case tokens separated by single spaces, with every literal replaced by ``?``"""
+    return " ".join(
+        "?" if token.token_type in _LITERAL_TOKENS else sql[token.start:token.end + 1].upper()
+        for token in tokens
+    )
+
+
+def _tables(expressions: List[Optional[exp.Expression]]) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Upper-case names of the tables the statements read or write, without CTE
+    names, and the same tables qualified as written
+    """
+    tables = []
+    qualified = []
+    for expression in expressions:
+        if expression is None:
+            continue
+        cte_names = {cte.alias_or_name.upper() for cte in expression.find_all(exp.CTE)}
+        for table in expression.find_all(exp.Table):
+            name = table.name.upper()
+            if name and name not in cte_names:
+                tables.append(name)
+                qualified.append(".".join(part for part in (table.catalog, table.db, name) if part))
+    return tuple(dict.fromkeys(tables)), tuple(dict.fromkeys(qualified))
+
+
+def _fallback_tables(tokens: List[Token]) -> Tuple[str, ...]:
+    """Names right after FROM or JOIN, for SQL the parser cannot read"""
+    tables = []
+    for previous, token in zip(tokens, tokens[1:]):
+        if previous.token_type in (TokenType.FROM, TokenType.JOIN) and token.token_type in (TokenType.VAR, TokenType.IDENTIFIER):
+            tables.append(token.text.rsplit(".", 1)[-1].upper())
+    return tuple(dict.fromkeys(tables))
+
+
+def _fingerprint(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _trailing_semicolons(tokens: List[Token]) -> int:
+    count = 0
+    while count < len(tokens) and tokens[-1 - count].token_type == TokenType.SEMICOLON:
+        count += 1
+    return count
+
+
+def _analyze(text: str) -> SQLAnalysis:
+    match = _MARKDOWN_SQL.search(text)
+    sql = match.group(1).strip() if match else text.strip()
+
+    try:
+        tokens = _DIALECT.tokenize(sql)
+    except SqlglotError as e:
+        normalized = _normalize_text(sql)
+        return SQLAnalysis(
+            sql=sql,
+            normalized=normalized,
+            fingerprint=_fingerprint(normalized),
+            statement_types=(),
+            tables=(),
+            has_limit=False,
+            error=str(e)
+        )
+
+    statements = _statements(tokens)
+    statement_tokens = [token for statement in statements for token in statement]
+    error = None
+    qualified_tables: Tuple[str, ...] = ()
+    try:
+        tables, qualified_tables = _tables(_DIALECT.parser().parse(tokens, sql))
+    except SqlglotError as e:
+        error = str(e)
+        tables = _fallback_tables(statement_tokens)
+
+    return SQLAnalysis(
+        sql=sql,
+        normalized=_normalized_text(sql, tokens[:len(tokens) - _trailing_semicolons(tokens)]),
+        fingerprint=_fingerprint(_fingerprint_text(sql, statement_tokens)),
+        statement_types=tuple(_statement_type(statement) for statement in statements),
+        tables=tables,
+        has_limit=bool(statements) and _has_top_level_limit(statements[-1]),
+        error=error,
+        qualified_tables=qualified_tables
+    )
+
+
+class SQLAnalyzer:
+    """Memo of query analyses, keyed by the SHA-256 of the text"""
+
+    def __init__(self, maxsize: int):
+        self._analyses: LRUCache[SQLAnalysis] = LRUCache(maxsize=maxsize)
+
+    def analyze(self, text: str) -> SQLAnalysis:
+        """Analysis of a query text; the extracted SQL is stored too, so analyzing it next is a hit"""
+        key = hashlib.sha256(text.encode("utf-8")).digest()
+        analysis = self._analyses.get(key)
+        if analysis is None:
+            analysis = _analyze(text)
+            self._analyses.set(key, analysis)
+            if analysis.sql != text:
+                self._analyses.set(hashlib.sha256(analysis.sql.encode("utf-8")).digest(), analysis)
+        return analysis
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._analyses), "hits": self._analyses.hits, "misses": self._analyses.misses}
+
+
+sql_analyzer = SQLAnalyzer(settings.SQL_ANALYSIS_CACHE_SIZE)
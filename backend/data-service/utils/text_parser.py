@@ -1,4 +1,4 @@
-import re
+from utils.sql_analysis import sql_analyzer
 
 def extract_sql_from_text(text: str) -> str:
     """
@@ -6,12 +6,11 @@ def extract_sql_from_text(text: str) -> str:
     Returns the first SQL query found between ```sql and ``` markers.
     If no SQL block is found, returns the original text.
     """
-    # Look for SQL between markdown SQL blocks
-    sql_pattern = r"```sql\s*(.*?)\s*```"
-    matches = re.findall(sql_pattern, text, re.DOTALL)
-    
-    if matches:
-        # Return the first SQL query found
-        return matches[0].strip()
-    
-    return text.strip()
\ No newline at end of file
+    return sql_analyzer.analyze(text).sql
+
+def normalize_sql(sql: str) -> str:
+    """
+    Normalize a SQL query for use as a cache key: collapses whitespace and
+    comments outside of quoted literals and drops trailing semicolons.
+    """
+    return sql_analyzer.analyze(sql).normalized
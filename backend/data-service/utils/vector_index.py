@@ -0,0 +1,230 @@
+"""
+In-memory nearest-neighbour index of embedding vectors under cosine distance.
+
+Distances are ``1 - cosine similarity``, the measure of Firestore's
+``find_nearest`` with DistanceMeasure.COSINE, so ``max_distance`` keeps the
+same matches as its ``distance_threshold``.
+
+Up to ``ivf_min_size`` vectors every search is exact: one matrix-vector
+product over the unit vectors. From there an inverted-file layer is built:
+spherical k-means splits the vectors into about sqrt(N) lists and a search
+only scores the vectors of the ``probes`` lists whose centroids are closest
+to the query. That is approximate; benchmarks/semantic_index.py measures its
+recall against exact search.
+"""
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import math
+import time
+
+import numpy as np
+
+# k-means is fitted on at most this many vectors per list
+_KMEANS_SAMPLE_PER_LIST = 64
+_KMEANS_ITERATIONS = 10
+# Vectors assigned to their list at a time, to bound the size of the score matrix
+_ASSIGN_CHUNK_ROWS = 8192
+
+Match = Tuple[str, float, Any]
+
+
+def _unit(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+class VectorIndex:
+    """
+    Vectors with an id, a payload and an optional expiry (epoch seconds).
+    Expired vectors are never returned and are dropped by ``prune``.
+    """
+
+    def __init__(self, dimensions: int, ivf_min_size: int = 20_000, probes: int = 8, seed: int = 0):
+        self.dimensions = dimensions
+        self.ivf_min_size = ivf_min_size
+        self.probes = probes
+        self._rng = np.random.default_rng(seed)
+        self._lock = Lock()
+        self._vectors = np.empty((0, dimensions), dtype=np.float32)
+        self._expires = np.empty(0, dtype=np.float64)
+        self._lists = np.empty(0, dtype=np.int32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._payloads: List[Any] = []
+        self._rows: Dict[str, int] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._built_size = 0
+        self._searches = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def upsert(self, item_id: str, vector: Iterable[float], payload: Any = None, expires_at: Optional[float] = None) -> None:
+        """Add a vector, or replace the one stored under ``item_id``"""
+        unit = _unit(np.asarray(vector, dtype=np.float32).reshape(self.dimensions))
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                row = self._append_row(item_id)
+            self._vectors[row] = unit
+            self._payloads[row] = payload
+            self._expires[row] = math.inf if expires_at is None else expires_at
+            if self._centroids is not None:
+                self._lists[row] = int(np.argmax(self._centroids @ unit))
+            self._rebuild_if_needed()
+
+    def replace(self, items: Iterable[Tuple[str, Iterable[float], Any, Optional[float]]]) -> None:
+        """Swap the whole content for ``(id, vector, payload, expires_at)`` items"""
+        items = list(items)
+        vectors = np.empty((len(items), self.dimensions), dtype=np.float32)
+        for row, (_, vector, _, _) in enumerate(items):
+            vectors[row] = np.asarray(vector, dtype=np.float32).reshape(self.dimensions)
+
+        with self._lock:
+            self._vectors = _unit(vectors)
+            self._expires = np.array(
+                [math.inf if expires_at is None else expires_at for _, _, _, expires_at in items], dtype=np.float64
+            )
+            self._lists = np.zeros(len(items), dtype=np.int32)
+            self._ids = [item_id for item_id, _, _, _ in items]
+            self._payloads = [payload for _, _, payload, _ in items]
+            self._rows = {item_id: row for row, item_id in enumerate(self._ids)}
+            self._size = len(items)
+            self._centroids = None
+            self._built_size = 0
+            self._rebuild_if_needed()
+
+    def remove(self, item_id: str) -> bool:
+        with self._lock:
+            row = self._rows.get(item_id)
+            if row is None:
+                return False
+            self._remove_row(row)
+            return True
+
+    def prune(self, now: Optional[float] = None) -> int:
+        """Drop expired vectors; returns how many were removed"""
+        now = time.time() if now is None else now
+        with self._lock:
+            expired = np.flatnonzero(self._expires[:self._size] <= now)
+            # From the last row down, so swapped-in rows are never expired ones still to visit
+            for row in expired[::-1]:
+                self._remove_row(int(row))
+            return len(expired)
+
+    def search(
+        self,
+        vector: Iterable[float],
+        k: int = 1,
+        max_distance: Optional[float] = None,
+        exact: bool = False,
+        now: Optional[float] = None
+    ) -> List[Match]:
+        """
+        Up to ``k`` ``(id, distance, payload)`` matches, closest first, within
+        ``max_distance``. ``exact`` skips the inverted-file layer.
+        """
+        query = _unit(np.asarray(vector, dtype=np.float32).reshape(self.dimensions))
+        now = time.time() if now is None else now
+
+        with self._lock:
+            self._searches += 1
+            if self._size == 0 or k <= 0:
+                return []
+
+            if self._centroids is not None and not exact and self.probes < len(self._centroids):
+                probed = np.argpartition(-(self._centroids @ query), self.probes)[:self.probes]
+                rows = np.flatnonzero(np.isin(self._lists[:self._size], probed))
+                scores = self._vectors[rows] @ query
+            else:
+                rows = None
+                scores = self._vectors[:self._size] @ query
+
+            expires = self._expires[:self._size] if rows is None else self._expires[rows]
+            scores[expires <= now] = -np.inf
+
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for position in top:
+                if scores[position] == -np.inf:
+                    break
+                distance = float(1.0 - scores[position])
+                if max_distance is not None and distance > max_distance:
+                    break
+                row = int(position) if rows is None else int(rows[position])
+                matches.append((self._ids[row], distance, self._payloads[row]))
+            return matches
+
+    def _append_row(self, item_id: str) -> int:
+        if self._size == len(self._vectors):
+            capacity = max(64, 2 * len(self._vectors))
+            self._vectors = self._grown(self._vectors, capacity)
+            self._expires = self._grown(self._expires, capacity)
+            self._lists = self._grown(self._lists, capacity)
+        row = self._size
+        self._size += 1
+        self._ids.append(item_id)
+        self._payloads.append(None)
+        self._rows[item_id] = row
+        return row
+
+    def _grown(self, array: np.ndarray, capacity: int) -> np.ndarray:
+        grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        grown[:self._size] = array[:self._size]
+        return grown
+
+    def _remove_row(self, row: int) -> None:
+        """Move the last row into ``row`` and shrink by one"""
+        last = self._size - 1
+        del self._rows[self._ids[row]]
+        if row != last:
+            self._vectors[row] = self._vectors[last]
+            self._expires[row] = self._expires[last]
+            self._lists[row] = self._lists[last]
+            self._ids[row] = self._ids[last]
+            self._payloads[row] = self._payloads[last]
+            self._rows[self._ids[row]] = row
+        self._ids.pop()
+        self._payloads.pop()
+        self._size = last
+        if self._centroids is not None and self._size < self.ivf_min_size // 2:
+            self._centroids = None
+            self._built_size = 0
+
+    def _rebuild_if_needed(self) -> None:
+        """(Re)build the inverted-file layer when it is missing or the index has doubled since"""
+        if self._size < self.ivf_min_size:
+            return
+        if self._centroids is not None and self._size < 2 * self._built_size:
+            return
+
+        vectors = self._vectors[:self._size]
+        lists = max(1, int(math.sqrt(self._size)))
+        sample_size = min(self._size, lists * _KMEANS_SAMPLE_PER_LIST)
+        sample = vectors[self._rng.choice(self._size, sample_size, replace=False)]
+
+        centroids = sample[self._rng.choice(sample_size, lists, replace=False)].copy()
+        for _ in range(_KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=lists)
+            # Empty lists keep their previous centroid
+            centroids = np.where(counts[:, None] > 0, _unit(sums), centroids)
+
+        self._centroids = centroids.astype(np.float32)
+        for start in range(0, self._size, _ASSIGN_CHUNK_ROWS):
+            chunk = vectors[start:start + _ASSIGN_CHUNK_ROWS]
+            self._lists[start:start + len(chunk)] = np.argmax(chunk @ self._centroids.T, axis=1)
+        self._built_size = self._size
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": self._size,
+                "ivf_lists": 0 if self._centroids is None else len(self._centroids),
+                "probes": self.probes,
+                "searches": self._searches,
+            }
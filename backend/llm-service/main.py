@@ -5,6 +5,8 @@ import logging
 import json
 from routers import conversation, admin
 from services.agent import UtilitiesAgent
+from utils.compression import CompressionMiddleware
+from utils.settings import Settings
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -20,6 +22,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+settings = Settings.get_settings()
+if settings.compression_enabled:
+    app.add_middleware(
+        CompressionMiddleware,
+        minimum_size=settings.compression_min_size,
+        gzip_level=settings.compression_gzip_level,
+        zstd_level=settings.compression_zstd_level,
+    )
+
 app.include_router(conversation.router)
 app.include_router(admin.router)
 
@@ -23,11 +23,13 @@ class AgentState(TypedDict):
     generated_sql: Optional[str]
     needs_more_info: Optional[bool]
     conversation_id: Optional[str]
+    user_id: Optional[str]
     tables_used: Optional[list[str]]
     cost: Optional[float]
     SQL_retries : Optional[int] = 3
     memory: Optional[ConversationBufferMemory]
     agent_response: Optional[str]
+    embedding_handle: Optional[str]
 
 class Agent():
     def __init__(self):
@@ -91,6 +93,7 @@ class Agent():
 
             cached_result = get_cached_query(query)
             print(f"Cached Result: {cached_result}")
+            state["embedding_handle"] = cached_result.get("embedding_handle")
             if cached_result and 'response' in cached_result:
                 state["generated_sql"] = cached_result['response']
                 state["needs_more_info"] = False
@@ -170,7 +173,7 @@ class Agent():
                 generated_sql = sql.strip()
                 state["agent_response"] = agent_response
                 state["generated_sql"] = generated_sql
-                save_query_to_cache(state["input"], generated_sql)
+                save_query_to_cache(state["input"], generated_sql, state.get("embedding_handle"))
                 return state
             except Exception as e:
                 state["output"] = f"[Error durante la consulta] {e}"
@@ -185,7 +188,7 @@ class Agent():
                 if not generated_sql:
                     return {**state, "output": "No se generó SQL"}
                 
-                result = call_server(generated_sql)
+                result = call_server(generated_sql, state.get("user_id"))
                 state["output"] = str(result['response']) if 'response' in result else str(result['error'])
                 state['cost'] = float(result.get('cost', 0.0))
 
@@ -237,7 +240,7 @@ class Agent():
     def ask_agent(self, query: str, conversation_id: str, user_id : str) -> tuple[str, str]:
             @traceable(name="Agent Graph Run")
             def _run_with_trace(input_query, conv_id):
-                return self.runnable.invoke({"input": input_query, "conversation_id": conv_id})
+                return self.runnable.invoke({"input": input_query, "conversation_id": conv_id, "user_id": user_id})
 
             try:
 
@@ -5,7 +5,7 @@ import os
 import logging
 import asyncio
 
-CACHE_DURATION_SECONDS = 24 * 60 * 60  # 24 hours
+CACHE_DURATION_SECONDS = 5 * 60  # revalidated with a conditional request after 5 minutes
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +13,16 @@ class SchemaClient:
     def __init__(self):
         self._client = httpx.AsyncClient(base_url=os.getenv("MCP_SERVER_URI") or "http://data-service:8001", timeout=httpx.Timeout(None))
         self._cache: Optional[List[Dict[str, Any]]] = None
+        self._etag: Optional[str] = None
         self._last_fetched_time: float = 0
         self._lock = asyncio.Lock()
 
     async def get_schemas(self) -> List[Dict[str, Any]]:
         """
-        Fetches all schemas, using a simple in-memory cache to store results for 24 hours.
+        Fetches all schemas, using an in-memory cache that is revalidated against
+        data-service every CACHE_DURATION_SECONDS. Revalidation sends the cached
+        version as If-None-Match and asks only for the tables changed since it,
+        so an unchanged schema comes back as an empty 304.
         """
         # Check if cache is valid (not None and not expired)
         current_time = time.time()
@@ -46,14 +50,29 @@ class SchemaClient:
 
             logger.info("In-memory cache is invalid or expired. Fetching schemas from data-service...")
             try:
-                response = await self._client.get("/schemas")
-                response.raise_for_status()
-                
-                # Update cache and timestamp
-                self._cache = response.json()
+                if self._cache is not None and self._etag:
+                    response = await self._client.get(
+                        "/schemas",
+                        params={"since": self._etag.strip('"')},
+                        headers={"If-None-Match": self._etag}
+                    )
+                else:
+                    response = await self._client.get("/schemas")
+
+                if response.status_code == 304:
+                    logger.info("Schemas not modified, keeping in-memory cache.")
+                else:
+                    response.raise_for_status()
+                    if "since" in response.request.url.params:
+                        self._cache = self._apply_diff(self._cache, response.json())
+                        logger.info("Applied schema changes to in-memory cache.")
+                    else:
+                        self._cache = response.json()
+                        logger.info("Successfully fetched and updated in-memory cache for schemas.")
+
+                # Update version and timestamp
+                self._etag = response.headers.get("ETag", self._etag)
                 self._last_fetched_time = time.time()
-                
-                logger.info("Successfully fetched and updated in-memory cache for schemas.")
 
                 return self._cache if self._cache is not None else []
             except httpx.RequestError as exc:
@@ -63,6 +82,28 @@ class SchemaClient:
                 logger.error(f"Error response {exc.response.status_code} while fetching schemas.")
                 return self._cache if self._cache is not None else []
 
+    def _apply_diff(self, schemas: List[Dict[str, Any]], diff: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Patch the cached dataset with the changed and removed tables of a /schemas?since= diff"""
+        changed = {table["table_id"]: table for table in diff.get("changed_tables", [])}
+        removed = set(diff.get("removed_tables", []))
+        dataset = next((schema for schema in schemas if schema["dataset_id"] == diff["dataset_id"]), None)
+
+        if dataset is None or diff.get("full"):
+            return [schema for schema in schemas if schema["dataset_id"] != diff["dataset_id"]] + [
+                {"dataset_id": diff["dataset_id"], "tables": list(changed.values())}
+            ]
+
+        tables = [
+            changed.pop(table["table_id"], table)
+            for table in dataset["tables"]
+            if table["table_id"] not in removed
+        ]
+        tables.extend(changed.values())
+        return [
+            {**schema, "tables": tables} if schema is dataset else schema
+            for schema in schemas
+        ]
+
 
 # Create a singleton instance for use across the application
 schema_client = SchemaClient()
\ No newline at end of file
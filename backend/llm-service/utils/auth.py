@@ -1,6 +1,7 @@
 from http.client import HTTPException
 from db.dbconnection import get_role, get_user
 from utils.constants import entregas_tables, facturas_tables
+from utils.connection import analyze_sql
 import logging
 import jwt
 from fastapi import Header, HTTPException
@@ -64,19 +65,18 @@ def permissions_check(sql, conversation_id) -> list:
 
 def extract_tables_from_sql(sql: str) -> list:
     """
-    Extracts table names from a SQL query.
+    Extracts table names from a SQL query, parsed by data-service so that
+    columns, aliases, CTE names and string literals are not taken for tables.
 
     Args:
         sql (str): The SQL query string.
         
     Returns:
-        list: A list of table names found in the SQL query.
+        list: A list of upper-case table names found in the SQL query.
+
+    Raises:
+        requests.RequestException: data-service did not answer (e.g. timed out);
+            permissions_check then denies the query.
     """
-    sql_lower = sql.lower()
-    all_known_tables = entregas_tables + facturas_tables
-    used_tables = [
-        table.upper() for table in all_known_tables
-        if table.lower() in sql_lower
-    ]
-    return used_tables
+    return list(analyze_sql(sql)["tables"])
 
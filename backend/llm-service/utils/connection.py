@@ -1,42 +1,80 @@
 import requests
+from typing import Optional
 from utils.settings import Settings
 
 
 settings = Settings.get_settings()
 
+# Columnar layout: one array per column instead of repeating column names on every row
+COLUMNAR_MEDIA_TYPE = "application/vnd.ancap.columnar+json"
 
-def call_server(query: str) -> dict:
+# Results are large, repetitive JSON: data-service compresses them with the first coding
+# it supports and requests decodes them (zstd only when urllib3 finds zstandard installed)
+ACCEPT_ENCODING = "zstd, gzip" if "zstd" in requests.utils.DEFAULT_ACCEPT_ENCODING else "gzip"
+
+
+def _rows_from_columnar(data: dict) -> dict:
+    """Rebuild the row-dict layout from a columnar /query payload."""
+    columns = data.get("data")
+    if not isinstance(columns, dict):
+        return data
+
+    names = list(columns.keys())
+    return {**data, "data": [dict(zip(names, row)) for row in zip(*columns.values())]}
+
+
+def call_server(query: str, user_id: str = None) -> dict:
     payload = {
         "query": query
     }
+    if user_id:
+        # data-service charges the scanned bytes to this user's budget
+        payload["metadata"] = {"user_id": user_id}
 
     uri = f"{settings.mcp_server_uri}/query"
-    response = requests.post(uri, json=payload).json()
+    response = requests.post(uri, json=payload, headers={"Accept": COLUMNAR_MEDIA_TYPE, "Accept-Encoding": ACCEPT_ENCODING}).json()
     
     try:
 
+        # Downstream consumers (PocketBase output, frontend charts) expect one dict per row
+        if response.get('data'):
+            response['data'] = _rows_from_columnar(response['data'])
+
         metadata = response.get('metadata', {})
         return {'response': response, 'cost': float(metadata.get('cost_estimate', 0.0))}
     except Exception as e:
         return {"error": f"[Error parsing MCP response] {e}"}
     
 
+def analyze_sql(sql: str) -> dict:
+    """
+    Statement type, tables and LIMIT of a SQL query, as parsed by data-service.
+    Raises requests.Timeout after settings.analyze_timeout_seconds.
+    """
+    uri = f"{settings.mcp_server_uri}/query/analyze"
+    response = requests.post(uri, json={"query": sql}, timeout=settings.analyze_timeout_seconds)
+    response.raise_for_status()
+    return response.json()
+
+
 def get_cached_query(natural_query: str) -> dict:
 
     query_string = "?query_text=" + natural_query
     uri = f"{settings.mcp_server_uri}/embeddings/search" + query_string
     response = requests.post(uri).json()
     try:
+        # The handle lets save_query_to_cache reuse the embedding computed for this search
         if (response['results'] is None or len(response['results']) == 0):
-            return {"error": "No cached query found."}
-        return {"response":response['results']}
+            return {"error": "No cached query found.", "embedding_handle": response.get('embedding_handle')}
+        return {"response":response['results'], "embedding_handle": response.get('embedding_handle')}
     except Exception as e:
         return {"error": f"[Error parsing MCP embeddings response] {e}"}
     
-def save_query_to_cache(natural_query: str, generated_SQL:str) -> dict:
+def save_query_to_cache(natural_query: str, generated_SQL:str, embedding_handle: Optional[str] = None) -> dict:
     payload = {
         "query_text": natural_query,
-        "sql_query": generated_SQL
+        "sql_query": generated_SQL,
+        "embedding_handle": embedding_handle
     }
     uri = f"{settings.mcp_server_uri}/embeddings"
     response = requests.post(uri, json=payload).json()
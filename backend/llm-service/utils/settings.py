@@ -20,6 +20,13 @@ class Settings:
         self.mcp_server_uri = os.environ.get('MCP_SERVER_URI')
         self.pocketbase_url = os.environ.get('POCKETBASE_URL')
         self.local = os.environ.get('LOCAL', 'false').lower() == 'true'
+        # Responses compressed with the zstd or gzip coding the client accepts
+        self.compression_enabled = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+        self.compression_min_size = int(os.environ.get('COMPRESSION_MIN_SIZE', '1024'))
+        self.compression_gzip_level = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '1'))
+        self.compression_zstd_level = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', '1'))
+        # Seconds to wait for data-service's SQL analysis before the permission check denies the query
+        self.analyze_timeout_seconds = float(os.environ.get('ANALYZE_TIMEOUT_SECONDS', '5'))
         self.schema = None
 
     def get_schema(self):